@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Conversation, Message
+from .models import Conversation, Message, DailyUsage
 
 
 class MessageInline(admin.TabularInline):
@@ -10,11 +10,17 @@ class MessageInline(admin.TabularInline):
 
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user', 'title', 'created_at', 'updated_at', 'message_count']
-    list_filter = ['created_at', 'updated_at']
+    list_display = ['id', 'user', 'title', 'title_status', 'created_at', 'updated_at', 'message_count']
+    list_filter = ['title_status', 'response_cache_opt_out', 'created_at', 'updated_at']
     search_fields = ['user__username', 'user__email', 'title']
     inlines = [MessageInline]
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'summary_until')
+    
+    def save_model(self, request, obj, form, change):
+        # A hand-edited title is final; background title generation must not replace it
+        if 'title' in form.changed_data:
+            obj.title_status = Conversation.TITLE_FINAL
+        super().save_model(request, obj, form, change)
     
     def message_count(self, obj):
         return obj.messages.count()
@@ -23,11 +29,27 @@ class ConversationAdmin(admin.ModelAdmin):
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ['id', 'conversation', 'is_from_user', 'content_preview', 'created_at']
-    list_filter = ['is_from_user', 'created_at']
+    list_display = ['id', 'conversation', 'is_from_user', 'content_preview', 'model', 'prompt_tokens', 'completion_tokens', 'upstream_latency', 'created_at']
+    list_filter = ['is_from_user', 'model', 'created_at']
     search_fields = ['content', 'conversation__user__username']
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'prompt_tokens', 'completion_tokens', 'upstream_latency')
     
     def content_preview(self, obj):
         return obj.content[:100] + ('...' if len(obj.content) > 100 else '')
-    content_preview.short_description = 'Content Preview'
\ No newline at end of file
+    content_preview.short_description = 'Content Preview'
+
+
+@admin.register(DailyUsage)
+class DailyUsageAdmin(admin.ModelAdmin):
+    list_display = ['day', 'user', 'model', 'answers', 'upstream_calls', 'prompt_tokens', 'completion_tokens', 'total_tokens', 'upstream_seconds']
+    list_filter = ['model', 'day']
+    search_fields = ['user__username', 'user__email']
+    date_hierarchy = 'day'
+    list_select_related = ['user']
+    
+    # Maintained from saved answers (chat/usage.py); not edited by hand
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .api_views import ConversationViewSet, MessageViewSet
+from .api_views import ConversationViewSet, MessageViewSet, UsageViewSet
 
 router = DefaultRouter()
 router.register(r'conversations', ConversationViewSet, basename='conversation')
 router.register(r'messages', MessageViewSet, basename='message')
+router.register(r'usage', UsageViewSet, basename='usage')
 
 urlpatterns = [
     path('', include(router.urls)),
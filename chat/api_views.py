@@ -1,10 +1,16 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import Conversation, Message
-from .serializers import ConversationSerializer, MessageSerializer
+from django.db.models import Sum
+from django.utils.dateparse import parse_date
+from .models import Conversation, Message, DailyUsage
+from .serializers import ConversationSerializer, MessageSerializer, DailyUsageSerializer
 from .services import AIService
+from .resilience import BulkheadFullError
+from .deadlines import DeadlineExceededError, RequestCancelledError
+from .tasks import schedule_summary_update
 
 
 class ConversationViewSet(viewsets.ModelViewSet):
@@ -18,6 +24,13 @@ class ConversationViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
     
+    def perform_update(self, serializer):
+        # A title set by the user is final; background title generation must not replace it
+        if 'title' in serializer.validated_data:
+            serializer.save(title_status=Conversation.TITLE_FINAL)
+        else:
+            serializer.save()
+    
     @action(detail=True, methods=['post'])
     def send_message(self, request, pk=None):
         """Send a message to the conversation"""
@@ -35,16 +48,36 @@ class ConversationViewSet(viewsets.ModelViewSet):
         )
         
         # Generate AI response
-        ai_service = AIService()
-        conversation_history = conversation.messages.order_by('created_at')
-        ai_response = ai_service.generate_response(message_content, conversation_history)
+        ai_service = AIService(user=request.user)
+        try:
+            ai_response = ai_service.generate_response(
+                message_content,
+                conversation=conversation,
+                use_cache=not conversation.response_cache_opt_out
+            )
+        except BulkheadFullError as e:
+            user_message.delete()
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': str(e.retry_after)}
+            )
+        except RequestCancelledError as e:
+            user_message.delete()
+            return Response({'error': str(e)}, status=499)
+        except DeadlineExceededError as e:
+            user_message.delete()
+            return Response({'error': str(e)}, status=status.HTTP_504_GATEWAY_TIMEOUT)
         
         # Save AI response
         ai_message = Message.objects.create(
             conversation=conversation,
             content=ai_response,
-            is_from_user=False
+            is_from_user=False,
+            model=ai_service.model,
+            **ai_service.usage_fields()
         )
+        schedule_summary_update(conversation)
         
         return Response({
             'user_message': MessageSerializer(user_message).data,
@@ -58,4 +91,61 @@ class MessageViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Message.objects.filter(conversation__user=self.request.user)
\ No newline at end of file
+        return Message.objects.filter(conversation__user=self.request.user)
+
+
+class UsageViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Daily token and upstream-time rollups per user and model. Users see their own;
+    staff see everyone's and may narrow with ?user=<id>. Also filters by ?model=,
+    ?since= and ?until= (YYYY-MM-DD, inclusive).
+    """
+    serializer_class = DailyUsageSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = DailyUsage.objects.all()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user=self.request.user)
+        elif params.get('user'):
+            try:
+                user_id = int(params['user'])
+            except ValueError:
+                raise ValidationError({'user': 'Expected a user id.'})
+            queryset = queryset.filter(user_id=user_id)
+        if params.get('model'):
+            queryset = queryset.filter(model=params['model'])
+        since = self._date_param('since')
+        if since:
+            queryset = queryset.filter(day__gte=since)
+        until = self._date_param('until')
+        if until:
+            queryset = queryset.filter(day__lte=until)
+        return queryset
+    
+    def _date_param(self, name):
+        """?name= as a date, None if absent; 400 unless it is a valid YYYY-MM-DD"""
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValidationError({name: 'Expected a date as YYYY-MM-DD.'})
+        return day
+    
+    @action(detail=False)
+    def totals(self, request):
+        """Totals per model over the filtered days, heaviest first; staff also get the top users"""
+        queryset = self.get_queryset()
+        fields = ['answers', 'upstream_calls', 'prompt_tokens', 'completion_tokens', 'upstream_seconds']
+        sums = {field: Sum(field) for field in fields}
+        by_model = queryset.order_by().values('model').annotate(**sums).order_by('-prompt_tokens')
+        data = {'models': list(by_model)}
+        if request.user.is_staff:
+            by_user = queryset.order_by().values('user', 'user__email').annotate(**sums).order_by('-prompt_tokens')
+            data['users'] = list(by_user[:20])
+        return Response(data)
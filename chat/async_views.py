@@ -0,0 +1,291 @@
+from django.http import JsonResponse, Http404
+from django.shortcuts import redirect
+from django.contrib.auth.views import redirect_to_login
+from asgiref.sync import sync_to_async
+from .models import Conversation, Message
+from .services import AsyncAIService
+from .compare import compare_models, aiter_compare
+from .resilience import BulkheadFullError
+from .deadlines import DeadlineExceededError, RequestCancelledError
+from .tasks import schedule_title_generation, schedule_summary_update, set_first_response_title
+from .titles import get_title_strategy
+import json
+
+# Async counterparts of the chat write path in views.py. Under ASGI these hold no
+# worker thread while waiting on the upstream API, so one process can serve many
+# concurrent chats. The Django 4.2 login_required/csrf_exempt decorators only wrap
+# sync views, so authentication and the CSRF exemption are handled here directly.
+
+
+async def _get_user(request):
+    """Resolve the lazy request.user off the event loop; None if anonymous"""
+    def resolve():
+        user = request.user
+        return user if user.is_authenticated else None
+    return await sync_to_async(resolve)()
+
+
+async def send_message(request):
+    """Send a message and get AI response"""
+    user = await _get_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid method'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        message_content = data.get('message', '').strip()
+        conversation_id = data.get('conversation_id')
+
+        if not message_content:
+            return JsonResponse({'error': 'Message cannot be empty'}, status=400)
+
+        # Get or create conversation
+        if conversation_id:
+            try:
+                conversation = await Conversation.objects.aget(id=conversation_id, user=user)
+            except Conversation.DoesNotExist:
+                raise Http404("No Conversation matches the given query.")
+        else:
+            conversation = await Conversation.objects.acreate(user=user)
+
+        # Save user message
+        user_message = await Message.objects.acreate(
+            conversation=conversation,
+            content=message_content,
+            is_from_user=True
+        )
+
+        # Generate AI response (with the conversation title in the same call if so configured)
+        ai_service = AsyncAIService(user=user)
+        combined_title = not conversation.title and get_title_strategy().with_first_response
+        try:
+            if combined_title:
+                ai_response, title = await ai_service.agenerate_response_with_title(
+                    message_content,
+                    conversation=conversation,
+                    use_cache=not conversation.response_cache_opt_out
+                )
+            else:
+                ai_response = await ai_service.agenerate_response(
+                    message_content,
+                    conversation=conversation,
+                    use_cache=not conversation.response_cache_opt_out
+                )
+        except BulkheadFullError as e:
+            # Nothing was answered: drop the turn so the client can simply resend it
+            await user_message.adelete()
+            response = JsonResponse({'error': str(e)}, status=503)
+            response['Retry-After'] = str(e.retry_after)
+            return response
+        except RequestCancelledError:
+            # Client went away and the upstream call was cancelled: 499 as in nginx
+            await user_message.adelete()
+            return JsonResponse({'error': 'Client disconnected'}, status=499, reason='Client Closed Request')
+        except DeadlineExceededError as e:
+            # Out of time before an answer: 504, and the turn is dropped as above
+            await user_message.adelete()
+            return JsonResponse({'error': str(e)}, status=504)
+
+        # Save AI response
+        ai_message = await Message.objects.acreate(
+            conversation=conversation,
+            content=ai_response,
+            is_from_user=False,
+            model=ai_service.model,
+            **ai_service.usage_fields()
+        )
+        await sync_to_async(schedule_summary_update)(conversation)
+
+        # First message: the title came with the answer, or respond with a provisional
+        # title and generate the real one in the background
+        if combined_title:
+            await sync_to_async(set_first_response_title)(conversation, message_content, title)
+        elif not conversation.title:
+            await sync_to_async(schedule_title_generation)(conversation, message_content)
+
+        return JsonResponse({
+            'success': True,
+            'conversation_id': conversation.id,
+            'user_message': {
+                'id': user_message.id,
+                'content': user_message.content,
+                'created_at': user_message.created_at.isoformat(),
+            },
+            'ai_message': {
+                'id': ai_message.id,
+                'content': ai_message.content,
+                'created_at': ai_message.created_at.isoformat(),
+            },
+            'conversation_title': conversation.title,
+            'title_pending': conversation.title_status == Conversation.TITLE_PENDING,
+        })
+
+    except Http404:
+        raise
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+send_message.csrf_exempt = True
+
+
+async def new_conversation(request):
+    """Create a new conversation"""
+    user = await _get_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+
+    if request.method != 'POST':
+        # GET shows the "new chat" interface, same as the sync view
+        return redirect('chat:home')
+
+    try:
+        data = json.loads(request.body)
+        conversation = await Conversation.objects.acreate(user=user)
+
+        # If initial message is provided, process it
+        initial_message = data.get('initial_message')
+        if initial_message:
+            await Message.objects.acreate(
+                conversation=conversation,
+                content=initial_message,
+                is_from_user=True
+            )
+
+            ai_service = AsyncAIService(user=user)
+            try:
+                ai_response = await ai_service.agenerate_response(initial_message)
+            except BulkheadFullError as e:
+                # Nothing was answered and the client never learns the new id: drop
+                # the conversation with its message so a resend starts clean
+                await conversation.adelete()
+                response = JsonResponse({'error': str(e)}, status=503)
+                response['Retry-After'] = str(e.retry_after)
+                return response
+            except RequestCancelledError:
+                await conversation.adelete()
+                return JsonResponse({'error': 'Client disconnected'}, status=499, reason='Client Closed Request')
+            except DeadlineExceededError as e:
+                await conversation.adelete()
+                return JsonResponse({'error': str(e)}, status=504)
+            await Message.objects.acreate(
+                conversation=conversation,
+                content=ai_response,
+                is_from_user=False,
+                model=ai_service.model,
+                **ai_service.usage_fields()
+            )
+
+        return JsonResponse({
+            'success': True,
+            'conversation_id': conversation.id
+        })
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        })
+
+
+new_conversation.csrf_exempt = True
+
+
+async def compare_message(request):
+    """
+    Send a message to several models concurrently; each answer is stored as its own
+    Message tagged with its model as soon as it lands. Responds once all are in, so
+    the wait is the slowest model, not the sum.
+    """
+    user = await _get_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid method'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        message_content = data.get('message', '').strip()
+        conversation_id = data.get('conversation_id')
+
+        if not message_content:
+            return JsonResponse({'error': 'Message cannot be empty'}, status=400)
+        models = compare_models(data.get('models'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    try:
+        # Get or create conversation
+        if conversation_id:
+            try:
+                conversation = await Conversation.objects.aget(id=conversation_id, user=user)
+            except Conversation.DoesNotExist:
+                raise Http404("No Conversation matches the given query.")
+        else:
+            conversation = await Conversation.objects.acreate(user=user)
+
+        # Save user message
+        user_message = await Message.objects.acreate(
+            conversation=conversation,
+            content=message_content,
+            is_from_user=True
+        )
+
+        answers = []
+        errors = []
+        async for result in aiter_compare(
+            message_content,
+            models,
+            conversation=conversation,
+            user=user,
+            use_cache=not conversation.response_cache_opt_out
+        ):
+            if result['error']:
+                errors.append({'model': result['model'], 'error': result['error']})
+                continue
+            ai_message = await Message.objects.acreate(
+                conversation=conversation,
+                content=result['content'],
+                is_from_user=False,
+                model=result['model'],
+                **result['usage']
+            )
+            answers.append({
+                'model': result['model'],
+                'latency': result['latency'],
+                'ai_message': {
+                    'id': ai_message.id,
+                    'content': ai_message.content,
+                    'created_at': ai_message.created_at.isoformat(),
+                },
+            })
+
+        if answers:
+            await sync_to_async(schedule_summary_update)(conversation)
+        if not conversation.title:
+            await sync_to_async(schedule_title_generation)(conversation, message_content)
+
+        return JsonResponse({
+            'success': True,
+            'conversation_id': conversation.id,
+            'user_message': {
+                'id': user_message.id,
+                'content': user_message.content,
+                'created_at': user_message.created_at.isoformat(),
+            },
+            'answers': answers,
+            'errors': errors,
+            'conversation_title': conversation.title,
+            'title_pending': conversation.title_status == Conversation.TITLE_PENDING,
+        })
+
+    except Http404:
+        raise
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+compare_message.csrf_exempt = True
@@ -0,0 +1,129 @@
+from django.conf import settings
+from django.db import close_old_connections
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import asyncio
+import time
+import logging
+
+from .services import AIService, AsyncAIService
+
+logger = logging.getLogger(__name__)
+
+# "Compare answers" mode: one context fanned out to several models at once, so the
+# whole comparison takes as long as the slowest model rather than the sum of all.
+# Each model's call goes through the normal upstream path (bulkhead, cache,
+# coalescing, failover) with the model pinned: never re-routed, and sent as is even
+# to providers configured with a model of their own.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_compare_executor():
+    """Threads for sync fan-out; separate from the hedge pool, which the calls themselves use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'COMPARE_WORKERS', 16),
+                    thread_name_prefix='chat-compare',
+                )
+    return _executor
+
+
+def compare_models(requested=None):
+    """
+    Models to compare: the requested ones, or every model in COMPARE_MODELS.
+    Raises ValueError for models not in COMPARE_MODELS or more than COMPARE_MAX_MODELS.
+    """
+    available = list(getattr(settings, 'COMPARE_MODELS', None) or getattr(settings, 'MODEL_LADDER', None) or [])
+    if not requested:
+        models = available
+    else:
+        unknown = [model for model in requested if model not in available]
+        if unknown:
+            raise ValueError(f"Models not available for comparison: {', '.join(unknown)}")
+        models = list(dict.fromkeys(requested))
+    max_models = getattr(settings, 'COMPARE_MAX_MODELS', 4)
+    if len(models) < 2:
+        raise ValueError("Pick at least two models to compare")
+    if len(models) > max_models:
+        raise ValueError(f"At most {max_models} models can be compared at once")
+    return models
+
+
+def _result(model, started, content=None, error=None, usage=None):
+    if content is None and error is None:
+        error = "Unexpected response format from the AI service"
+    return {
+        'model': model,
+        'content': content,
+        'error': str(error) if error is not None else None,
+        'latency': round(time.monotonic() - started, 3),
+        'usage': usage or {},  # Message fields, see AIService.usage_fields()
+    }
+
+
+def _answer(service, messages, use_cache):
+    started = time.monotonic()
+    try:
+        content = service.answer(messages, use_cache)
+        return _result(service.model, started, content=content, usage=service.usage_fields())
+    except Exception as e:
+        logger.error(f"Compare answer from {service.model} failed: {e}")
+        return _result(service.model, started, error=e)
+    finally:
+        close_old_connections()
+
+
+def iter_compare(message, models, conversation=None, user=None, use_cache=True, deadline=None):
+    """
+    Ask every model for an answer to message (in the context of conversation) concurrently
+    and yield one result dict (model, content, error, latency, usage) per model, in the order the
+    answers land. The context is built once, in the calling thread. deadline defaults to the
+    current request's.
+    """
+    services = [AIService(user=user, model=model, deadline=deadline) for model in models]
+    messages = services[0]._build_messages(message, conversation=conversation)
+    # Resolve the user's bulkhead share here, so the worker threads never query for it
+    share = services[0]._fair_share()
+    for service in services:
+        service._share = share
+    executor = get_compare_executor()
+    pending = [executor.submit(_answer, service, messages, use_cache) for service in services]
+    try:
+        for future in as_completed(pending):
+            yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()  # only stops calls still queued for a thread
+
+
+async def aiter_compare(message, models, conversation=None, user=None, use_cache=True):
+    """Async counterpart of iter_compare: one task per model on the event loop"""
+    services = [AsyncAIService(user=user, model=model) for model in models]
+    messages = await services[0]._abuild_messages(message, conversation=conversation)
+    share = await sync_to_async(services[0]._fair_share)()
+    for service in services:
+        service._share = share
+
+    async def answer(service):
+        started = time.monotonic()
+        try:
+            content = await service.aanswer(messages, use_cache)
+            return _result(service.model, started, content=content, usage=service.usage_fields())
+        except Exception as e:
+            logger.error(f"Compare answer from {service.model} failed: {e}")
+            return _result(service.model, started, error=e)
+
+    tasks = [asyncio.ensure_future(answer(service)) for service in services]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Consumer went away early: don't leave calls running for nobody
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,107 @@
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Per-message framing the chat format adds on top of the content (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text):
+    """
+    Fast local token estimate, no tokenizer needed.
+
+    BPE tokenizers average about 4 characters per token on English prose but
+    split code and punctuation-heavy text finer, so take the larger of the
+    character- and word-based estimates.
+    """
+    if not text:
+        return 0
+    return max(1, int(max(len(text) / 4, len(text.split()) * 1.3)))
+
+
+def message_tokens(msg):
+    """Stored token count for a Message, estimating only for rows saved before counts existed"""
+    count = getattr(msg, 'token_count', None)
+    if count is None:
+        count = estimate_tokens(msg.content)
+    return count + MESSAGE_OVERHEAD_TOKENS
+
+
+class ContextBuilder:
+    """Packs conversation history newest-first into a prompt token budget"""
+
+    def __init__(self, token_budget=None, max_messages=None, recall_budget=None):
+        self.token_budget = token_budget or getattr(settings, 'CONTEXT_TOKEN_BUDGET', 3000)
+        # Upper bound on history rows fetched per request, whatever their size
+        self.max_messages = max_messages or getattr(settings, 'CONTEXT_MAX_MESSAGES', 50)
+        # Share of the budget kept for recalled older messages, when there are any
+        self.recall_budget = recall_budget if recall_budget is not None else getattr(settings, 'RETRIEVAL_TOKEN_BUDGET', 600)
+
+    def build(self, system_prompt, history_newest_first, current_message, summary=None, recalled=None):
+        """
+        Return (messages, prompt_tokens) for the upstream request.
+
+        The system prompt, the running summary of older turns (if any) and the
+        current message are always included; history messages are added
+        newest-first until the next one would exceed the budget, then put back
+        in chronological order. recalled (older messages relevant to the current
+        one, most relevant first) then fill the budget kept for them plus
+        whatever history left unused, as one system message.
+        """
+        used = (estimate_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+                + estimate_tokens(current_message) + MESSAGE_OVERHEAD_TOKENS)
+        summary_prompt = None
+        if summary:
+            summary_prompt = f"Summary of the earlier conversation:\n{summary}"
+            used += estimate_tokens(summary_prompt) + MESSAGE_OVERHEAD_TOKENS
+
+        history = list(history_newest_first)
+        # Views save the user's message before generating, so it is usually the newest
+        # history row as well; don't send it twice
+        if history and history[0].is_from_user and history[0].content == current_message:
+            history = history[1:]
+
+        history_budget = self.token_budget - (self.recall_budget if recalled else 0)
+        packed = []
+        for msg in history:
+            cost = message_tokens(msg)
+            if used + cost > history_budget:
+                break
+            packed.append(msg)
+            used += cost
+        packed.reverse()
+
+        recalled_prompt = None
+        if recalled:
+            packed_ids = {msg.pk for msg in packed}
+            lines = []
+            for msg in recalled:
+                if msg.pk in packed_ids:
+                    continue
+                cost = message_tokens(msg)
+                if used + cost > self.token_budget:
+                    break
+                lines.append(f"{'User' if msg.is_from_user else 'Assistant'}: {msg.content}")
+                used += cost
+            if lines:
+                recalled_prompt = "Relevant earlier messages from this conversation:\n" + "\n".join(lines)
+                used += MESSAGE_OVERHEAD_TOKENS
+
+        messages = [{"role": "system", "content": system_prompt}]
+        if summary_prompt:
+            messages.append({"role": "system", "content": summary_prompt})
+        if recalled_prompt:
+            messages.append({"role": "system", "content": recalled_prompt})
+        for msg in packed:
+            role = "user" if msg.is_from_user else "assistant"
+            messages.append({"role": role, "content": msg.content})
+        messages.append({"role": "user", "content": current_message})
+
+        logger.info(
+            f"Built context: {len(packed)}/{len(history)} history messages"
+            f"{' + summary' if summary_prompt else ''}"
+            f"{f' + {len(lines)} recalled' if recalled_prompt else ''}, "
+            f"~{used} prompt tokens (budget {self.token_budget})"
+        )
+        return messages, used
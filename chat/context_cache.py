@@ -0,0 +1,216 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max, Q
+from collections import namedtuple
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# What the context builder needs from a history row; cheap to pickle, unlike model instances
+HistoryEntry = namedtuple('HistoryEntry', 'pk content is_from_user token_count created_at')
+
+
+def _entry(msg):
+    return HistoryEntry(msg.pk, msg.content, msg.is_from_user, msg.token_count, msg.created_at)
+
+
+class ContextCache:
+    """
+    Recent history of each conversation, ready for the context builder, on top
+    of Django's cache framework (settings.CACHES['contexts']).
+
+    An entry holds the newest CONTEXT_MAX_MESSAGES rows of a conversation,
+    oldest first. It is built from the database on a miss, then appended to
+    as messages are created and dropped when one is edited or deleted (see
+    chat/signals.py), so a chat turn in the steady state runs no history
+    query. Rows already folded into the running summary are filtered out on
+    read.
+
+    Conversation.last_message_pk is the watermark that keeps entries whole:
+    an entry is only served if it ends with that pk, and a message is only
+    appended if the watermark still pointed at the entry's tail, so a message
+    written by another process (or by a writer racing this one) forces a
+    rebuild instead of leaving a gap. Edits and deletes only drop this
+    process's entry, and writes that bypass model signals (bulk_create,
+    queryset update) are not seen at all; with several processes, use a
+    shared backend for CACHES['contexts'] if those must show up at once.
+    """
+
+    key_prefix = 'ctx:v1:'
+
+    def __init__(self, alias=None, max_messages=None):
+        self.alias = alias or getattr(settings, 'CONTEXT_CACHE_ALIAS', 'contexts')
+        self.enabled = getattr(settings, 'CONTEXT_CACHE_ENABLED', True)
+        self.max_messages = max_messages or getattr(settings, 'CONTEXT_MAX_MESSAGES', 50)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._rebuilds = 0
+        self._appends = 0
+        self._invalidations = 0
+        self._stale = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, conversation_id):
+        return f"{self.key_prefix}{conversation_id}"
+
+    def _count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def _current(self, entries, conversation):
+        """Whether a cached entry ends where the conversation's watermark says history ends"""
+        if entries is None:
+            return False
+        tail = entries[-1].pk if entries else None
+        if tail == conversation.last_message_pk:
+            return True
+        self._count('_stale')
+        return False
+
+    def _select(self, entries, conversation):
+        """Newest-first rows not yet represented by the conversation's summary"""
+        since = conversation.summary_until
+        return [entry for entry in reversed(entries) if since is None or entry.created_at > since]
+
+    def _read(self, conversation_id):
+        try:
+            return self.cache.get(self.make_key(conversation_id))
+        except Exception as e:
+            logger.warning(f"Context cache read failed: {e}")
+            return None
+
+    def _write(self, conversation_id, entries):
+        try:
+            self.cache.set(self.make_key(conversation_id), entries[-self.max_messages:])
+        except Exception as e:
+            logger.warning(f"Context cache write failed: {e}")
+
+    def recent(self, conversation, load):
+        """
+        Newest-first recent history of conversation; load() returns the same from
+        the database (newest first) and is only called on a miss or a stale entry.
+        """
+        if not self.enabled:
+            return list(load())
+        entries = self._read(conversation.pk)
+        if self._current(entries, conversation):
+            self._count('_hits')
+            return self._select(entries, conversation)
+        self._count('_rebuilds')
+        rows = [_entry(msg) for msg in load()]
+        self._write(conversation.pk, rows[::-1])
+        return rows
+
+    async def arecent(self, conversation, aload):
+        """Async counterpart of recent(); aload is a coroutine function"""
+        if not self.enabled:
+            return await aload()
+        try:
+            entries = await self.cache.aget(self.make_key(conversation.pk))
+        except Exception as e:
+            logger.warning(f"Context cache read failed: {e}")
+            entries = None
+        if self._current(entries, conversation):
+            self._count('_hits')
+            return self._select(entries, conversation)
+        self._count('_rebuilds')
+        rows = [_entry(msg) for msg in await aload()]
+        try:
+            await self.cache.aset(self.make_key(conversation.pk), rows[::-1][-self.max_messages:])
+        except Exception as e:
+            logger.warning(f"Context cache write failed: {e}")
+        return rows
+
+    def append(self, message):
+        """
+        Move the conversation's watermark to a newly created message and add the
+        message to the conversation's entry, if there is one and nothing was
+        written since it was last brought up to date.
+        """
+        from .models import Conversation
+
+        conversation_id = message.conversation_id
+        entries = self._read(conversation_id) if self.enabled else None
+        appended = False
+        if entries is not None:
+            tail = entries[-1].pk if entries else None
+            # Compare-and-set: only succeeds if the entry's tail was the newest message
+            # (last_message_pk=None matches IS NULL, an entry of an empty conversation)
+            appended = bool(
+                Conversation.objects.filter(pk=conversation_id, last_message_pk=tail)
+                .update(last_message_pk=message.pk)
+            )
+        if not appended:
+            Conversation.objects.filter(
+                Q(last_message_pk__isnull=True) | Q(last_message_pk__lt=message.pk), pk=conversation_id,
+            ).update(last_message_pk=message.pk)
+        self._sync_instance(message)
+
+        if appended:
+            entries.append(_entry(message))
+            self._write(conversation_id, entries)
+            self._count('_appends')
+        elif entries is not None:
+            # Another message landed since the entry was built: let the next read rebuild it
+            self.invalidate(conversation_id)
+
+    def forget(self, message):
+        """A message was deleted: step the watermark back if it pointed at it, and drop the entry"""
+        from .models import Conversation
+
+        newest = (
+            message.__class__.objects.filter(conversation=message.conversation_id)
+            .values('conversation').annotate(newest=Max('pk')).values('newest')
+        )
+        Conversation.objects.filter(pk=message.conversation_id, last_message_pk=message.pk).update(
+            last_message_pk=newest
+        )
+        self.invalidate(message.conversation_id)
+
+    def _sync_instance(self, message):
+        """Keep the conversation loaded alongside message in step with the watermark just written"""
+        if message.__class__._meta.get_field('conversation').is_cached(message):
+            conversation = message.conversation
+            if conversation.last_message_pk is None or conversation.last_message_pk < message.pk:
+                conversation.last_message_pk = message.pk
+
+    def invalidate(self, conversation_id):
+        if not self.enabled:
+            return
+        try:
+            self.cache.delete(self.make_key(conversation_id))
+            self._count('_invalidations')
+        except Exception as e:
+            logger.warning(f"Context cache invalidation failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._rebuilds
+            return {
+                'enabled': self.enabled,
+                'alias': self.alias,
+                'hits': self._hits,
+                'rebuilds': self._rebuilds,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+                'stale': self._stale,
+                'appends': self._appends,
+                'invalidations': self._invalidations,
+            }
+
+
+_context_cache = None
+_context_cache_lock = threading.Lock()
+
+
+def get_context_cache():
+    """Return the process-wide context cache"""
+    global _context_cache
+    if _context_cache is None:
+        with _context_cache_lock:
+            if _context_cache is None:
+                _context_cache = ContextCache()
+    return _context_cache
@@ -0,0 +1,184 @@
+from django.conf import settings
+from contextvars import ContextVar
+import threading
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceededError(Exception):
+    """Too little of the request's time budget is left for an upstream call"""
+
+    def __init__(self, remaining):
+        self.remaining = max(remaining, 0.0)
+        super().__init__(f"Request deadline exceeded ({self.remaining:.2f}s of the time budget left)")
+
+
+class RequestCancelledError(Exception):
+    """The client disconnected, so the upstream call was abandoned"""
+
+    def __init__(self):
+        super().__init__("Client disconnected, request cancelled")
+
+
+class Deadline:
+    """
+    Time budget of one request, counted from when the middleware saw it. Upstream
+    calls take their timeout from what is left; under ASGI, disconnected is an
+    asyncio.Event set when the client goes away (see genai_project.middleware).
+    """
+
+    def __init__(self, policy, budget, disconnected=None):
+        self.policy = policy
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+        self.disconnected = disconnected
+        self._cancel_counted = False
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+    @property
+    def cancelled(self):
+        return self.disconnected is not None and self.disconnected.is_set()
+
+    def record_cancelled(self):
+        """Count this request as cancelled by its client, once however often it is noticed"""
+        if not self._cancel_counted:
+            self._cancel_counted = True
+            self.policy.record('cancelled')
+
+    def cancel(self):
+        """RequestCancelledError to raise for a disconnected client; counted once per request"""
+        self.record_cancelled()
+        return RequestCancelledError()
+
+    def exceeded(self):
+        """DeadlineExceededError to raise now; counted"""
+        self.policy.record('exceeded')
+        return DeadlineExceededError(self.remaining())
+
+    def check(self, reserve=0.0):
+        """Raise unless the client is still there and an upstream call still fits after reserve seconds"""
+        if self.cancelled:
+            raise self.cancel()
+        if self.remaining() - reserve < self.policy.min_upstream:
+            raise self.exceeded()
+
+    def timeout(self, cap):
+        """Timeout for an upstream call: cap, or less if that is all the budget left"""
+        self.check()
+        return min(cap, self.remaining())
+
+    async def guard(self, awaitable):
+        """Await awaitable, cancelling it and raising RequestCancelledError if the client disconnects first"""
+        if self.disconnected is None:
+            return await awaitable
+        task = asyncio.ensure_future(awaitable)
+        waiter = asyncio.ensure_future(self.disconnected.wait())
+        try:
+            await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            task.cancel()
+            raise
+        finally:
+            waiter.cancel()
+        if not task.done():
+            task.cancel()
+            raise self.cancel()
+        return task.result()
+
+
+class DeadlinePolicy:
+    """
+    Per-request deadlines: REQUEST_DEADLINE_SECONDS of budget, or less if the
+    client asks for less in the REQUEST_DEADLINE_HEADER header (seconds). An
+    upstream call is not started with under REQUEST_DEADLINE_MIN_UPSTREAM left.
+    """
+
+    def __init__(self):
+        self.budget = getattr(settings, 'REQUEST_DEADLINE_SECONDS', 60.0)
+        self.header = getattr(settings, 'REQUEST_DEADLINE_HEADER', 'X-Request-Timeout')
+        self.min_upstream = getattr(settings, 'REQUEST_DEADLINE_MIN_UPSTREAM', 1.0)
+        self._meta_key = 'HTTP_' + self.header.upper().replace('-', '_')
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._from_header = 0
+        self._exceeded = 0
+        self._cancelled = 0
+
+    def record(self, outcome):
+        with self._lock:
+            if outcome == 'exceeded':
+                self._exceeded += 1
+            elif outcome == 'cancelled':
+                self._cancelled += 1
+
+    def _requested_budget(self, request):
+        value = request.META.get(self._meta_key)
+        if not value:
+            return None
+        try:
+            budget = float(value)
+        except ValueError:
+            logger.warning(f"Ignoring malformed {self.header} header: {value[:50]}")
+            return None
+        return budget if budget > 0 else None
+
+    def start(self, request):
+        """Deadline for a request that just arrived"""
+        budget = self.budget
+        requested = self._requested_budget(request)
+        if requested is not None and requested < budget:
+            budget = requested
+        scope = getattr(request, 'scope', None) or {}
+        with self._lock:
+            self._requests += 1
+            if requested is not None:
+                self._from_header += 1
+        return Deadline(self, budget, disconnected=scope.get('disconnected'))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'budget': self.budget,
+                'header': self.header,
+                'min_upstream': self.min_upstream,
+                'requests': self._requests,
+                'from_header': self._from_header,
+                'exceeded': self._exceeded,
+                'cancelled': self._cancelled,
+            }
+
+
+_current = ContextVar('chat_request_deadline', default=None)
+
+
+def current_deadline():
+    """Deadline of the request being handled in this context, or None outside one"""
+    return _current.get()
+
+
+def set_current_deadline(deadline):
+    """Make deadline current; returns a token for reset_current_deadline()"""
+    return _current.set(deadline)
+
+
+def reset_current_deadline(token):
+    _current.reset(token)
+
+
+_deadline_policy = None
+_deadline_policy_lock = threading.Lock()
+
+
+def get_deadline_policy():
+    """Return the process-wide deadline policy"""
+    global _deadline_policy
+    if _deadline_policy is None:
+        with _deadline_policy_lock:
+            if _deadline_policy is None:
+                _deadline_policy = DeadlinePolicy()
+    return _deadline_policy
@@ -0,0 +1,110 @@
+from django.conf import settings
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import threading
+import logging
+
+from .resilience import percentiles
+
+logger = logging.getLogger(__name__)
+
+
+class HedgePolicy:
+    """
+    When to send a duplicate (hedge) request, and how many we can afford.
+
+    The hedge delay is the configured percentile of recent upstream latencies,
+    so only the slowest few percent of calls get a hedge. The budget is a token
+    bucket: every request earns `budget` tokens and a hedge costs one, which
+    caps hedges at that fraction of requests even when the upstream is slow
+    across the board. No hedging happens until enough latencies are sampled.
+    """
+
+    SAMPLE_SIZE = 1024
+    MIN_SAMPLES = 20
+    MAX_TOKENS = 10.0
+
+    def __init__(self, percentile=None, budget=None, min_delay=None):
+        self.percentile = percentile or getattr(settings, 'UPSTREAM_HEDGE_PERCENTILE', 0.95)
+        self.budget = budget if budget is not None else getattr(settings, 'UPSTREAM_HEDGE_BUDGET', 0.1)
+        self.min_delay = min_delay if min_delay is not None else getattr(settings, 'UPSTREAM_HEDGE_MIN_DELAY', 0.2)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=self.SAMPLE_SIZE)
+        self._tokens = 0.0
+        self._requests = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._skipped_budget = 0
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def delay(self):
+        """Seconds to wait before hedging this request, or None if hedging is not warmed up"""
+        with self._lock:
+            self._requests += 1
+            self._tokens = min(self._tokens + self.budget, self.MAX_TOKENS)
+            if len(self._latencies) < self.MIN_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+            threshold = ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+        return max(threshold, self.min_delay)
+
+    def try_hedge(self):
+        """Spend a budget token for a hedge; False if the budget is exhausted"""
+        with self._lock:
+            if self._tokens < 1.0:
+                self._skipped_budget += 1
+                return False
+            self._tokens -= 1.0
+            self._hedges += 1
+            return True
+
+    def record_winner(self, hedge_won):
+        if hedge_won:
+            with self._lock:
+                self._hedge_wins += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': getattr(settings, 'UPSTREAM_HEDGING_ENABLED', False),
+                'percentile': self.percentile,
+                'budget': self.budget,
+                'requests': self._requests,
+                'hedges': self._hedges,
+                'hedge_rate': round(self._hedges / self._requests, 4) if self._requests else 0.0,
+                'hedge_wins': self._hedge_wins,
+                'win_rate': round(self._hedge_wins / self._hedges, 4) if self._hedges else 0.0,
+                'skipped_over_budget': self._skipped_budget,
+                'latency_seconds': percentiles(self._latencies),
+            }
+
+
+_policy = None
+_executor = None
+_lock = threading.Lock()
+
+
+def get_hedge_policy():
+    """Return the process-wide hedge policy"""
+    global _policy
+    if _policy is None:
+        with _lock:
+            if _policy is None:
+                _policy = HedgePolicy()
+    return _policy
+
+
+def get_hedge_executor():
+    """Threads that run hedged sync calls, so the request thread can wait on whichever finishes first"""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'UPSTREAM_HEDGE_WORKERS', 16),
+                    thread_name_prefix='upstream-hedge',
+                )
+    return _executor
@@ -0,0 +1,213 @@
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+import asyncio
+import contextlib
+import threading
+import weakref
+import logging
+
+from .providers import provider_config
+
+# Optional async HTTP client; without it the async service falls back to the sync pool
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamHTTPClient:
+    """Process-wide keep-alive HTTP client with a bounded connection pool"""
+
+    def __init__(self, pool_connections=None, pool_maxsize=None, pool_block=None):
+        # pool_connections: number of distinct hosts to keep pools for
+        # pool_maxsize: max keep-alive connections kept per host
+        # pool_block: wait for a free connection instead of opening extra ones
+        self.pool_connections = pool_connections or getattr(settings, 'UPSTREAM_POOL_CONNECTIONS', 4)
+        self.pool_maxsize = pool_maxsize or getattr(settings, 'UPSTREAM_POOL_MAXSIZE', 10)
+        if pool_block is None:
+            pool_block = getattr(settings, 'UPSTREAM_POOL_BLOCK', False)
+        self.pool_block = pool_block
+
+        self.adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+        )
+        self.session = requests.Session()
+        # Shared by every user's requests: a cookie set by one upstream response must
+        # never ride along on another's (allowed_domains=[] blocks all cookies)
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+
+    def post(self, url, **kwargs):
+        """POST through the shared session, reusing pooled connections"""
+        with self._lock:
+            self._requests += 1
+        try:
+            return self.session.post(url, **kwargs)
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self._errors += 1
+            raise
+
+    def warm(self, url, connections=None, timeout=5):
+        """Open idle keep-alive connections to the host of ``url`` ahead of traffic"""
+        connections = min(connections or self.pool_maxsize, self.pool_maxsize)
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}/"
+
+        def _touch(_):
+            try:
+                # Any response keeps the socket in the pool; the status is irrelevant
+                self.session.head(origin, timeout=timeout, allow_redirects=False).close()
+                return True
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Connection warm-up to {origin} failed: {e}")
+                return False
+
+        # Concurrent requests force the pool to hold several distinct sockets
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            opened = sum(executor.map(_touch, range(connections)))
+        logger.info(f"Warmed {opened}/{connections} connections to {origin}")
+        return opened
+
+    def warm_all(self, urls, connections=None, timeout=5):
+        """warm() each distinct host among urls, one after the other"""
+        origins = {}
+        for url in urls:
+            parts = urlsplit(url)
+            origins.setdefault(f"{parts.scheme}://{parts.netloc}/", url)
+        return sum(self.warm(url, connections, timeout) for url in origins.values())
+
+    def stats(self):
+        """Per-host pool hit/miss counters taken from the underlying urllib3 pools"""
+        hosts = {}
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            served = pool.num_requests
+            opened = pool.num_connections
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                'requests': served,
+                'new_connections': opened,
+                'pool_hits': max(served - opened, 0),
+                'pool_misses': opened,
+                'hit_ratio': round((served - opened) / served, 4) if served else 0.0,
+                'idle_connections': _idle_connections(pool),
+            }
+
+        with self._lock:
+            return {
+                'pool_connections': self.pool_connections,
+                'pool_maxsize': self.pool_maxsize,
+                'pool_block': self.pool_block,
+                'requests': self._requests,
+                'errors': self._errors,
+                'hosts': hosts,
+            }
+
+    def close(self):
+        self.session.close()
+
+
+def _idle_connections(pool):
+    # urllib3 pre-fills the queue with None placeholders, so qsize() is not enough
+    if pool.pool is None:
+        return 0
+    return sum(1 for conn in list(pool.pool.queue) if conn is not None)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Return the process-wide upstream HTTP client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = UpstreamHTTPClient()
+                warm_count = getattr(settings, 'UPSTREAM_POOL_WARM_CONNECTIONS', 0)
+                # Every configured provider (or the mock upstream), not just the default endpoint
+                warm_urls = [url for _, url, *_ in provider_config() if url]
+                if warm_urls and warm_count:
+                    # Warm in the background so the first request never waits on it
+                    threading.Thread(
+                        target=_client.warm_all, args=(warm_urls, warm_count), daemon=True
+                    ).start()
+    return _client
+
+
+def reset_http_client():
+    """Drop the shared client (e.g. after a fork or when settings change)"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+
+
+_async_clients = weakref.WeakKeyDictionary()
+_share_async_clients = False
+
+
+def share_async_http_client(enabled=True):
+    """
+    Keep one httpx.AsyncClient per event loop for the life of the loop. Call this
+    from long-lived loops only (the ASGI entry point does); under WSGI every async
+    view runs on a loop of its own that ends with the request, and a client kept
+    for it would never be closed.
+    """
+    global _share_async_clients
+    _share_async_clients = enabled
+
+
+def _new_async_client():
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=getattr(settings, 'UPSTREAM_ASYNC_MAX_CONNECTIONS', 100),
+            max_keepalive_connections=getattr(settings, 'UPSTREAM_POOL_MAXSIZE', 10),
+        ),
+    )
+
+
+@contextlib.asynccontextmanager
+async def async_http_client():
+    """
+    httpx.AsyncClient for one upstream call (httpx must be installed).
+
+    With share_async_http_client() on, this is the running loop's shared client
+    (httpx clients are bound to the loop they were created on), so keep-alive
+    connections are reused across requests. Otherwise the client is the call's
+    own and is closed when the block exits.
+    """
+    if not _share_async_clients:
+        async with _new_async_client() as client:
+            yield client
+        return
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = _new_async_client()
+    yield client
+
+
+async def aclose_async_http_client():
+    """Close the running loop's shared client, e.g. before a loop that used one ends"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
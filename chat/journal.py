@@ -0,0 +1,195 @@
+from django.conf import settings
+from collections import deque
+import threading
+import asyncio
+import time
+import json
+import logging
+
+from .response_cache import context_hash
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayedUpstreamError(Exception):
+    """A failure recorded in the journal, raised again on replay"""
+
+
+def _last_prompt(payload):
+    for message in reversed(payload.get('messages') or []):
+        if message.get('role') == 'user':
+            return message.get('content', '')
+    return ''
+
+
+class UpstreamJournal:
+    """
+    Append-only JSON-lines journal of upstream calls.
+
+    In 'record' mode every upstream call is appended with its timing: t (seconds
+    since the journal was opened), k (context hash), m (model), s (streamed),
+    p (last user prompt), l (latency), f (time to first token, streams only),
+    and either c (completion text) and u (usage) or e (error).
+
+    In 'replay' mode no network calls are made: each call is answered from the
+    journal after the recorded latency times latency_scale (0 for no delay).
+    Entries are matched by context hash, then by prompt (so changes to context
+    building still find their answers), then taken in recorded order.
+    """
+
+    def __init__(self, mode=None, path=None, latency_scale=None):
+        self.mode = mode or getattr(settings, 'UPSTREAM_JOURNAL_MODE', None)
+        self.path = path or getattr(settings, 'UPSTREAM_JOURNAL_PATH', 'upstream-journal.jsonl')
+        self.latency_scale = latency_scale if latency_scale is not None else getattr(
+            settings, 'UPSTREAM_REPLAY_LATENCY_SCALE', 1.0
+        )
+        self._lock = threading.Lock()
+        self._opened_at = time.monotonic()
+        self._file = None
+        self._by_key = {}
+        self._by_prompt = {}
+        self._sequence = deque()
+        self._recorded = 0
+        self._replayed = {'hash': 0, 'prompt': 0, 'sequential': 0}
+        self._misses = 0
+        if self.replaying:
+            self._load()
+
+    @property
+    def recording(self):
+        return self.mode == 'record'
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    # Recording
+
+    def record(self, payload, latency, data=None, content=None, error=None, first_token=None):
+        """Append one call: its response data, or the streamed content, or the error it raised"""
+        if not self.recording:
+            return
+        usage = None
+        if data is not None:
+            choices = data.get('choices') or [{}]
+            content = (choices[0].get('message') or {}).get('content')
+            usage = data.get('usage')
+        entry = {
+            't': round(time.monotonic() - self._opened_at, 3),
+            'k': context_hash(payload.get('model'), payload.get('messages') or [])[:16],
+            'm': payload.get('model'),
+            's': bool(payload.get('stream')),
+            'p': _last_prompt(payload),
+            'l': round(latency, 4),
+        }
+        if first_token is not None:
+            entry['f'] = round(first_token, 4)
+        if error is not None:
+            entry['e'] = str(error)[:500]
+        else:
+            entry['c'] = content
+            if usage:
+                entry['u'] = usage
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                self._file.write(line)
+                self._file.flush()
+                self._recorded += 1
+            except OSError as e:
+                logger.warning(f"Upstream journal write failed: {e}")
+
+    # Replay
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load upstream journal {self.path}: {e}")
+            entries = []
+        for entry in entries:
+            self._by_key.setdefault(entry['k'], deque()).append(entry)
+            self._by_prompt.setdefault(entry.get('p', ''), deque()).append(entry)
+            self._sequence.append(entry)
+        logger.info(f"Replaying {len(entries)} upstream calls from {self.path}")
+
+    def _take(self, payload):
+        """Next journal entry for this payload; entries are reused round-robin once exhausted"""
+        key = context_hash(payload.get('model'), payload.get('messages') or [])[:16]
+        with self._lock:
+            for match, index in (('hash', self._by_key.get(key)), ('prompt', self._by_prompt.get(_last_prompt(payload))),
+                                 ('sequential', self._sequence)):
+                if index:
+                    entry = index.popleft()
+                    index.append(entry)
+                    self._replayed[match] += 1
+                    return entry
+            self._misses += 1
+        raise ReplayedUpstreamError(f"Upstream journal {self.path} has no entries to replay")
+
+    def _response(self, entry):
+        if 'e' in entry:
+            raise ReplayedUpstreamError(entry['e'])
+        data = {'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': entry.get('c') or ''}}]}
+        if entry.get('u'):
+            data['usage'] = entry['u']
+        return data
+
+    def replay(self, payload):
+        """Recorded response data for payload, after the scaled recorded latency"""
+        entry = self._take(payload)
+        time.sleep(entry['l'] * self.latency_scale)
+        return self._response(entry)
+
+    async def areplay(self, payload):
+        entry = self._take(payload)
+        await asyncio.sleep(entry['l'] * self.latency_scale)
+        return self._response(entry)
+
+    def replay_stream(self, payload):
+        """Yield the recorded completion word by word, paced like the original stream"""
+        entry = self._take(payload)
+        first_token = entry.get('f', entry['l'])
+        time.sleep(first_token * self.latency_scale)
+        if 'e' in entry:
+            raise ReplayedUpstreamError(entry['e'])
+        words = (entry.get('c') or '').split(' ')
+        interval = max(entry['l'] - first_token, 0) / max(len(words), 1) * self.latency_scale
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(interval)
+            yield word if i == len(words) - 1 else word + ' '
+
+    def stats(self):
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'path': self.path if self.mode else None,
+                'recorded': self._recorded,
+                'replayed': dict(self._replayed),
+                'replay_misses': self._misses,
+            }
+
+
+_journal = None
+_journal_config = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    """Return the process-wide journal, reopened if the journal settings changed"""
+    global _journal, _journal_config
+    config = (
+        getattr(settings, 'UPSTREAM_JOURNAL_MODE', None),
+        getattr(settings, 'UPSTREAM_JOURNAL_PATH', None),
+        getattr(settings, 'UPSTREAM_REPLAY_LATENCY_SCALE', 1.0),
+    )
+    if _journal is None or config != _journal_config:
+        with _journal_lock:
+            if _journal is None or config != _journal_config:
+                _journal = UpstreamJournal()
+                _journal_config = config
+    return _journal
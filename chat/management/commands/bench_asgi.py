@@ -0,0 +1,145 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.test import Client, AsyncClient
+from django.test.utils import override_settings
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from chat.models import Conversation
+from chat.mock_upstream import MockUpstreamServer
+from chat.http_client import aclose_async_http_client, share_async_http_client
+import asyncio
+import json
+import threading
+import time
+import uuid
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare concurrent send_message throughput of the sync (WSGI) and async (ASGI) views against '
+        'a mock upstream. Each simulated user has its own account, so the per-user bulkhead limit does '
+        'not reject sends; the command fails if any send does not succeed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Sends per run')
+        parser.add_argument('--concurrency', type=int, default=50, help='Simultaneous simulated users')
+        parser.add_argument('--wsgi-workers', type=int, default=8, help='Worker threads available to the WSGI run')
+        parser.add_argument('--upstream-latency', type=float, default=0.2, help='Mock upstream latency in seconds')
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        concurrency = options['concurrency']
+
+        upstream = MockUpstreamServer(latency=options['upstream_latency']).start()
+        User = get_user_model()
+        run_id = uuid.uuid4().hex[:8]
+        users = [
+            User.objects.create_user(username=f"bench-{run_id}-{i}", email=f"bench-{run_id}-{i}@bench.local", password=uuid.uuid4().hex)
+            for i in range(concurrency)
+        ]
+
+        try:
+            # One user with one titled conversation per sender, so every send is exactly one
+            # upstream call and no user ever has more than one send in flight
+            senders = []
+            for i, user in enumerate(users):
+                login = Client()
+                login.force_login(user)
+                senders.append((login.cookies, Conversation.objects.create(user=user, title=f"bench {i}").id))
+
+            with override_settings(EURON_API_URL=upstream.url, EURON_API_KEY='bench-key'):
+                wsgi = self.run_wsgi(senders, total, options['wsgi_workers'])
+                asgi = asyncio.run(self.run_asgi(senders, total, concurrency))
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            upstream.stop()
+
+        self.stdout.write(json.dumps({
+            'requests': total,
+            'concurrency': concurrency,
+            'wsgi_workers': options['wsgi_workers'],
+            'upstream_latency_s': options['upstream_latency'],
+            'wsgi': wsgi,
+            'asgi': asgi,
+            'speedup': round(asgi['throughput_rps'] / wsgi['throughput_rps'], 2) if wsgi['throughput_rps'] else None,
+        }, indent=2))
+        errors = wsgi['errors'] + asgi['errors']
+        if errors:
+            raise CommandError(
+                f"{errors} of {2 * total} sends failed (WSGI {wsgi['statuses']}, ASGI {asgi['statuses']}); "
+                "throughput above counts successes only"
+            )
+
+    def run_wsgi(self, senders, total, workers):
+        """Sync view through the WSGI-style handler; each in-flight send holds a worker thread"""
+        local = threading.local()
+
+        def send(i):
+            cookies, conversation_id = senders[i % len(senders)]
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            local.client.cookies = cookies
+            start = time.perf_counter()
+            response = local.client.post(
+                '/chat/send/',
+                json.dumps({'message': f"bench message {i}", 'conversation_id': conversation_id}),
+                content_type='application/json',
+                secure=True,
+            )
+            return time.perf_counter() - start, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(send, range(total)))
+        return self.summarize(results, time.perf_counter() - started)
+
+    async def run_asgi(self, senders, total, concurrency):
+        """Async view through the ASGI handler; in-flight sends only hold a coroutine"""
+        clients = []
+        for cookies, _ in senders:
+            client = AsyncClient()
+            client.cookies = cookies
+            clients.append(client)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send(i):
+            async with semaphore:
+                client = clients[i % len(senders)]
+                start = time.perf_counter()
+                response = await client.post(
+                    '/chat/async/send/',
+                    json.dumps({'message': f"bench message {i}", 'conversation_id': senders[i % len(senders)][1]}),
+                    content_type='application/json',
+                    secure=True,
+                )
+                return time.perf_counter() - start, response.status_code
+
+        # One loop for the whole run, as under an ASGI server (see genai_project/asgi.py)
+        share_async_http_client()
+        try:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(send(i) for i in range(total)))
+            return self.summarize(results, time.perf_counter() - started)
+        finally:
+            await aclose_async_http_client()
+            share_async_http_client(False)
+
+    def summarize(self, results, elapsed):
+        """Throughput and latency of the successful sends; failures are only counted"""
+        latencies = sorted(latency for latency, status in results if status == 200)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 1)
+
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(latencies) / elapsed, 2),
+            'errors': len(results) - len(latencies),
+            'statuses': dict(Counter(status for _, status in results)),
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+        }
@@ -0,0 +1,184 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from concurrent.futures import ThreadPoolExecutor
+from chat.mock_upstream import MockUpstreamServer
+import subprocess
+import json
+import time
+import uuid
+
+STEPS = ('login', 'new_conversation', 'send_message', 'conversation_detail')
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive concurrent simulated users through login, new_conversation, send_message and '
+        'conversation_detail against a local mock upstream and report throughput, latency '
+        'percentiles, DB queries and CPU time per request as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Concurrent simulated users')
+        parser.add_argument('--turns', type=int, default=5, help='send_message calls per user')
+        parser.add_argument('--upstream-latency', default='fixed:0.1', help='Mock upstream latency spec (see mock_llm --latency)')
+        parser.add_argument('--token-rate', type=float, default=0, help='Mock upstream tokens per second (0 = instant)')
+        parser.add_argument('--reply-tokens', type=int, default=60, help='Mock reply length in tokens')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default=None, help='Also write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        users = options['users']
+        upstream = MockUpstreamServer(
+            latency=options['upstream_latency'],
+            reply_text=None,
+            reply_tokens=options['reply_tokens'],
+            token_rate=options['token_rate'] or None,
+            seed=options['seed'],
+        ).start()
+
+        User = get_user_model()
+        # Accounts left behind by a run that was killed before its cleanup
+        stale, _ = User.objects.filter(username__startswith='bench-', email__endswith='@bench.local').delete()
+        if stale:
+            self.stderr.write(f"Removed {stale} rows left over from earlier bench runs")
+        password = uuid.uuid4().hex
+        run_id = uuid.uuid4().hex[:8]
+        accounts = []
+        try:
+            # Throwaway accounts, deleted with their conversations however the run ends
+            for i in range(users):
+                username = f"bench-{run_id}-{i}"
+                User.objects.create_user(username=username, email=f"{username}@bench.local", password=password)
+                accounts.append(f"{username}@bench.local")
+
+            with override_settings(UPSTREAM_MOCK_URL=upstream.url):
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=users) as executor:
+                    samples = [
+                        sample
+                        for user_samples in executor.map(
+                            lambda i: self.simulate_user(i, accounts[i], password, options['turns']), range(users)
+                        )
+                        for sample in user_samples
+                    ]
+                elapsed = time.perf_counter() - started
+        finally:
+            User.objects.filter(username__startswith=f"bench-{run_id}-").delete()
+            upstream.stop()
+
+        report = {
+            'revision': _git_revision(),
+            'users': users,
+            'turns_per_user': options['turns'],
+            'upstream_latency': options['upstream_latency'],
+            'token_rate': options['token_rate'],
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(samples) / elapsed, 2),
+            'send_message_rps': round(sum(1 for s in samples if s['step'] == 'send_message') / elapsed, 2),
+            'steps': {step: self.summarize([s for s in samples if s['step'] == step]) for step in STEPS},
+            'all': self.summarize(samples),
+            'upstream_responses': upstream.stats(),
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+        errors = report['all'].get('errors', 0)
+        if errors:
+            raise CommandError(f"{errors} of {len(samples)} requests failed; see 'statuses' in the report")
+
+    def measure(self, step, request):
+        """Run one request, timing wall clock and this thread's CPU and counting its DB queries"""
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(1)
+            return execute(sql, params, many, context)
+
+        # The test client runs the view in this thread, on this thread's DB connection
+        with connection.execute_wrapper(count):
+            cpu = time.thread_time()
+            start = time.perf_counter()
+            response = request()
+            latency = time.perf_counter() - start
+            cpu = time.thread_time() - cpu
+        return response, {
+            'step': step,
+            'latency': latency,
+            'cpu': cpu,
+            'queries': len(queries),
+            'status': response.status_code,
+        }
+
+    def simulate_user(self, index, email, password, turns):
+        # A view that raises counts as a 500 sample rather than ending this user's run
+        client = Client(raise_request_exception=False)
+        samples = []
+        try:
+            response, sample = self.measure('login', lambda: client.post(
+                '/accounts/login/', {'username': email, 'password': password}, secure=True
+            ))
+            sample['ok'] = response.status_code == 302
+            samples.append(sample)
+
+            response, sample = self.measure('new_conversation', lambda: client.post(
+                '/chat/new/', json.dumps({}), content_type='application/json', secure=True
+            ))
+            conversation_id = response.json().get('conversation_id') if response.status_code == 200 else None
+            sample['ok'] = conversation_id is not None
+            samples.append(sample)
+
+            for turn in range(turns):
+                response, sample = self.measure('send_message', lambda: client.post(
+                    '/chat/send/',
+                    json.dumps({'message': f"Bench user {index} turn {turn}: explain request coalescing", 'conversation_id': conversation_id}),
+                    content_type='application/json',
+                    secure=True,
+                ))
+                sample['ok'] = response.status_code == 200
+                samples.append(sample)
+
+            response, sample = self.measure('conversation_detail', lambda: client.get(
+                f'/chat/conversation/{conversation_id}/', secure=True
+            ))
+            sample['ok'] = response.status_code == 200
+            samples.append(sample)
+        finally:
+            connection.close()
+        return samples
+
+    def summarize(self, samples):
+        if not samples:
+            return {'requests': 0}
+        latencies = sorted(s['latency'] for s in samples)
+
+        def percentile(p):
+            return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000, 1)
+
+        statuses = {}
+        for s in samples:
+            statuses[str(s['status'])] = statuses.get(str(s['status']), 0) + 1
+        return {
+            'requests': len(samples),
+            'errors': sum(1 for s in samples if not s['ok']),
+            'statuses': statuses,
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'db_queries_per_request': round(sum(s['queries'] for s in samples) / len(samples), 2),
+            'cpu_ms_per_request': round(sum(s['cpu'] for s in samples) / len(samples) * 1000, 2),
+        }
@@ -84,7 +84,7 @@ class Command(BaseCommand):
         
         # WhiteNoise
         middleware = settings.MIDDLEWARE
-        if 'whitenoise.middleware.WhiteNoiseMiddleware' in middleware:
+        if any(m.endswith('WhiteNoiseMiddleware') for m in middleware):
             self.stdout.write(self.style.SUCCESS('  ✅ WhiteNoise: Configured'))
         else:
             self.stdout.write(self.style.WARNING('  ⚠️  WhiteNoise: Not configured'))
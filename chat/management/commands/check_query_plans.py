@@ -0,0 +1,229 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from collections import namedtuple
+from chat.models import Conversation, Message
+import json
+import re
+import uuid
+
+# One hot query: the queryset as the app runs it, the tables it must not scan in
+# full, whether an index must deliver its ORDER BY, and the most rows it may visit.
+# gap names a known shortfall that is reported on every run instead of failing it.
+HotQuery = namedtuple('HotQuery', 'name queryset tables ordered budget gap', defaults=(None,))
+
+HOT_TABLES = (Message._meta.db_table, Conversation._meta.db_table)
+_sqlite_scan = re.compile(r"^SCAN (\w+)")
+_sqlite_index = re.compile(r"USING (?:COVERING )?INDEX (\w+)|USING INTEGER PRIMARY KEY")
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a large chat dataset inside a transaction that is rolled back, EXPLAIN the hot '
+        'chat queries and fail if any scans a hot table in full, sorts what an index should '
+        'deliver in order, or (PostgreSQL) visits more rows than its budget. Run it against a '
+        'development or CI database after changing models or queries.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Seeded users')
+        parser.add_argument('--conversations', type=int, default=10, help='Conversations per seeded user')
+        parser.add_argument('--messages', type=int, default=20, help='Messages per seeded conversation')
+        parser.add_argument('--long-conversation', type=int, default=5000, help='Messages in the one long conversation')
+        parser.add_argument('--show-plans', action='store_true', help='Print every plan, not only failing ones')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f"Query plan checks support SQLite and PostgreSQL, not {connection.vendor}")
+
+        self.show_plans = options['show_plans']
+        failures = []
+        with transaction.atomic():
+            try:
+                user, conversation = self.seed(options)
+                self.analyze()
+                for query in self.hot_queries(user, conversation, options):
+                    problems, summary = self.check_plan(query)
+                    status = self.style.ERROR('FAIL') if problems else self.style.SUCCESS('ok')
+                    self.stdout.write(f"{status:<4} {query.name}: {summary}")
+                    for problem in problems:
+                        self.stdout.write(f"     - {problem}")
+                    if query.gap:
+                        self.stdout.write(self.style.WARNING(f"     - known gap: {query.gap}"))
+                    if problems:
+                        failures.append(query.name)
+            finally:
+                transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot quer{'y' if len(failures) == 1 else 'ies'} regressed: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS('All hot queries use their indexes'))
+
+    def seed(self, options):
+        """Bulk-insert the dataset; returns the heaviest user and their long conversation"""
+        User = get_user_model()
+        run_id = uuid.uuid4().hex[:8]
+        users = User.objects.bulk_create([
+            User(username=f"plans-{run_id}-{i}", email=f"plans-{run_id}-{i}@plans.local", password='!')
+            for i in range(options['users'])
+        ])
+        conversations = Conversation.objects.bulk_create([
+            Conversation(user=user, title=f"Conversation {i}")
+            for user in users for i in range(options['conversations'])
+        ], batch_size=2000)
+        long_conversation = Conversation.objects.create(user=users[0], title='Long conversation')
+
+        def messages():
+            for conversation in conversations:
+                for i in range(options['messages']):
+                    yield Message(conversation=conversation, content=f"Message {i}", is_from_user=i % 2 == 0, token_count=3)
+            for i in range(options['long_conversation']):
+                yield Message(conversation=long_conversation, content=f"Message {i}", is_from_user=i % 2 == 0, token_count=3)
+
+        batch = []
+        for message in messages():
+            batch.append(message)
+            if len(batch) >= 5000:
+                Message.objects.bulk_create(batch)
+                batch = []
+        Message.objects.bulk_create(batch)
+        self.stdout.write(
+            f"Seeded {len(users)} users, {len(conversations) + 1} conversations, "
+            f"{len(conversations) * options['messages'] + options['long_conversation']} messages"
+        )
+        return users[0], long_conversation
+
+    def analyze(self):
+        """Refresh planner statistics so plans reflect the seeded sizes"""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+            else:
+                for table in HOT_TABLES + (get_user_model()._meta.db_table,):
+                    cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+
+    def hot_queries(self, user, conversation, options):
+        """The chat app's hot queries, as its views and services issue them"""
+        history_window = 50
+        long_messages = options['long_conversation']
+        user_messages = options['conversations'] * options['messages'] + long_messages
+        return [
+            HotQuery(
+                'recent_history (AIService._recent_history)',
+                conversation.messages.order_by('-created_at').only(
+                    'conversation', 'content', 'is_from_user', 'token_count', 'created_at'
+                )[:history_window],
+                HOT_TABLES, True, history_window,
+            ),
+            HotQuery(
+                'unsummarized_history (tasks.update_conversation_summary)',
+                conversation.messages.order_by('created_at').filter(
+                    created_at__gt=conversation.created_at
+                ).only('conversation', 'content', 'is_from_user', 'created_at'),
+                HOT_TABLES, True, long_messages,
+            ),
+            HotQuery(
+                'first_user_message (Conversation.save)',
+                conversation.messages.filter(is_from_user=True).order_by('created_at')[:1],
+                HOT_TABLES, True, 10,
+            ),
+            HotQuery(
+                'sidebar_conversations (views.home)',
+                Conversation.objects.filter(user=user).order_by('-updated_at')[:10],
+                HOT_TABLES, True, 10,
+            ),
+            HotQuery(
+                'conversation_list_page (ConversationListView)',
+                Conversation.objects.filter(user=user)[:20],
+                HOT_TABLES, True, 20,
+            ),
+            HotQuery(
+                'user_messages (MessageViewSet)',
+                Message.objects.filter(conversation__user=user),
+                HOT_TABLES, False, user_messages + options['conversations'] + 1,
+                gap=(
+                    "sorts all of the user's messages by created_at (Meta.ordering): no index holds "
+                    "them in that order across conversations, and the endpoint is not paginated"
+                ),
+            ),
+            HotQuery(
+                'index_catch_up (MessageRetriever._catch_up)',
+                Message.objects.filter(conversation_id=conversation.pk, id__gt=0).order_by('id').values_list('id', 'content'),
+                HOT_TABLES, False, long_messages,
+            ),
+        ]
+
+    def check_plan(self, query):
+        """(problems, one-line summary) for one hot query's plan"""
+        sql, params = query.queryset.query.sql_with_params()
+        if connection.vendor == 'sqlite':
+            return self.check_sqlite(query, sql, params)
+        return self.check_postgresql(query, sql, params)
+
+    def check_sqlite(self, query, sql, params):
+        """
+        EXPLAIN QUERY PLAN shows access paths but no row counts, so on SQLite the
+        row budget is enforced indirectly: an index SEARCH that also delivers the
+        order visits only the rows it returns.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            details = [row[3] for row in cursor.fetchall()]
+        problems = []
+        for detail in details:
+            match = _sqlite_scan.match(detail)
+            if match and match.group(1) in query.tables:
+                problems.append(f"full scan: {detail}")
+            if query.ordered and 'TEMP B-TREE FOR ORDER BY' in detail:
+                problems.append(f"sorts instead of reading an index in order: {detail}")
+        indexes = [found.group(1) or 'rowid' for found in map(_sqlite_index.search, details) if found]
+        if not indexes:
+            problems.append('uses no index')
+        if self.show_plans or problems:
+            for detail in details:
+                self.stdout.write(f"     {detail}")
+        return problems, f"indexes {', '.join(indexes) or '-'}"
+
+    def check_postgresql(self, query, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        root = plan[0]['Plan']
+
+        problems = []
+        indexes = []
+        visited = 0
+        nodes = [root]
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.get('Plans', []))
+            node_type = node['Node Type']
+            if node_type == 'Seq Scan' and node.get('Relation Name') in query.tables:
+                problems.append(f"full scan of {node['Relation Name']}")
+            if query.ordered and node_type in ('Sort', 'Incremental Sort'):
+                problems.append(f"sorts instead of reading an index in order ({node.get('Sort Key')})")
+            if node.get('Index Name'):
+                indexes.append(node['Index Name'])
+            # A bitmap index scan's rows are counted again by the heap scan above it
+            if 'Scan' in node_type and node_type != 'Bitmap Index Scan':
+                rows = node.get('Actual Rows', 0) + node.get('Rows Removed by Filter', 0)
+                rows += node.get('Rows Removed by Index Recheck', 0)
+                visited += rows * node.get('Actual Loops', 1)
+        if not indexes:
+            problems.append('uses no index')
+        if visited > query.budget:
+            problems.append(f"visits {visited} rows, budget {query.budget}")
+        if self.show_plans or problems:
+            self.stdout.write(self._format_plan(root))
+        return problems, f"indexes {', '.join(indexes) or '-'}, {visited}/{query.budget} rows visited"
+
+    def _format_plan(self, node, depth=0):
+        line = f"     {'  ' * depth}{node['Node Type']}"
+        if node.get('Relation Name'):
+            line += f" on {node['Relation Name']}"
+        if node.get('Index Name'):
+            line += f" using {node['Index Name']}"
+        line += f" (rows={node.get('Actual Rows')} loops={node.get('Actual Loops')})"
+        return '\n'.join([line] + [self._format_plan(child, depth + 1) for child in node.get('Plans', [])])
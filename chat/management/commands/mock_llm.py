@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from chat.mock_upstream import MockUpstreamServer, parse_latency
+import json
+
+
+class Command(BaseCommand):
+    help = 'Run a local OpenAI-compatible mock LLM server for load and latency testing (no upstream credits used)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8900)
+        parser.add_argument(
+            '--latency', default='lognormal:0.4,0.5',
+            help="Time to first token: SECONDS, fixed:S, uniform:MIN,MAX, normal:MEAN,SD, lognormal:MEDIAN,SIGMA or exp:MEAN",
+        )
+        parser.add_argument('--token-rate', type=float, default=60.0, help='Tokens per second after the first (0 = instant)')
+        parser.add_argument('--reply-tokens', type=int, default=80, help='Length of generated replies in tokens (words)')
+        parser.add_argument('--reply-text', default=None, help='Fixed reply instead of a generated one')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with --error-status')
+        parser.add_argument('--error-status', type=int, default=500)
+        parser.add_argument('--burst-every', type=float, default=0, help='Period in seconds of 429 bursts (0 = none)')
+        parser.add_argument('--burst-duration', type=float, default=0, help='Length in seconds of each 429 burst')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the latency and error sequence')
+
+    def handle(self, *args, **options):
+        try:
+            parse_latency(options['latency'])
+        except (ValueError, IndexError) as e:
+            raise CommandError(f"Invalid --latency: {e}")
+
+        server = MockUpstreamServer(
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency'],
+            reply_text=options['reply_text'],
+            reply_tokens=options['reply_tokens'],
+            token_rate=options['token_rate'] or None,
+            error_rate=options['error_rate'],
+            error_status=options['error_status'],
+            burst_every=options['burst_every'],
+            burst_duration=options['burst_duration'],
+            seed=options['seed'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"Mock LLM listening on {server.url}"))
+        self.stdout.write(f"Point the app at it with UPSTREAM_MOCK_URL={server.url}")
+        self.stdout.write("Quit with CONTROL-C.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.httpd.server_close()
+            self.stdout.write(json.dumps({'responses_by_status': server.stats()}))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='title_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('final', 'Final')], default='final', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_conversation_title_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='response_cache_opt_out',
+            field=models.BooleanField(default=False, help_text='Always ask the model, never reuse cached answers'),
+        ),
+    ]
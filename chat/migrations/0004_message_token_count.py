@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:08
+
+from django.db import migrations, models
+
+
+def backfill_token_counts(apps, schema_editor):
+    # Same estimate as chat.context.estimate_tokens, frozen here so the migration stays stable
+    Message = apps.get_model('chat', 'Message')
+    batch = []
+    for message in Message.objects.filter(token_count__isnull=True).only('id', 'content').iterator(chunk_size=2000):
+        text = message.content or ''
+        message.token_count = max(1, int(max(len(text) / 4, len(text.split()) * 1.3))) if text else 0
+        batch.append(message)
+        if len(batch) >= 2000:
+            Message.objects.bulk_update(batch, ['token_count'])
+            batch = []
+    if batch:
+        Message.objects.bulk_update(batch, ['token_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_conversation_response_cache_opt_out'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='token_count',
+            field=models.PositiveIntegerField(blank=True, help_text='Estimated tokens in content, computed once on save', null=True),
+        ),
+        migrations.RunPython(backfill_token_counts, migrations.RunPython.noop),
+    ]
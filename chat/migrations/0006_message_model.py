@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_conversation_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='model',
+            field=models.CharField(blank=True, help_text='Model that wrote this answer (blank for user messages)', max_length=100),
+        ),
+    ]
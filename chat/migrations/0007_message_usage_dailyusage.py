@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('chat', '0006_message_model'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='completion_tokens',
+            field=models.PositiveIntegerField(blank=True, help_text='Completion tokens of the upstream call behind this answer', null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='prompt_tokens',
+            field=models.PositiveIntegerField(blank=True, help_text='Prompt tokens of the upstream call behind this answer (null: no call, e.g. a cached answer)', null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='upstream_latency',
+            field=models.FloatField(blank=True, help_text='Seconds the upstream call behind this answer took', null=True),
+        ),
+        migrations.CreateModel(
+            name='DailyUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(blank=True, max_length=100)),
+                ('day', models.DateField()),
+                ('answers', models.PositiveIntegerField(default=0, help_text='AI messages saved')),
+                ('upstream_calls', models.PositiveIntegerField(default=0, help_text='Answers that needed an upstream call (the rest were cached or shared)')),
+                ('prompt_tokens', models.PositiveBigIntegerField(default=0)),
+                ('completion_tokens', models.PositiveBigIntegerField(default=0)),
+                ('upstream_seconds', models.FloatField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'daily usage',
+                'ordering': ['-day', 'model'],
+                'indexes': [models.Index(fields=['day'], name='chat_dailyusage_day')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyusage',
+            constraint=models.UniqueConstraint(fields=('user', 'model', 'day'), name='chat_dailyusage_user_model_day'),
+        ),
+    ]
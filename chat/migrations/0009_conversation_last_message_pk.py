@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-17 06:54
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def backfill_last_message_pk(apps, schema_editor):
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+    newest = (
+        Message.objects.filter(conversation=OuterRef('pk'))
+        .values('conversation').annotate(newest=Max('pk')).values('newest')
+    )
+    Conversation.objects.update(last_message_pk=Subquery(newest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_pk',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='pk of the newest message; cached histories must end with it (see chat/context_cache.py)', null=True),
+        ),
+        migrations.RunPython(backfill_last_message_pk, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,239 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import threading
+import random
+import math
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+FILLER_WORDS = (
+    "the model considers your question carefully and answers with a short explanation "
+    "covering the main idea an example and a note on common pitfalls to watch for"
+).split()
+
+
+def parse_latency(spec):
+    """
+    Latency model from a spec string, returned as a function of a random.Random:
+    '0.2' or 'fixed:0.2', 'uniform:MIN,MAX', 'normal:MEAN,SD',
+    'lognormal:MEDIAN,SIGMA' or 'exp:MEAN' (all in seconds, never negative).
+    """
+    if isinstance(spec, (int, float)):
+        value = float(spec)
+        return lambda rng: value
+    kind, _, args = str(spec).partition(':')
+    if not args:
+        kind, args = 'fixed', kind
+    params = [float(x) for x in args.split(',')]
+    models = {
+        'fixed': lambda rng: params[0],
+        'uniform': lambda rng: rng.uniform(params[0], params[1]),
+        'normal': lambda rng: rng.gauss(params[0], params[1]),
+        'lognormal': lambda rng: params[0] * math.exp(rng.gauss(0, params[1])),
+        'exp': lambda rng: rng.expovariate(1 / params[0]),
+    }
+    if kind not in models:
+        raise ValueError(f"Unknown latency distribution '{kind}'")
+    model = models[kind]
+    return lambda rng: max(model(rng), 0.0)
+
+
+class MockCompletionHandler(BaseHTTPRequestHandler):
+    """
+    OpenAI-compatible /chat/completions endpoint. Latency is time to first token;
+    with a token rate, tokens then follow at that rate (streamed or not).
+    """
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            payload = {}
+
+        server = self.server
+        failure = server.next_failure()
+        if failure:
+            status, retry_after = failure
+            self._send_error(status, retry_after)
+            return
+
+        time.sleep(server.next_latency())
+        reply = server.reply_for(payload)
+
+        if payload.get('stream'):
+            self._send_stream(reply)
+        else:
+            words = reply.split(' ')
+            if server.token_rate:
+                time.sleep(len(words) / server.token_rate)
+            server.count(200)
+            self._send_json(200, {
+                'id': 'mock-completion',
+                'object': 'chat.completion',
+                'model': payload.get('model', 'mock'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': reply},
+                    'finish_reason': 'stop',
+                }],
+                'usage': server.usage(payload, len(words)),
+            })
+
+    def do_HEAD(self):
+        # Used by connection warm-up
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send_error(self, status, retry_after=None):
+        self.server.count(status)
+        body = json.dumps({'error': {'message': 'Injected mock failure', 'code': status}}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if retry_after is not None:
+            self.send_header('Retry-After', str(retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, reply):
+        self.server.count(200)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        interval = 1 / self.server.token_rate if self.server.token_rate else 0
+        for i, word in enumerate(reply.split(' ')):
+            if interval and i:
+                time.sleep(interval)
+            chunk = {'choices': [{'index': 0, 'delta': {'content': word + ' '}}]}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 512  # the default backlog of 5 drops connections under load tests
+
+    def setup_behaviour(self, latency, reply_text, reply_tokens, token_rate, error_rate, error_status,
+                        burst_every, burst_duration, seed):
+        self.latency_model = parse_latency(latency)
+        self.reply_text = reply_text
+        self.reply_tokens = reply_tokens
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.burst_every = burst_every
+        self.burst_duration = burst_duration
+        # One seeded generator: the sequence of latencies and injected errors is the same every run
+        self.rng = random.Random(seed)
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.status_counts = {}
+
+    def next_latency(self):
+        with self._lock:
+            return self.latency_model(self.rng)
+
+    def next_failure(self):
+        """(status, retry_after) for an injected failure, or None"""
+        if self.burst_every and self.burst_duration:
+            phase = (time.monotonic() - self.started_at) % self.burst_every
+            if phase >= self.burst_every - self.burst_duration:
+                return 429, max(1, math.ceil(self.burst_every - phase))
+        if self.error_rate:
+            with self._lock:
+                failed = self.rng.random() < self.error_rate
+            if failed:
+                return self.error_status, None
+        return None
+
+    def reply_for(self, payload):
+        if self.reply_text:
+            return self.reply_text
+        # Deterministic reply derived from the last user message
+        messages = payload.get('messages') or [{}]
+        prompt = ' '.join(str(messages[-1].get('content', '')).split()[:8])
+        words = f"Mock answer to: {prompt}.".split()
+        while len(words) < self.reply_tokens:
+            words.append(FILLER_WORDS[len(words) % len(FILLER_WORDS)])
+        return ' '.join(words[:max(self.reply_tokens, 1)])
+
+    def usage(self, payload, completion_tokens):
+        prompt_chars = sum(len(str(m.get('content', ''))) for m in payload.get('messages') or [])
+        prompt_tokens = prompt_chars // 4
+        return {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+        }
+
+    def count(self, status):
+        with self._lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+
+class MockUpstreamServer:
+    """
+    Local stand-in for the Euron API, run in a background thread.
+
+    latency is a number or a parse_latency() spec for time to first token;
+    token_rate (tokens/s, None for instant) paces the rest of the reply, which
+    is reply_text or a generated reply of reply_tokens words. error_rate
+    injects error_status responses at random; every burst_every seconds the
+    last burst_duration seconds answer 429 with Retry-After. seed makes the
+    latency and error sequence repeatable.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.2, reply_text="This is a mock response.",
+                 reply_tokens=50, token_rate=None, error_rate=0.0, error_status=500,
+                 burst_every=0, burst_duration=0, seed=0):
+        self.httpd = _MockHTTPServer((host, port), MockCompletionHandler)
+        self.httpd.setup_behaviour(
+            latency, reply_text, reply_tokens, token_rate, error_rate, error_status,
+            burst_every, burst_duration, seed,
+        )
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def stats(self):
+        with self.httpd._lock:
+            return dict(self.httpd.status_counts)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,125 @@
+from django.conf import settings
+from collections import deque
+import threading
+import re
+import logging
+
+from .resilience import percentiles
+
+logger = logging.getLogger(__name__)
+
+_code = re.compile(
+    r"```|`[^`\n]+`|^\s*(def|class|import|from|for|while|if|return|const|let|var|function|public|SELECT|#include)\b"
+    r"|[{};]\s*$|=>|\w+\([^)]*\)\s*[:{]|Traceback \(most recent call last\)",
+    re.MULTILINE,
+)
+_trivial = re.compile(
+    r"^\s*(hi|hello|hey|thanks|thank you|thx|ok|okay|yes|no|sure|cool|great|nice|bye|good (morning|night))\b[\s!.?]*$",
+    re.IGNORECASE,
+)
+_complex_words = frozenset("""
+explain why how compare contrast design implement debug optimize optimise analyze analyse prove derive
+refactor architecture difference tradeoff tradeoffs algorithm complexity error exception traceback
+step-by-step evaluate summarize summarise translate calculate
+""".split())
+_word = re.compile(r"[a-z][a-z'-]*")
+
+
+class RoutingDecision:
+    """The model picked for one request, with the features and score behind the pick"""
+
+    def __init__(self, model, tier, score, features):
+        self.model = model
+        self.tier = tier
+        self.score = score
+        self.features = features
+
+    def __repr__(self):
+        return f"<RoutingDecision {self.model} score={self.score}>"
+
+
+class ModelRouter:
+    """
+    Picks a model per request from a ladder ordered fastest/cheapest first.
+
+    Each prompt gets a complexity score in [0, 1] from local features only: its
+    length, the history sent with it, whether it contains code, and whether it
+    is a trivial acknowledgement or a technical/analytical question. The score
+    climbs one rung of the ladder per threshold it reaches. Disabled, every
+    request uses the service's default model.
+    """
+
+    SAMPLE_SIZE = 512
+    LONG_PROMPT_CHARS = 800
+    LONG_HISTORY_MESSAGES = 20
+
+    def __init__(self, enabled=None, ladder=None, thresholds=None):
+        self.enabled = enabled if enabled is not None else getattr(settings, 'MODEL_ROUTING_ENABLED', False)
+        self.ladder = list(ladder or getattr(settings, 'MODEL_LADDER', None) or ['gpt-4.1-nano'])
+        self.thresholds = sorted(thresholds or getattr(settings, 'MODEL_ROUTING_THRESHOLDS', None) or [0.35, 0.7])
+        self._lock = threading.Lock()
+        self._decisions = {}
+        self._latencies = {}
+
+    def features(self, message, messages):
+        words = _word.findall(message.lower())
+        return {
+            'chars': len(message),
+            'history': max(sum(1 for m in messages if m['role'] != 'system') - 1, 0),
+            'code': bool(_code.search(message)),
+            'trivial': bool(_trivial.match(message)),
+            'technical': sum(1 for w in words if w in _complex_words),
+        }
+
+    def score(self, features):
+        if features['trivial']:
+            return 0.0
+        score = 0.35 * min(features['chars'] / self.LONG_PROMPT_CHARS, 1.0)
+        score += 0.15 * min(features['history'] / self.LONG_HISTORY_MESSAGES, 1.0)
+        if features['code']:
+            score += 0.4
+        score += 0.15 * min(features['technical'], 2)
+        return round(min(score, 1.0), 3)
+
+    def route(self, message, messages):
+        """RoutingDecision for a user message and the context built for it"""
+        features = self.features(message, messages)
+        score = self.score(features)
+        tier = min(sum(1 for t in self.thresholds if score >= t), len(self.ladder) - 1)
+        decision = RoutingDecision(self.ladder[tier], tier, score, features)
+        # Counted and logged here, whether the answer then comes from upstream, the cache or a shared call
+        with self._lock:
+            self._decisions[decision.model] = self._decisions.get(decision.model, 0) + 1
+        logger.info(f"Model routing: {decision.model} (tier {tier}, score {score}, {features})")
+        return decision
+
+    def record(self, decision, latency, ok=True):
+        """Log the upstream call behind a routed request; latencies feed the per-model percentiles"""
+        logger.info(f"Model routing: {decision.model} {'answered' if ok else 'failed'} upstream in {latency:.3f}s")
+        if ok:
+            with self._lock:
+                self._latencies.setdefault(decision.model, deque(maxlen=self.SAMPLE_SIZE)).append(latency)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'ladder': self.ladder,
+                'thresholds': self.thresholds,
+                'decisions': dict(self._decisions),
+                'latency_seconds': {model: percentiles(list(samples)) for model, samples in self._latencies.items()},
+            }
+
+
+_model_router = None
+_model_router_lock = threading.Lock()
+
+
+def get_model_router():
+    """Return the process-wide model router"""
+    global _model_router
+    if _model_router is None:
+        with _model_router_lock:
+            if _model_router is None:
+                _model_router = ModelRouter()
+    return _model_router
@@ -1,18 +1,36 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from .context import estimate_tokens
 
 User = get_user_model()
 
 
 class Conversation(models.Model):
     """Model to store chat conversations"""
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations')
+    TITLE_PENDING = 'pending'  # provisional title, a generated one is on its way
+    TITLE_FINAL = 'final'  # generated or set by the user; never overwritten in the background
+    TITLE_STATUS_CHOICES = [
+        (TITLE_PENDING, 'Pending'),
+        (TITLE_FINAL, 'Final'),
+    ]
+    
+    # No index of its own: chat_conv_user_updated leads with user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations', db_index=False)
     title = models.CharField(max_length=200, blank=True)
+    title_status = models.CharField(max_length=10, choices=TITLE_STATUS_CHOICES, default=TITLE_FINAL)
+    response_cache_opt_out = models.BooleanField(default=False, help_text="Always ask the model, never reuse cached answers")
+    summary = models.TextField(blank=True, help_text="Running summary of messages up to summary_until")
+    summary_until = models.DateTimeField(null=True, blank=True, help_text="created_at of the last message folded into the summary")
+    last_message_pk = models.BigIntegerField(null=True, blank=True, editable=False, help_text="pk of the newest message; cached histories must end with it (see chat/context_cache.py)")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            # A user's conversations, most recent first (sidebar, list views, API)
+            models.Index(fields=['user', '-updated_at'], name='chat_conv_user_updated'),
+        ]
     
     def __str__(self):
         return f"Conversation {self.id} - {self.user.username}"
@@ -24,19 +42,71 @@ class Conversation(models.Model):
             first_message = self.messages.filter(is_from_user=True).first()
             if first_message:
                 self.title = first_message.content[:50] + ('...' if len(first_message.content) > 50 else '')
+        # last_message_pk only moves through conditional updates as messages are saved;
+        # writing back a copy loaded earlier could rewind it past messages written since
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'last_message_pk'
+            ]
         super().save(*args, **kwargs)
 
 
 class Message(models.Model):
     """Model to store individual messages in conversations"""
-    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages')
+    # No index of its own: chat_msg_conv_created leads with conversation
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages', db_index=False)
     content = models.TextField()
     is_from_user = models.BooleanField(default=True)
+    token_count = models.PositiveIntegerField(null=True, blank=True, help_text="Estimated tokens in content, computed once on save")
+    model = models.CharField(max_length=100, blank=True, help_text="Model that wrote this answer (blank for user messages)")
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True, help_text="Prompt tokens of the upstream call behind this answer (null: no call, e.g. a cached answer)")
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True, help_text="Completion tokens of the upstream call behind this answer")
+    upstream_latency = models.FloatField(null=True, blank=True, help_text="Seconds the upstream call behind this answer took")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # A conversation's history in order, either direction (context window, summaries, detail view)
+            models.Index(fields=['conversation', 'created_at'], name='chat_msg_conv_created'),
+        ]
     
     def __str__(self):
         sender = "User" if self.is_from_user else "AI"
-        return f"{sender}: {self.content[:50]}..."
\ No newline at end of file
+        return f"{sender}: {self.content[:50]}..."
+    
+    def save(self, *args, **kwargs):
+        # Count once here so building the context window never re-tokenizes history
+        if self.token_count is None:
+            self.token_count = estimate_tokens(self.content)
+        super().save(*args, **kwargs)
+
+
+class DailyUsage(models.Model):
+    """Per user, model and day totals of AI answers, updated as each answer is saved (see chat/usage.py)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_usage')
+    model = models.CharField(max_length=100, blank=True)
+    day = models.DateField()
+    answers = models.PositiveIntegerField(default=0, help_text="AI messages saved")
+    upstream_calls = models.PositiveIntegerField(default=0, help_text="Answers that needed an upstream call (the rest were cached or shared)")
+    prompt_tokens = models.PositiveBigIntegerField(default=0)
+    completion_tokens = models.PositiveBigIntegerField(default=0)
+    upstream_seconds = models.FloatField(default=0)
+    
+    class Meta:
+        ordering = ['-day', 'model']
+        verbose_name_plural = 'daily usage'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'model', 'day'], name='chat_dailyusage_user_model_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='chat_dailyusage_day'),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} {self.user} {self.model or '-'}"
+    
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
@@ -0,0 +1,137 @@
+from django.conf import settings
+from collections import deque
+import threading
+import time
+import logging
+
+from .resilience import get_circuit_breaker, percentiles
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 30
+
+
+class Provider:
+    """
+    One OpenAI-compatible chat completions backend with a rolling health score.
+
+    Health is an exponentially weighted success rate, discounted by how much of
+    the request timeout a typical call uses: 1.0 is healthy and fast, 0 is
+    failing or has its circuit open. Each provider has its own circuit breaker.
+    A demoted provider gets no traffic to prove itself with, so its error
+    history fades with a half-life of PROVIDER_RECOVERY_SECONDS while unused.
+    """
+
+    SAMPLE_SIZE = 512
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, name, url, api_key=None, model=None, timeout=None, index=0):
+        self.name = name
+        self.url = url
+        self.api_key = api_key
+        self.model = model  # sent instead of the default model; None: send what the service asks for
+        self.timeout = timeout or DEFAULT_TIMEOUT
+        self.index = index
+        self.breaker = get_circuit_breaker(name)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=self.SAMPLE_SIZE)
+        self._success = 1.0
+        self._latency = None
+        self._last_at = time.monotonic()
+        self.recovery = getattr(settings, 'PROVIDER_RECOVERY_SECONDS', 30)
+        self._calls = 0
+        self._errors = 0
+
+    def record(self, latency, ok):
+        with self._lock:
+            self._success = self._recovered_success()
+            self._last_at = time.monotonic()
+            self._calls += 1
+            if not ok:
+                self._errors += 1
+            self._latencies.append(latency)
+            self._success += self.EWMA_ALPHA * ((1.0 if ok else 0.0) - self._success)
+            if self._latency is None:
+                self._latency = latency
+            else:
+                self._latency += self.EWMA_ALPHA * (latency - self._latency)
+
+    def _recovered_success(self):
+        idle = time.monotonic() - self._last_at
+        return 1.0 - (1.0 - self._success) * 0.5 ** (idle / self.recovery)
+
+    def health_score(self):
+        if self.breaker.state == self.breaker.OPEN:
+            return 0.0
+        with self._lock:
+            slowness = min((self._latency or 0.0) / self.timeout, 1.0)
+            return self._recovered_success() * (1.0 - 0.5 * slowness)
+
+    def stats(self):
+        score = self.health_score()
+        with self._lock:
+            return {
+                'url': self.url,
+                'model': self.model,
+                'health_score': round(score, 4),
+                'calls': self._calls,
+                'errors': self._errors,
+                'latency_seconds': percentiles(self._latencies),
+                'circuit': self.breaker.state,
+            }
+
+
+class ProviderRouter:
+    """Orders providers healthiest-first; providers within 0.1 health keep their configured order"""
+
+    def __init__(self, providers):
+        self.providers = providers
+
+    def ranked(self):
+        return sorted(self.providers, key=lambda p: (-round(p.health_score(), 1), p.index))
+
+    def stats(self):
+        return {provider.name: provider.stats() for provider in self.providers}
+
+
+def provider_config():
+    """
+    Configured providers: settings.UPSTREAM_PROVIDERS, a list of dicts with name,
+    url and optionally api_key, model and timeout; defaults to the single Euron
+    endpoint. Providers without an api_key use EURON_API_KEY. UPSTREAM_MOCK_URL,
+    when set, overrides all of this with the local mock server.
+    """
+    mock_url = getattr(settings, 'UPSTREAM_MOCK_URL', None)
+    if mock_url:
+        # Local mock LLM (manage.py mock_llm) replaces every real provider
+        return (('mock', mock_url, 'mock', None, None),)
+    default_key = getattr(settings, 'EURON_API_KEY', None)
+    configured = getattr(settings, 'UPSTREAM_PROVIDERS', None) or [{
+        'name': 'euron',
+        'url': getattr(settings, 'EURON_API_URL', "https://api.euron.one/api/v1/euri/chat/completions"),
+    }]
+    return tuple(
+        (entry['name'], entry['url'], entry.get('api_key') or default_key, entry.get('model'), entry.get('timeout'))
+        for entry in configured
+    )
+
+
+_router = None
+_router_config = None
+_router_lock = threading.Lock()
+
+
+def get_provider_router():
+    """Return the process-wide router, rebuilt if the provider settings changed"""
+    global _router, _router_config
+    config = provider_config()
+    if _router is None or config != _router_config:
+        with _router_lock:
+            if _router is None or config != _router_config:
+                _router = ProviderRouter([
+                    Provider(name, url, api_key, model, timeout, index)
+                    for index, (name, url, api_key, model, timeout) in enumerate(config)
+                ])
+                _router_config = config
+                logger.info(f"Upstream providers: {', '.join(name for name, *_ in config)}")
+    return _router
@@ -0,0 +1,488 @@
+from django.conf import settings
+from collections import deque
+import threading
+import asyncio
+import heapq
+import math
+import random
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Retryable upstream statuses: rate limiting and server-side failures
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit is open"""
+
+    def __init__(self, name, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"Upstream '{name}' circuit is open; retry in {retry_after:.1f}s")
+
+
+class CircuitBreaker:
+    """
+    Thread-safe closed/open/half-open circuit breaker over a rolling time window.
+
+    Closed: calls pass; once at least min_calls outcomes in the window show a
+    failure rate >= failure_rate, the circuit opens. Open: calls fail immediately
+    with CircuitOpenError for cooldown seconds. Half-open: up to
+    half_open_max_calls probe calls pass; a success closes the circuit, a
+    failure re-opens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_rate=None, min_calls=None, window=None, cooldown=None, half_open_max_calls=1):
+        self.name = name
+        self.failure_rate = failure_rate or getattr(settings, 'UPSTREAM_BREAKER_FAILURE_RATE', 0.5)
+        self.min_calls = min_calls or getattr(settings, 'UPSTREAM_BREAKER_MIN_CALLS', 10)
+        self.window = window or getattr(settings, 'UPSTREAM_BREAKER_WINDOW', 60)
+        self.cooldown = cooldown or getattr(settings, 'UPSTREAM_BREAKER_COOLDOWN', 30)
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._outcomes = deque()  # (timestamp, ok)
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._times_opened = 0
+        self._rejected = 0
+        self._successes = 0
+        self._failures = 0
+
+    def _trim(self, now):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def _open(self, now):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._half_open_in_flight = 0
+        self._times_opened += 1
+        logger.warning(f"Circuit '{self.name}' opened for {self.cooldown}s")
+
+    def before_call(self):
+        """Reserve permission to call upstream, or raise CircuitOpenError"""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.OPEN:
+                remaining = self._opened_at + self.cooldown - now
+                if remaining > 0:
+                    self._rejected += 1
+                    raise CircuitOpenError(self.name, remaining)
+                self._state = self.HALF_OPEN
+                self._half_open_in_flight = 0
+                logger.info(f"Circuit '{self.name}' half-open, probing upstream")
+            if self._state == self.HALF_OPEN:
+                if self._half_open_in_flight >= self.half_open_max_calls:
+                    self._rejected += 1
+                    raise CircuitOpenError(self.name, 0.0)
+                self._half_open_in_flight += 1
+
+    def record_success(self):
+        with self._lock:
+            now = time.monotonic()
+            self._successes += 1
+            if self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._outcomes.clear()
+                logger.info(f"Circuit '{self.name}' closed")
+            self._outcomes.append((now, True))
+            self._trim(now)
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            self._failures += 1
+            if self._state == self.HALF_OPEN:
+                self._open(now)
+                return
+            self._outcomes.append((now, False))
+            self._trim(now)
+            if self._state == self.CLOSED and len(self._outcomes) >= self.min_calls:
+                failed = sum(1 for _, ok in self._outcomes if not ok)
+                if failed / len(self._outcomes) >= self.failure_rate:
+                    self._open(now)
+
+    def release(self):
+        """Give back a half-open probe slot for a call whose outcome says nothing about upstream health"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_in_flight:
+                self._half_open_in_flight -= 1
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() >= self._opened_at + self.cooldown:
+                return self.HALF_OPEN
+            return self._state
+
+    def stats(self):
+        state = self.state
+        with self._lock:
+            self._trim(time.monotonic())
+            window_calls = len(self._outcomes)
+            window_failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                'state': state,
+                'window_calls': window_calls,
+                'window_failure_rate': round(window_failures / window_calls, 4) if window_calls else 0.0,
+                'times_opened': self._times_opened,
+                'rejected_calls': self._rejected,
+                'successes': self._successes,
+                'failures': self._failures,
+            }
+
+
+class RetryPolicy:
+    """Capped exponential backoff with full jitter for retryable upstream failures"""
+
+    def __init__(self, max_attempts=None, base_delay=None, max_delay=None):
+        self.max_attempts = max_attempts or getattr(settings, 'UPSTREAM_RETRY_MAX_ATTEMPTS', 3)
+        self.base_delay = base_delay or getattr(settings, 'UPSTREAM_RETRY_BASE_DELAY', 0.5)
+        self.max_delay = max_delay or getattr(settings, 'UPSTREAM_RETRY_MAX_DELAY', 4.0)
+        self._lock = threading.Lock()
+        self._retries = 0
+        self._exhausted = 0
+
+    def is_retryable_status(self, status):
+        return status in RETRYABLE_STATUSES
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before retry number ``attempt`` (0-based), honoring Retry-After up to max_delay"""
+        with self._lock:
+            self._retries += 1
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def record_exhausted(self):
+        with self._lock:
+            self._exhausted += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_attempts': self.max_attempts,
+                'retries': self._retries,
+                'exhausted': self._exhausted,
+            }
+
+
+class BulkheadFullError(Exception):
+    """Raised when no upstream slot frees up within the bulkhead's queue wait"""
+
+    def __init__(self, name, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"Upstream '{name}' is busy; retry in {retry_after}s")
+
+
+def percentiles(samples):
+    if not samples:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {'p50': round(pick(0.5), 4), 'p95': round(pick(0.95), 4), 'p99': round(pick(0.99), 4), 'max': round(ordered[-1], 4)}
+
+
+class Permit:
+    """One bulkhead slot; release() is idempotent, and permits work as context managers"""
+
+    def __init__(self, bulkhead):
+        self._bulkhead = bulkhead
+        self._acquired_at = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._bulkhead._release(time.monotonic() - self._acquired_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _Waiter:
+    """A queued acquire; woken by _dispatch from whichever thread releases a slot"""
+
+    def __init__(self, key, start_tag, seq, loop=None):
+        self.key = key
+        self.start_tag = start_tag
+        self.seq = seq
+        self.granted = False
+        self.cancelled = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def __lt__(self, other):
+        return (self.start_tag, self.seq) < (other.start_tag, other.seq)
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class Bulkhead:
+    """
+    Caps concurrent upstream calls in this process and shares them fairly between users.
+
+    Callers beyond max_concurrent queue for up to max_wait seconds, then get
+    BulkheadFullError, so a burst of chat sends can't park every worker thread
+    on the upstream. Freed slots go to queued callers by start-time weighted
+    fair queuing: each caller key (normally a user id) is a flow whose requests
+    get virtual start tags spaced 1/weight apart, and the smallest tag is served
+    next, so one user scripting the API can't push everyone else to the back.
+    A key may have at most max_queued_per_key requests waiting.
+
+    Queue depth (seen by each caller on arrival), queue wait and slot hold
+    times are sampled for metrics.
+    """
+
+    SAMPLE_SIZE = 1024
+
+    def __init__(self, name, max_concurrent=None, max_wait=None, max_queued_per_key=None):
+        self.name = name
+        self.max_concurrent = max_concurrent or getattr(settings, 'UPSTREAM_MAX_IN_FLIGHT', 8)
+        self.max_wait = max_wait if max_wait is not None else getattr(settings, 'UPSTREAM_MAX_QUEUE_WAIT', 2.0)
+        self.max_queued_per_key = max_queued_per_key or getattr(settings, 'UPSTREAM_MAX_QUEUED_PER_USER', 2)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queue = []  # heap of _Waiter by (start_tag, seq)
+        self._queued_per_key = {}
+        self._last_finish = {}  # flow key -> finish tag of its latest queued request
+        self._virtual_time = 0.0
+        self._seq = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._rejected_per_key_limit = 0
+        self._depths = deque(maxlen=self.SAMPLE_SIZE)
+        self._waits = deque(maxlen=self.SAMPLE_SIZE)
+        self._holds = deque(maxlen=self.SAMPLE_SIZE)
+
+    def _retry_after(self):
+        # Typical time for a slot to free up, in whole seconds as Retry-After expects
+        holds = sorted(self._holds)
+        typical = holds[len(holds) // 2] if holds else 1.0
+        return max(1, math.ceil(typical))
+
+    def _reject(self, per_key_limit=False):
+        self._rejected += 1
+        if per_key_limit:
+            self._rejected_per_key_limit += 1
+        logger.warning(f"Bulkhead '{self.name}' full ({self._in_flight} in flight, {len(self._queue)} queued), rejecting call")
+        return BulkheadFullError(self.name, self._retry_after())
+
+    def _enter(self, key, weight, loop=None):
+        """Admit immediately (returns None) or enqueue and return the waiter; caller holds the lock"""
+        self._depths.append(sum(self._queued_per_key.values()))
+        if self._in_flight < self.max_concurrent and not self._queued_per_key:
+            self._in_flight += 1
+            self._admitted += 1
+            self._waits.append(0.0)
+            return None
+        queued = self._queued_per_key.get(key, 0)
+        if queued >= self.max_queued_per_key:
+            raise self._reject(per_key_limit=True)
+        start_tag = max(self._virtual_time, self._last_finish.get(key, 0.0))
+        self._last_finish[key] = start_tag + 1.0 / max(weight, 0.01)
+        self._queued_per_key[key] = queued + 1
+        self._seq += 1
+        waiter = _Waiter(key, start_tag, self._seq, loop)
+        heapq.heappush(self._queue, waiter)
+        return waiter
+
+    def _leave(self, waiter):
+        queued = self._queued_per_key.get(waiter.key, 1) - 1
+        if queued:
+            self._queued_per_key[waiter.key] = queued
+        else:
+            self._queued_per_key.pop(waiter.key, None)
+
+    def _dispatch(self):
+        """Hand free slots to the waiters with the smallest start tags; caller holds the lock"""
+        while self._in_flight < self.max_concurrent and self._queue:
+            waiter = heapq.heappop(self._queue)
+            if waiter.cancelled:
+                continue
+            self._leave(waiter)
+            self._virtual_time = waiter.start_tag
+            waiter.granted = True
+            self._in_flight += 1
+            self._admitted += 1
+            waiter.wake()
+        if not self._queued_per_key:
+            # No backlog left: tags only matter between queued flows, so start over
+            self._last_finish.clear()
+            self._virtual_time = 0.0
+
+    def _abandon(self, waiter, started):
+        """Timed out or cancelled while queued; returns a Permit if the slot was granted meanwhile"""
+        with self._lock:
+            if waiter.granted:
+                self._waits.append(time.monotonic() - started)
+                return Permit(self)
+            waiter.cancelled = True
+            self._leave(waiter)
+            return None
+
+    def try_acquire(self):
+        """A Permit if a slot is free and nobody is queued for one, else None; never waits (hedges)"""
+        with self._lock:
+            if self._in_flight < self.max_concurrent and not self._queued_per_key:
+                self._in_flight += 1
+                self._admitted += 1
+                return Permit(self)
+        return None
+
+    def acquire(self, key=None, weight=1.0):
+        """Block up to max_wait for a slot; returns a Permit or raises BulkheadFullError"""
+        started = time.monotonic()
+        with self._lock:
+            waiter = self._enter(key, weight)
+        if waiter is None:
+            return Permit(self)
+        if waiter.event.wait(self.max_wait):
+            with self._lock:
+                self._waits.append(time.monotonic() - started)
+            return Permit(self)
+        permit = self._abandon(waiter, started)
+        if permit is None:
+            with self._lock:
+                raise self._reject()
+        return permit
+
+    async def aacquire(self, key=None, weight=1.0):
+        """Event-loop counterpart of acquire(), sharing the same slots and queue"""
+        started = time.monotonic()
+        with self._lock:
+            waiter = self._enter(key, weight, loop=asyncio.get_running_loop())
+        if waiter is None:
+            return Permit(self)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait)
+        except asyncio.TimeoutError:
+            permit = self._abandon(waiter, started)
+            if permit is None:
+                with self._lock:
+                    raise self._reject()
+            return permit
+        except BaseException:
+            # Caller cancelled (e.g. client disconnected): give back a slot granted in the meantime
+            permit = self._abandon(waiter, started)
+            if permit is not None:
+                permit.release()
+            raise
+        with self._lock:
+            self._waits.append(time.monotonic() - started)
+        return Permit(self)
+
+    def _release(self, held):
+        with self._lock:
+            self._in_flight -= 1
+            self._holds.append(held)
+            self._dispatch()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_wait': self.max_wait,
+                'max_queued_per_user': self.max_queued_per_key,
+                'in_flight': self._in_flight,
+                'queued': sum(self._queued_per_key.values()),
+                'users_queued': len(self._queued_per_key),
+                'admitted': self._admitted,
+                'rejected': self._rejected,
+                'rejected_per_user_limit': self._rejected_per_key_limit,
+                'queue_depth': percentiles(self._depths),
+                'queue_wait_seconds': percentiles(self._waits),
+                'hold_seconds': percentiles(self._holds),
+            }
+
+
+def user_weight(user):
+    """
+    Fair-share weight for a user: UPSTREAM_STAFF_WEIGHT for staff, otherwise the
+    highest UPSTREAM_TIER_WEIGHTS entry among the user's groups, otherwise 1.
+    May query the database (groups), so resolve it outside the event loop.
+    """
+    if user is None or not getattr(user, 'is_authenticated', False):
+        return 1.0
+    if user.is_staff:
+        return float(getattr(settings, 'UPSTREAM_STAFF_WEIGHT', 4))
+    tiers = getattr(settings, 'UPSTREAM_TIER_WEIGHTS', {})
+    if not tiers:
+        return 1.0
+    names = user.groups.filter(name__in=list(tiers)).values_list('name', flat=True)
+    return float(max((tiers[name] for name in names), default=1))
+
+
+def parse_retry_after(headers):
+    """Retry-After header in seconds, or None (HTTP-date values are ignored)"""
+    value = headers.get('Retry-After') if headers is not None else None
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None
+
+
+_breakers = {}
+_bulkheads = {}
+_retry_policy = None
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breaker(name='euron'):
+    """Return the process-wide circuit breaker for an upstream, creating it on first use"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _registry_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+
+def get_bulkhead(name='euron'):
+    """Return the process-wide bulkhead for an upstream, creating it on first use"""
+    bulkhead = _bulkheads.get(name)
+    if bulkhead is None:
+        with _registry_lock:
+            bulkhead = _bulkheads.get(name)
+            if bulkhead is None:
+                bulkhead = _bulkheads[name] = Bulkhead(name)
+    return bulkhead
+
+
+def get_retry_policy():
+    global _retry_policy
+    if _retry_policy is None:
+        with _registry_lock:
+            if _retry_policy is None:
+                _retry_policy = RetryPolicy()
+    return _retry_policy
+
+
+def resilience_stats():
+    return {
+        'circuit_breakers': {name: breaker.stats() for name, breaker in list(_breakers.items())},
+        'retries': get_retry_policy().stats(),
+        'bulkheads': {name: bulkhead.stats() for name, bulkhead in list(_bulkheads.items())},
+    }
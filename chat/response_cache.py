@@ -0,0 +1,144 @@
+from django.conf import settings
+from django.core.cache import caches
+import hashlib
+import threading
+import json
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+_line_ending = re.compile(r"\r\n?")
+
+
+def normalize_messages(messages):
+    """
+    Role/content list with line endings unified and surrounding whitespace
+    stripped. Case and inner whitespace are kept: they can change the answer
+    (code, tables, names), so prompts differing in them never share one.
+    """
+    return [
+        {"role": m["role"], "content": _line_ending.sub("\n", m["content"]).strip()}
+        for m in messages
+    ]
+
+
+def context_hash(model, messages):
+    """Stable hash of the model and the full normalized context (system prompt included)"""
+    payload = json.dumps(
+        {"model": model, "messages": normalize_messages(messages)},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Completion cache on top of Django's cache framework.
+
+    TTL, entry cap and eviction come from the cache alias (settings.CACHES
+    ['responses']): locmem evicts least-recently-used entries once MAX_ENTRIES is
+    reached; shared backends use their own policy. Responses longer than
+    RESPONSE_CACHE_MAX_CHARS are never stored.
+    """
+
+    key_prefix = 'airesp:v2:'
+
+    def __init__(self, alias=None):
+        self.alias = alias or getattr(settings, 'RESPONSE_CACHE_ALIAS', 'responses')
+        self.enabled = getattr(settings, 'RESPONSE_CACHE_ENABLED', True)
+        self.max_chars = getattr(settings, 'RESPONSE_CACHE_MAX_CHARS', 20000)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._skipped = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, model, messages):
+        return self.key_prefix + context_hash(model, messages)
+
+    def _count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def _should_store(self, content):
+        if not content:
+            return False
+        if len(content) > self.max_chars:
+            self._count('_skipped')
+            return False
+        return True
+
+    def get(self, model, messages):
+        """Cached completion for this context, or None"""
+        if not self.enabled:
+            return None
+        try:
+            content = self.cache.get(self.make_key(model, messages))
+        except Exception as e:
+            logger.warning(f"Response cache read failed: {e}")
+            content = None
+        self._count('_hits' if content is not None else '_misses')
+        return content
+
+    def set(self, model, messages, content):
+        if not self.enabled or not self._should_store(content):
+            return
+        try:
+            self.cache.set(self.make_key(model, messages), content)
+            self._count('_stores')
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+    async def aget(self, model, messages):
+        if not self.enabled:
+            return None
+        try:
+            content = await self.cache.aget(self.make_key(model, messages))
+        except Exception as e:
+            logger.warning(f"Response cache read failed: {e}")
+            content = None
+        self._count('_hits' if content is not None else '_misses')
+        return content
+
+    async def aset(self, model, messages, content):
+        if not self.enabled or not self._should_store(content):
+            return
+        try:
+            await self.cache.aset(self.make_key(model, messages), content)
+            self._count('_stores')
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'enabled': self.enabled,
+                'alias': self.alias,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+                'upstream_calls_saved': self._hits,
+                'stores': self._stores,
+                'skipped_too_large': self._skipped,
+            }
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide response cache"""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache()
+    return _response_cache
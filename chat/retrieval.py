@@ -0,0 +1,222 @@
+from django.conf import settings
+from collections import OrderedDict, deque
+from functools import lru_cache
+import threading
+import time
+import zlib
+import re
+import logging
+
+from .models import Message
+from .resilience import percentiles
+
+# Optional: without NumPy, retrieval is off and contexts are built from recent history only
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+_word = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=65536)
+def _word_features(word):
+    """(hash of the word, hashes of its character trigrams); vocabularies repeat, so this is cached"""
+    padded = f"#{word}#"
+    return zlib.crc32(word.encode()), [zlib.crc32(padded[i:i + 3].encode()) for i in range(len(padded) - 2)]
+
+
+def _features(text):
+    """Hashed features of text with their weights: words, word bigrams and (at half weight) character trigrams"""
+    hashes, weights = [], []
+    previous = None
+    for word in _word.findall(text.lower()):
+        word_hash, grams = _word_features(word)
+        hashes.append(word_hash)
+        weights.append(1.0)
+        if previous is not None:
+            hashes.append((previous * 0x01000193 ^ word_hash) & 0xFFFFFFFF)  # bigram
+            weights.append(1.0)
+        previous = word_hash
+        hashes.extend(grams)
+        weights.extend([0.5] * len(grams))
+    return hashes, weights
+
+
+def embed_many(texts, dim):
+    """
+    Local CPU embeddings: signed feature hashing into unit-length float32 rows of
+    size dim, one per text. Similar wording gives similar vectors; no model or
+    network involved. Batched so loading a long conversation costs one NumPy pass.
+    """
+    hashes, weights, rows = [], [], []
+    for row, text in enumerate(texts):
+        text_hashes, text_weights = _features(text)
+        hashes.extend(text_hashes)
+        weights.extend(text_weights)
+        rows.extend([row] * len(text_hashes))
+    hashes = np.array(hashes, dtype=np.uint32)
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0) * np.array(weights)
+    cells = np.array(rows, dtype=np.int64) * dim + hashes % dim
+    matrix = np.bincount(cells, weights=signs, minlength=len(texts) * dim).reshape(len(texts), dim)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def embed(text, dim):
+    return embed_many([text], dim)[0]
+
+
+class ConversationIndex:
+    """
+    Embeddings of one conversation's messages, in id order. Rows live in a
+    preallocated matrix that doubles when full, so adding a message is O(dim).
+    """
+
+    def __init__(self, dim):
+        self.dim = dim
+        self.lock = threading.Lock()
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.matrix = np.zeros((0, dim), dtype=np.float32)
+        self.size = 0
+        self.last_id = 0
+
+    def add(self, message_ids, texts):
+        """Append messages not indexed yet"""
+        with self.lock:
+            known = set(self.ids[:self.size][self.ids[:self.size] >= min(message_ids)].tolist())
+            new = [(i, text) for i, text in zip(message_ids, texts) if i not in known]
+            if not new:
+                return
+            vectors = embed_many([text for _, text in new], self.dim)
+            end = self.size + len(new)
+            if end > len(self.ids):
+                capacity = max(64, 2 * end)
+                self.ids = np.resize(self.ids, capacity)
+                matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+                matrix[:self.size] = self.matrix[:self.size]
+                self.matrix = matrix
+            self.ids[self.size:end] = [i for i, _ in new]
+            self.matrix[self.size:end] = vectors
+            self.size = end
+            self.last_id = max(self.last_id, max(i for i, _ in new))
+
+    def search(self, query, k, before_id, min_score):
+        """Ids of the k messages older than before_id most similar to query, best first"""
+        with self.lock:
+            ids = self.ids[:self.size]
+            scores = self.matrix[:self.size] @ query
+        scores = np.where(ids < before_id, scores, -1.0)
+        if len(scores) > k:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(scores[top])[::-1]]
+        return [int(ids[i]) for i in top if scores[i] >= min_score]
+
+
+class MessageRetriever:
+    """
+    Finds older messages relevant to a new one, for long conversations whose
+    early turns have fallen out of the recent-history window.
+
+    Per-conversation indexes are built from the database on first use, kept
+    in an LRU of RETRIEVAL_MAX_CONVERSATIONS, updated as messages are saved in
+    this process (see chat/signals.py) and caught up with rows saved by other
+    processes before every search.
+    """
+
+    SAMPLE_SIZE = 1024
+    LOAD_BATCH = 2000
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'RETRIEVAL_ENABLED', False) and np is not None
+        if getattr(settings, 'RETRIEVAL_ENABLED', False) and np is None:
+            logger.warning("RETRIEVAL_ENABLED is set but NumPy is not installed; retrieval is off")
+        self.dim = getattr(settings, 'RETRIEVAL_DIM', 256)
+        self.top_k = getattr(settings, 'RETRIEVAL_TOP_K', 4)
+        self.min_score = getattr(settings, 'RETRIEVAL_MIN_SCORE', 0.25)
+        self.max_conversations = getattr(settings, 'RETRIEVAL_MAX_CONVERSATIONS', 128)
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+        self._search_times = deque(maxlen=self.SAMPLE_SIZE)
+        self._searches = 0
+        self._recalled = 0
+
+    def _index(self, conversation_id):
+        with self._lock:
+            index = self._indexes.get(conversation_id)
+            if index is not None:
+                self._indexes.move_to_end(conversation_id)
+                return index
+            index = self._indexes[conversation_id] = ConversationIndex(self.dim)
+            while len(self._indexes) > self.max_conversations:
+                self._indexes.popitem(last=False)
+            return index
+
+    def add_message(self, message):
+        """Index a newly saved message, if its conversation's index is loaded"""
+        with self._lock:
+            index = self._indexes.get(message.conversation_id)
+        if index is not None:
+            index.add([message.pk], [message.content])
+
+    def _catch_up(self, conversation_id, index):
+        rows = Message.objects.filter(
+            conversation_id=conversation_id, id__gt=index.last_id
+        ).order_by('id').values_list('id', 'content')
+        batch = list(rows)
+        for start in range(0, len(batch), self.LOAD_BATCH):
+            chunk = batch[start:start + self.LOAD_BATCH]
+            index.add([message_id for message_id, _ in chunk], [content for _, content in chunk])
+
+    def recall(self, conversation, query, before_id):
+        """
+        Up to RETRIEVAL_TOP_K messages of conversation older than before_id that are
+        most relevant to query, most relevant first (Message rows, content only).
+        """
+        if not self.enabled or before_id is None:
+            return []
+        index = self._index(conversation.pk)
+        self._catch_up(conversation.pk, index)
+
+        started = time.perf_counter()
+        ids = index.search(embed(query, self.dim), self.top_k, before_id, self.min_score)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._searches += 1
+            self._recalled += len(ids)
+            self._search_times.append(elapsed)
+        if not ids:
+            return []
+        rows = Message.objects.filter(id__in=ids).only('content', 'is_from_user', 'token_count', 'created_at')
+        by_id = {row.pk: row for row in rows}
+        return [by_id[i] for i in ids if i in by_id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'conversations_indexed': len(self._indexes),
+                'messages_indexed': sum(index.size for index in self._indexes.values()),
+                'searches': self._searches,
+                'recalled': self._recalled,
+                'search_seconds': percentiles(list(self._search_times)),
+            }
+
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+
+def get_retriever():
+    """Return the process-wide message retriever"""
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = MessageRetriever()
+    return _retriever
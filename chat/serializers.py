@@ -1,11 +1,11 @@
 from rest_framework import serializers
-from .models import Conversation, Message
+from .models import Conversation, Message, DailyUsage
 
 
 class MessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Message
-        fields = ['id', 'content', 'is_from_user', 'created_at']
+        fields = ['id', 'content', 'is_from_user', 'model', 'prompt_tokens', 'completion_tokens', 'upstream_latency', 'created_at']
 
 
 class ConversationSerializer(serializers.ModelSerializer):
@@ -14,5 +14,13 @@ class ConversationSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Conversation
-        fields = ['id', 'title', 'created_at', 'updated_at', 'messages', 'message_count']
-        read_only_fields = ['created_at', 'updated_at']
\ No newline at end of file
+        fields = ['id', 'title', 'title_status', 'response_cache_opt_out', 'created_at', 'updated_at', 'messages', 'message_count']
+        read_only_fields = ['title_status', 'created_at', 'updated_at']
+
+
+class DailyUsageSerializer(serializers.ModelSerializer):
+    total_tokens = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = DailyUsage
+        fields = ['day', 'user', 'model', 'answers', 'upstream_calls', 'prompt_tokens', 'completion_tokens', 'total_tokens', 'upstream_seconds']
@@ -1,51 +1,527 @@
 import requests
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from asgiref.sync import sync_to_async
+from concurrent import futures
+import asyncio
+import contextlib
 import logging
 import json
+import time
+
+from .http_client import get_http_client, async_http_client, httpx
+from .resilience import (
+    BulkheadFullError, CircuitOpenError, get_bulkhead, get_retry_policy, parse_retry_after, user_weight
+)
+from .providers import get_provider_router
+from .hedging import get_hedge_executor, get_hedge_policy
+from .response_cache import get_response_cache
+from .single_flight import get_single_flight
+from .journal import get_journal
+from .model_routing import get_model_router
+from .context import ContextBuilder, estimate_tokens
+from .context_cache import get_context_cache
+from .deadlines import DeadlineExceededError, RequestCancelledError, current_deadline
+from .retrieval import get_retriever
 
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = "You are a helpful AI assistant. Be conversational, informative, and friendly."
+
+TITLE_WITH_ANSWER_PROMPT = (
+    'Reply with only a JSON object {"title": ..., "answer": ...}: "answer" is your full reply '
+    'to the user and "title" is a short, descriptive title (max 5 words) for this conversation.'
+)
+
+_json_decoder = json.JSONDecoder(strict=False)
+
+
+def truncate_title(first_message):
+    """Cheap local title: the first message, truncated"""
+    return first_message[:30] + ('...' if len(first_message) > 30 else '')
+
+
+def parse_answer_and_title(content):
+    """
+    (answer, title) from a completion asked for TITLE_WITH_ANSWER_PROMPT. Tolerates code
+    fences and text around the JSON; title is None if missing, and a reply that isn't the
+    requested JSON at all is taken as the whole answer.
+    """
+    # Decode the first object that parses from each '{' in turn; whatever follows it
+    # (more text, stray braces) is ignored
+    start = content.find('{')
+    while start != -1:
+        try:
+            data, _ = _json_decoder.raw_decode(content, start)
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and isinstance(data.get('answer'), str) and data['answer'].strip():
+            title = data.get('title')
+            title = title.strip().replace('"', '')[:50] if isinstance(title, str) else ''
+            return data['answer'].strip(), title or None
+        start = content.find('{', start + 1)
+    return content.strip(), None
+
+
+def _answer_only(result):
+    """
+    A shared flight's result as a plain answer. Plain and first-turn (answer, title)
+    calls for one context share a flight and a cache key; either may have led it.
+    """
+    return result[0] if isinstance(result, tuple) else result
+
+
+def _with_title(result):
+    """A shared flight's result as (answer, title); title is None if a plain call led it"""
+    return result if isinstance(result, tuple) else (result, None)
+
+
+def _close_response(future):
+    """Done-callback for a losing hedged call: release its connection"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
 
 class AIService:
     """Service class for handling AI interactions with Euron API"""
     
-    def __init__(self):
-        self.api_key = getattr(settings, 'EURON_API_KEY', None)
-        self.api_url = "https://api.euron.one/api/v1/euri/chat/completions"
-        self.model = "gpt-4.1-nano"  # Default model
+    def __init__(self, user=None, model=None, deadline=None):
+        self.journal = get_journal()
+        # A local mock upstream or a journal replay needs no real key
+        self.api_key = getattr(settings, 'EURON_API_KEY', None) or (
+            'mock' if getattr(settings, 'UPSTREAM_MOCK_URL', None) or self.journal.replaying else None
+        )
+        self.router = get_provider_router()
+        self.http = get_http_client()
+        self.bulkhead = get_bulkhead()
+        # Upstream slots are shared fairly per user; background jobs (no user) form one flow
+        self.user = user
+        self._share = None
+        self.retry_policy = get_retry_policy()
+        self.hedge_policy = get_hedge_policy()
+        self.response_cache = get_response_cache()
+        self.single_flight = get_single_flight()
+        self.context_builder = ContextBuilder()
+        self.context_cache = get_context_cache()
+        self.retriever = get_retriever()
+        self.last_prompt_tokens = None
+        # Tokens and seconds of this service's last successful upstream call (None: no call made)
+        self.last_usage = None
+        self.model = model or "gpt-4.1-nano"  # Default model
+        # An explicitly requested model (e.g. compare mode) is never re-routed
+        self.model_pinned = model is not None
+        self.model_router = get_model_router()
+        self.routing = None
+        # Time budget of the request being served (RequestDeadlineMiddleware), if any
+        self.deadline = deadline if deadline is not None else current_deadline()
         
         if not self.api_key:
             logger.warning("EURON_API_KEY not found in settings")
     
+    def _headers(self, provider):
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {provider.api_key}"
+        }
+    
+    def _fair_share(self):
+        """Bulkhead flow key and weight for this service's user (may query groups once)"""
+        if self._share is None:
+            self._share = {
+                'key': self.user.pk if self.user is not None else None,
+                'weight': user_weight(self.user),
+            }
+        return self._share
+    
+    def acquire_slot(self):
+        """Reserve an upstream slot for this user ahead of time (raises BulkheadFullError)"""
+        return self.bulkhead.acquire(**self._fair_share())
+    
+    def _timeout(self, provider):
+        """
+        The provider's timeout, or what is left of the request's deadline if that is less;
+        raises DeadlineExceededError or RequestCancelledError rather than start a doomed call.
+        """
+        if self.deadline is None:
+            return provider.timeout
+        return self.deadline.timeout(provider.timeout)
+    
+    def _deadline_timed_out(self, provider, timeout, error):
+        """A timeout cut short by the deadline says nothing about the provider: release it and fail"""
+        if timeout < provider.timeout:
+            provider.breaker.release()
+            logger.warning(f"Upstream provider '{provider.name}' timed out at the request deadline: {error}")
+            raise self.deadline.exceeded() from error
+    
+    def _provider_payload(self, provider, payload):
+        """
+        payload as sent to provider: its configured model stands in for the default one,
+        but a model this call asked for (pinned or routed) is sent as is, so the model
+        recorded on the answer is the one that was asked for.
+        """
+        if provider.model is None or self.model_pinned or self.routing is not None:
+            return payload
+        return dict(payload, model=provider.model)
+    
+    def _post_once(self, provider, payload, **kwargs):
+        """
+        One call to one provider through its circuit breaker. Returns (response, None, None)
+        on success, or (None, error, retry_after) for a failure worth failing over or
+        retrying: connection errors, timeouts and 429/5xx. Other 4xx responses raise.
+        """
+        timeout = self._timeout(provider)
+        provider.breaker.before_call()
+        started = time.monotonic()
+        try:
+            response = self.http.post(
+                provider.url,
+                headers=self._headers(provider),
+                json=self._provider_payload(provider, payload),
+                timeout=timeout,
+                **kwargs
+            )
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if isinstance(e, requests.exceptions.Timeout):
+                self._deadline_timed_out(provider, timeout, e)
+            provider.breaker.record_failure()
+            provider.record(time.monotonic() - started, False)
+            return None, e, None
+        except Exception:
+            provider.breaker.release()
+            raise
+        
+        latency = time.monotonic() - started
+        if not self.retry_policy.is_retryable_status(response.status_code):
+            # Upstream answered; a 4xx is our problem, not an outage
+            provider.breaker.record_success()
+            provider.record(latency, response.ok)
+            response.raise_for_status()
+            return response, None, None
+        provider.breaker.record_failure()
+        provider.record(latency, False)
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            return None, e, parse_retry_after(response.headers)
+        finally:
+            response.close()
+    
+    def _providers(self, hedge=False):
+        """Providers in the order to try them; a hedge starts with the runner-up when there is one"""
+        providers = self.router.ranked()
+        if not providers:
+            # Otherwise _post/_apost would end a round with no error to raise
+            raise ImproperlyConfigured("No upstream providers configured; check UPSTREAM_PROVIDERS")
+        if hedge and len(providers) > 1:
+            providers = providers[1:] + providers[:1]
+        return providers
+    
+    def _post(self, payload, hedge=False, **kwargs):
+        """
+        POST payload to the healthiest provider, failing over to the next on errors. When
+        every provider failed, the round is retried after capped, jittered exponential
+        backoff; if every circuit is open, CircuitOpenError is raised without touching
+        the network.
+        """
+        for attempt in range(self.retry_policy.max_attempts):
+            error = retry_after = None
+            attempted = False
+            for provider in self._providers(hedge):
+                try:
+                    response, error, provider_retry_after = self._post_once(provider, payload, **kwargs)
+                except CircuitOpenError as e:
+                    error = error or e
+                    continue
+                attempted = True
+                if response is not None:
+                    return response
+                logger.warning(f"Upstream provider '{provider.name}' failed: {error}")
+                if provider_retry_after is not None:
+                    retry_after = provider_retry_after if retry_after is None else min(retry_after, provider_retry_after)
+            
+            if not attempted or attempt + 1 >= self.retry_policy.max_attempts:
+                if attempted:
+                    self.retry_policy.record_exhausted()
+                raise error
+            delay = self.retry_policy.delay(attempt, retry_after)
+            if self.deadline is not None:
+                # No point backing off if no attempt fits in the budget afterwards
+                self.deadline.check(reserve=delay)
+            logger.warning(f"All upstream providers failed (attempt {attempt + 1}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+    
+    def _hedged_post(self, payload, **kwargs):
+        """
+        _post, hedged when UPSTREAM_HEDGING_ENABLED: if the call is still outstanding
+        after the policy's percentile-based delay and the hedge budget allows, a
+        duplicate goes out and whichever succeeds first wins. The loser is cancelled
+        if it hasn't started, otherwise its response is closed as soon as it arrives.
+        A hedge holds a bulkhead slot of its own and is skipped if none is free.
+        """
+        if not getattr(settings, 'UPSTREAM_HEDGING_ENABLED', False):
+            return self._post(payload, **kwargs)
+        
+        started = time.monotonic()
+        delay = self.hedge_policy.delay()
+        if delay is None:
+            # Still sampling latencies to derive the hedge delay from
+            response = self._post(payload, **kwargs)
+            self.hedge_policy.record_latency(time.monotonic() - started)
+            return response
+        
+        executor = get_hedge_executor()
+        primary = executor.submit(self._post, payload, **kwargs)
+        primary.add_done_callback(lambda f: self.hedge_policy.record_latency(time.monotonic() - started))
+        done, _ = futures.wait([primary], timeout=delay)
+        permit = None if done else self._hedge_slot()
+        if permit is None:
+            return primary.result()
+        
+        logger.info(f"Upstream call still pending after {delay:.2f}s, sending hedge")
+        hedge = executor.submit(self._post, payload, hedge=True, **kwargs)
+        hedge.add_done_callback(lambda f: permit.release())
+        pending = {primary, hedge}
+        while pending:
+            done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.hedge_policy.record_winner(future is hedge)
+                    for loser in pending:
+                        if not loser.cancel():
+                            loser.add_done_callback(_close_response)
+                    return future.result()
+        raise primary.exception()
+    
+    def _hedge_slot(self):
+        """
+        Bulkhead permit for a hedge, or None to skip it: the duplicate is an extra
+        upstream call, so it only goes out if a slot is free right now (it never
+        queues ahead of other users) and the hedge budget allows.
+        """
+        permit = self.bulkhead.try_acquire()
+        if permit is None:
+            logger.info("Bulkhead full, not hedging")
+            return None
+        if not self.hedge_policy.try_hedge():
+            permit.release()
+            return None
+        return permit
+    
     def _make_api_request(self, messages):
         """Make a request to the Euron API"""
         if not self.api_key:
             raise Exception("API key not configured")
         
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
         payload = {
             "messages": messages,
             "model": self.model
         }
         
         try:
-            response = requests.post(
-                self.api_url,
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
+            with self.acquire_slot():
+                started = time.monotonic()
+                try:
+                    if self.journal.replaying:
+                        data = self.journal.replay(payload)
+                    else:
+                        data = self._hedged_post(payload).json()
+                except Exception as e:
+                    self._record_call(payload, started, error=e)
+                    raise
+                self._record_call(payload, started, usage=data.get('usage'), data=data)
+                return data
         except requests.exceptions.RequestException as e:
             logger.error(f"Euron API request failed: {e}")
             raise
     
-    def generate_response(self, message, conversation_history=None):
+    def _stream_api_request(self, messages, permit=None):
+        """
+        Make a streaming request to the Euron API, yielding content deltas as they arrive.
+        The bulkhead slot (acquired here unless the caller passes one it holds) is kept
+        until the stream is closed.
+        """
+        if not self.api_key:
+            raise Exception("API key not configured")
+        
+        payload = {
+            "messages": messages,
+            "model": self.model,
+            "stream": True
+        }
+        
+        permit = permit or self.acquire_slot()
+        started = time.monotonic()
+        received = []
+        if self.journal.replaying:
+            try:
+                for content in self.journal.replay_stream(payload):
+                    received.append(content)
+                    yield content
+            finally:
+                permit.release()
+                self._record_call(payload, started, usage=self._stream_usage(None, received))
+            return
+        
+        # Only the initial request is retried; once deltas flow the caller owns the outcome
+        try:
+            response = self._hedged_post(payload, stream=True)
+        except requests.exceptions.RequestException as e:
+            permit.release()
+            self._record_call(payload, started, error=e)
+            logger.error(f"Euron API stream request failed: {e}")
+            raise
+        except Exception as e:
+            permit.release()
+            self._record_call(payload, started, error=e)
+            raise
+        
+        first_token = None
+        usage = None
+        try:
+            # Upstream sends OpenAI-style SSE: "data: {json}" lines, terminated by "data: [DONE]"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    logger.warning(f"Skipping malformed stream chunk: {data[:100]}")
+                    continue
+                # Only sent by upstreams that report usage for streams, in a final chunk
+                usage = chunk.get('usage') or usage
+                choices = chunk.get('choices') or []
+                if choices:
+                    delta = choices[0].get('delta') or {}
+                    content = delta.get('content')
+                    if content:
+                        if first_token is None:
+                            first_token = time.monotonic() - started
+                        received.append(content)
+                        yield content
+        finally:
+            # Returns the connection to the pool, or drops it if the body wasn't fully read
+            response.close()
+            permit.release()
+            self._record_call(
+                payload, started, usage=self._stream_usage(usage, received),
+                content=''.join(received), first_token=first_token
+            )
+    
+    def _stream_usage(self, reported, received):
+        """Token usage of a stream: as reported upstream, else estimated from the context and the deltas"""
+        if reported:
+            return reported
+        return {'prompt_tokens': self.last_prompt_tokens, 'completion_tokens': estimate_tokens(''.join(received))}
+    
+    def _record_call(self, payload, started, usage=None, **outcome):
+        """Journal a finished upstream call, keep its usage and report its latency for the routed model"""
+        latency = time.monotonic() - started
+        self.journal.record(payload, latency, **outcome)
+        if 'error' not in outcome:
+            usage = usage or {}
+            self.last_usage = {
+                'prompt_tokens': usage.get('prompt_tokens'),
+                'completion_tokens': usage.get('completion_tokens'),
+                'latency': round(latency, 3),
+            }
+        if self.routing is not None:
+            self.model_router.record(self.routing, latency, ok='error' not in outcome)
+    
+    def usage_fields(self):
+        """Message fields recording the upstream usage behind this service's answer (empty if none was made)"""
+        if self.last_usage is None:
+            return {}
+        return {
+            'prompt_tokens': self.last_usage['prompt_tokens'],
+            'completion_tokens': self.last_usage['completion_tokens'],
+            'upstream_latency': self.last_usage['latency'],
+        }
+    
+    def _route(self, message, messages):
+        """Pick this request's model from the ladder (MODEL_ROUTING_ENABLED), before any cache lookup"""
+        if self.model_router.enabled and not self.model_pinned:
+            self.routing = self.model_router.route(message, messages)
+            self.model = self.routing.model
+    
+    def _recent_history(self, conversation_history):
+        """Newest-first queryset of the history rows that may fit in the context window"""
+        # conversation_id stays loaded: a related manager sets each row's conversation from it
+        return conversation_history.order_by('-created_at').only(
+            'conversation', 'content', 'is_from_user', 'token_count', 'created_at'
+        )[:self.context_builder.max_messages]
+    
+    def _conversation_context(self, conversation, conversation_history):
+        """History queryset and running summary to build the prompt from"""
+        if conversation is None:
+            return conversation_history, None
+        # Messages already folded into the summary are represented by it, not resent
+        history = conversation.messages.all()
+        if conversation.summary_until:
+            history = history.filter(created_at__gt=conversation.summary_until)
+        return history, conversation.summary or None
+    
+    def _format_messages(self, message, recent_messages, summary=None, recalled=None):
+        """Build the role/content message list sent upstream from newest-first history"""
+        messages, prompt_tokens = self.context_builder.build(SYSTEM_PROMPT, recent_messages, message, summary, recalled)
+        self.last_prompt_tokens = prompt_tokens
+        return messages
+    
+    def _recall(self, conversation, message, recent_messages):
+        """Older messages relevant to message from before the recent window (RETRIEVAL_ENABLED)"""
+        if conversation is None or not recent_messages or not self.retriever.enabled:
+            return None
+        return self.retriever.recall(conversation, message, before_id=min(msg.pk for msg in recent_messages))
+    
+    def _build_messages(self, message, conversation_history=None, conversation=None):
+        """Build the role/content message list sent upstream"""
+        conversation_history, summary = self._conversation_context(conversation, conversation_history)
+        recent_messages = []
+        # Add as much recent history as fits the token budget
+        if conversation is not None:
+            # Steady state: served from the context cache without a history query
+            recent_messages = self.context_cache.recent(
+                conversation, lambda: self._recent_history(conversation_history)
+            )
+        elif conversation_history is not None:
+            recent_messages = list(self._recent_history(conversation_history))
+        recalled = self._recall(conversation, message, recent_messages)
+        return self._format_messages(message, recent_messages, summary, recalled)
+    
+    def _extract_content(self, response_data):
+        """Pull the completion text out of an API response, or None if the format is unexpected"""
+        if 'choices' in response_data and len(response_data['choices']) > 0:
+            return response_data['choices'][0]['message']['content'].strip()
+        logger.error(f"Unexpected API response format: {response_data}")
+        return None
+    
+    def _complete(self, messages, use_cache):
+        """Completion text for messages (None if the response format is unexpected), cached if allowed"""
+        content = self._extract_content(self._make_api_request(messages))
+        if content is not None and use_cache:
+            self.response_cache.set(self.model, messages, content)
+        return content
+    
+    def answer(self, messages, use_cache=True):
+        """
+        Completion text for an already built context (None if the response format is
+        unexpected). Errors propagate; generate_response() is the forgiving wrapper.
+        """
+        # Identical context already answered: skip the upstream call
+        if use_cache:
+            cached = self.response_cache.get(self.model, messages)
+            if cached is not None:
+                return cached
+            # Identical context in flight right now: share that call's answer
+            return _answer_only(self.single_flight.do(
+                self.response_cache.make_key(self.model, messages), self._complete, messages, use_cache,
+                deadline=self.deadline
+            ))
+        return self._complete(messages, use_cache)
+    
+    def generate_response(self, message, conversation_history=None, use_cache=True, conversation=None):
         """
         Generate AI response using Euron API or fallback
         """
@@ -54,35 +530,138 @@ class AIService:
             
         try:
             # Prepare conversation context
-            messages = [
-                {"role": "system", "content": "You are a helpful AI assistant. Be conversational, informative, and friendly."}
-            ]
-            
-            # Add conversation history if provided (last 10 messages for context)
-            if conversation_history:
-                recent_messages = list(conversation_history.order_by('-created_at')[:10])
-                recent_messages.reverse()  # Put them in chronological order
-                for msg in recent_messages:
-                    role = "user" if msg.is_from_user else "assistant"
-                    messages.append({"role": role, "content": msg.content})
+            messages = self._build_messages(message, conversation_history, conversation)
+            self._route(message, messages)
+            content = self.answer(messages, use_cache)
             
-            # Add current message
-            messages.append({"role": "user", "content": message})
-            
-            # Generate response using Euron API
-            response_data = self._make_api_request(messages)
-            
-            # Extract response from API response
-            if 'choices' in response_data and len(response_data['choices']) > 0:
-                return response_data['choices'][0]['message']['content'].strip()
-            else:
-                logger.error(f"Unexpected API response format: {response_data}")
+            if content is None:
                 return "I'm sorry, I received an unexpected response format from the AI service."
+            return content
             
+        except (BulkheadFullError, RequestCancelledError, DeadlineExceededError):
+            # Overloaded, nobody waiting or out of time: let the view answer rather than store an apology
+            raise
         except Exception as e:
             logger.error(f"Euron API generation failed: {e}")
             return f"I'm sorry, I'm having trouble responding right now. Error: {str(e)}"
     
+    def _complete_with_title(self, messages, use_cache):
+        """(answer, title) for messages from one completion; the answer is cached as a plain response"""
+        content = self._extract_content(self._make_api_request(self._with_title_prompt(messages)))
+        if content is None:
+            return None, None
+        answer, title = parse_answer_and_title(content)
+        if use_cache:
+            self.response_cache.set(self.model, messages, answer)
+        return answer, title
+    
+    def _with_title_prompt(self, messages):
+        return messages + [{"role": "system", "content": TITLE_WITH_ANSWER_PROMPT}]
+    
+    def generate_response_with_title(self, message, conversation_history=None, use_cache=True, conversation=None):
+        """
+        First turn of a conversation: (response, title) from a single upstream call.
+        title is None when the model left it out or no call was made (cache hit, fallback).
+        """
+        if not self.api_key:
+            return self._fallback_response(message), None
+        
+        try:
+            messages = self._build_messages(message, conversation_history, conversation)
+            self._route(message, messages)
+            if use_cache:
+                cached = self.response_cache.get(self.model, messages)
+                if cached is not None:
+                    return cached, None
+                # Same key the answer is cached under, so other processes polling it find it
+                content, title = _with_title(self.single_flight.do(
+                    self.response_cache.make_key(self.model, messages),
+                    self._complete_with_title, messages, use_cache, deadline=self.deadline
+                ))
+            else:
+                content, title = self._complete_with_title(messages, use_cache)
+            
+            if content is None:
+                return "I'm sorry, I received an unexpected response format from the AI service.", None
+            return content, title
+        
+        except (BulkheadFullError, RequestCancelledError, DeadlineExceededError):
+            raise
+        except Exception as e:
+            logger.error(f"Euron API generation failed: {e}")
+            return f"I'm sorry, I'm having trouble responding right now. Error: {str(e)}", None
+    
+    def stream_response(self, message, conversation_history=None, use_cache=True, conversation=None, permit=None):
+        """
+        Generate AI response incrementally, yielding text chunks as the API produces them.
+        permit is a bulkhead slot the caller already holds; it is always released.
+        """
+        if not self.api_key:
+            if permit:
+                permit.release()
+            yield self._fallback_response(message)
+            return
+        
+        received = False
+        stream = None
+        try:
+            messages = self._build_messages(message, conversation_history, conversation)
+            self._route(message, messages)
+            if use_cache:
+                cached = self.response_cache.get(self.model, messages)
+                if cached is not None:
+                    yield cached
+                    return
+            
+            chunks = []
+            stream, permit = self._stream_api_request(messages, permit), None
+            for chunk in stream:
+                received = True
+                chunks.append(chunk)
+                yield chunk
+            # Only complete streams are cached; an aborted client never gets here
+            if use_cache:
+                self.response_cache.set(self.model, messages, ''.join(chunks).strip())
+        except Exception as e:
+            logger.error(f"Euron API streaming failed: {e}")
+            prefix = "\n\n" if received else ""
+            yield f"{prefix}I'm sorry, I'm having trouble responding right now. Error: {str(e)}"
+        finally:
+            # Closed early (client went away): finish the upstream call now, so its usage is final
+            if stream is not None:
+                stream.close()
+            # Cache hit or failure before the upstream stream took ownership of the slot
+            if permit:
+                permit.release()
+    
+    def summarize(self, previous_summary, messages):
+        """
+        Fold messages (chronological) into the running summary. Returns the new
+        summary, or None if the API is unavailable or the call failed.
+        """
+        if not self.api_key:
+            return None
+        
+        max_words = getattr(settings, 'SUMMARY_MAX_WORDS', 200)
+        transcript = "\n".join(
+            f"{'User' if msg.is_from_user else 'Assistant'}: {msg.content[:2000]}" for msg in messages
+        )
+        prompt = [
+            {"role": "system", "content": (
+                "You maintain a running summary of a conversation between a user and an AI assistant. "
+                f"Merge the existing summary and the new messages into one updated summary of at most {max_words} words. "
+                "Keep names, facts, decisions, code identifiers and open questions. Reply with the summary only."
+            )},
+            {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"},
+        ]
+        
+        try:
+            content = self._extract_content(self._make_api_request(prompt))
+            return content[:max_words * 10] if content else None
+        except Exception as e:
+            logger.error(f"Summary generation failed: {e}")
+            return None
+    
     def _fallback_response(self, message):
         """Simple fallback responses when Euron API is not available"""
         responses = {
@@ -99,29 +678,301 @@ class AIService:
         
         return f"I received your message: '{message}'. I'm a demo AI assistant. To enable full AI capabilities, please configure your Euron API key in the settings."
     
+    def _truncate_title(self, first_message):
+        return truncate_title(first_message)
+    
+    def _title_messages(self, first_message):
+        return [
+            {"role": "system", "content": "Generate a short, descriptive title (max 5 words) for a conversation that starts with the following message:"},
+            {"role": "user", "content": first_message}
+        ]
+    
+    def _parse_title(self, response_data, first_message):
+        if 'choices' in response_data and len(response_data['choices']) > 0:
+            title = response_data['choices'][0]['message']['content'].strip().replace('"', '')
+            return title[:50]  # Ensure it's not too long
+        
+        # Fallback to truncated message
+        return self._truncate_title(first_message)
+    
     def generate_conversation_title(self, first_message):
         """
         Generate a title for the conversation based on the first message
         """
         if not self.api_key:
-            return first_message[:30] + ('...' if len(first_message) > 30 else '')
+            return self._truncate_title(first_message)
             
         try:
-            messages = [
-                {"role": "system", "content": "Generate a short, descriptive title (max 5 words) for a conversation that starts with the following message:"},
-                {"role": "user", "content": first_message}
-            ]
+            response_data = self._make_api_request(self._title_messages(first_message))
+            return self._parse_title(response_data, first_message)
             
-            response_data = self._make_api_request(messages)
+        except Exception as e:
+            logger.error(f"Title generation failed: {e}")
+            # Fallback to truncated message
+            return self._truncate_title(first_message)
+
+
+class AsyncAIService(AIService):
+    """Async variant of AIService for ASGI views; upstream I/O never pins a worker thread"""
+    
+    async def _amake_api_request(self, messages):
+        """Make a request to the Euron API without blocking the event loop"""
+        if not self.api_key:
+            raise Exception("API key not configured")
+        
+        if httpx is None:
+            # httpx not installed: run the pooled sync client in a worker thread instead
+            return await sync_to_async(self._make_api_request, thread_sensitive=False)(messages)
+        
+        payload = {
+            "messages": messages,
+            "model": self.model
+        }
+        
+        try:
+            async with self._aslot():
+                started = time.monotonic()
+                try:
+                    if self.journal.replaying:
+                        data = await self._aguard(self.journal.areplay(payload))
+                    else:
+                        data = (await self._aguard(self._ahedged_post(payload))).json()
+                except Exception as e:
+                    self._record_call(payload, started, error=e)
+                    raise
+            self._record_call(payload, started, usage=data.get('usage'), data=data)
+            return data
+        except httpx.HTTPError as e:
+            logger.error(f"Euron API request failed: {e}")
+            raise
+    
+    async def _aguard(self, awaitable):
+        """Await an upstream call, abandoning it if the client disconnects (ASGI only)"""
+        if self.deadline is None:
+            return await awaitable
+        return await self.deadline.guard(awaitable)
+    
+    @contextlib.asynccontextmanager
+    async def _aslot(self):
+        if self._share is None:
+            await sync_to_async(self._fair_share)()
+        permit = await self.bulkhead.aacquire(**self._share)
+        try:
+            yield permit
+        finally:
+            permit.release()
+    
+    async def _apost_once(self, provider, payload):
+        """Async counterpart of _post_once"""
+        timeout = self._timeout(provider)
+        provider.breaker.before_call()
+        started = time.monotonic()
+        try:
+            async with async_http_client() as http:
+                response = await http.post(
+                    provider.url,
+                    headers=self._headers(provider),
+                    json=self._provider_payload(provider, payload),
+                    timeout=timeout
+                )
+        except httpx.TransportError as e:
+            if isinstance(e, httpx.TimeoutException):
+                self._deadline_timed_out(provider, timeout, e)
+            provider.breaker.record_failure()
+            provider.record(time.monotonic() - started, False)
+            return None, e, None
+        except BaseException:
+            # Including cancellation (lost hedge, client gone): the probe slot must come back
+            provider.breaker.release()
+            raise
+        
+        latency = time.monotonic() - started
+        if not self.retry_policy.is_retryable_status(response.status_code):
+            provider.breaker.record_success()
+            provider.record(latency, response.is_success)
+            response.raise_for_status()
+            return response, None, None
+        provider.breaker.record_failure()
+        provider.record(latency, False)
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            return None, e, parse_retry_after(response.headers)
+    
+    async def _apost(self, payload, hedge=False):
+        """Async counterpart of _post: same failover and retry policy, asyncio.sleep between rounds"""
+        for attempt in range(self.retry_policy.max_attempts):
+            error = retry_after = None
+            attempted = False
+            for provider in self._providers(hedge):
+                try:
+                    response, error, provider_retry_after = await self._apost_once(provider, payload)
+                except CircuitOpenError as e:
+                    error = error or e
+                    continue
+                attempted = True
+                if response is not None:
+                    return response
+                logger.warning(f"Upstream provider '{provider.name}' failed: {error}")
+                if provider_retry_after is not None:
+                    retry_after = provider_retry_after if retry_after is None else min(retry_after, provider_retry_after)
             
-            if 'choices' in response_data and len(response_data['choices']) > 0:
-                title = response_data['choices'][0]['message']['content'].strip().replace('"', '')
-                return title[:50]  # Ensure it's not too long
+            if not attempted or attempt + 1 >= self.retry_policy.max_attempts:
+                if attempted:
+                    self.retry_policy.record_exhausted()
+                raise error
+            delay = self.retry_policy.delay(attempt, retry_after)
+            if self.deadline is not None:
+                self.deadline.check(reserve=delay)
+            logger.warning(f"All upstream providers failed (attempt {attempt + 1}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+    
+    async def _ahedged_post(self, payload):
+        """Async counterpart of _hedged_post; the losing request is cancelled outright"""
+        if not getattr(settings, 'UPSTREAM_HEDGING_ENABLED', False):
+            return await self._apost(payload)
+        
+        started = time.monotonic()
+        delay = self.hedge_policy.delay()
+        if delay is None:
+            response = await self._apost(payload)
+            self.hedge_policy.record_latency(time.monotonic() - started)
+            return response
+        
+        primary = asyncio.ensure_future(self._apost(payload))
+        pending = {primary}
+        hedge = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            permit = None if done else self._hedge_slot()
+            if permit is not None:
+                logger.info(f"Upstream call still pending after {delay:.2f}s, sending hedge")
+                hedge = asyncio.ensure_future(self._apost(payload, hedge=True))
+                hedge.add_done_callback(lambda task: permit.release())
+                pending.add(hedge)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if primary in done:
+                    self.hedge_policy.record_latency(time.monotonic() - started)
+                for task in done:
+                    if task.exception() is None:
+                        if hedge is not None:
+                            self.hedge_policy.record_winner(task is hedge)
+                        return task.result()
+            raise primary.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+            if primary in pending:
+                # Cancelled loser: its latency is at least this long
+                self.hedge_policy.record_latency(time.monotonic() - started)
+    
+    async def _abuild_messages(self, message, conversation_history=None, conversation=None):
+        """Async counterpart of _build_messages using async queryset iteration"""
+        conversation_history, summary = self._conversation_context(conversation, conversation_history)
+        
+        async def load():
+            return [msg async for msg in self._recent_history(conversation_history)]
+        
+        recent_messages = []
+        if conversation is not None:
+            recent_messages = await self.context_cache.arecent(conversation, load)
+        elif conversation_history is not None:
+            recent_messages = await load()
+        recalled = None
+        if self.retriever.enabled:
+            recalled = await sync_to_async(self._recall)(conversation, message, recent_messages)
+        return self._format_messages(message, recent_messages, summary, recalled)
+    
+    async def _acomplete(self, messages, use_cache):
+        content = self._extract_content(await self._amake_api_request(messages))
+        if content is not None and use_cache:
+            await self.response_cache.aset(self.model, messages, content)
+        return content
+    
+    async def aanswer(self, messages, use_cache=True):
+        """Async counterpart of answer()"""
+        if use_cache:
+            cached = await self.response_cache.aget(self.model, messages)
+            if cached is not None:
+                return cached
+            return _answer_only(await self.single_flight.ado(
+                self.response_cache.make_key(self.model, messages), self._acomplete, messages, use_cache,
+                deadline=self.deadline
+            ))
+        return await self._acomplete(messages, use_cache)
+    
+    async def agenerate_response(self, message, conversation_history=None, use_cache=True, conversation=None):
+        """
+        Generate AI response using Euron API or fallback
+        """
+        if not self.api_key:
+            return self._fallback_response(message)
+        
+        try:
+            messages = await self._abuild_messages(message, conversation_history, conversation)
+            self._route(message, messages)
+            content = await self.aanswer(messages, use_cache)
             
-            # Fallback to truncated message
-            return first_message[:30] + ('...' if len(first_message) > 30 else '')
+            if content is None:
+                return "I'm sorry, I received an unexpected response format from the AI service."
+            return content
+        
+        except (BulkheadFullError, RequestCancelledError, DeadlineExceededError):
+            raise
+        except Exception as e:
+            logger.error(f"Euron API generation failed: {e}")
+            return f"I'm sorry, I'm having trouble responding right now. Error: {str(e)}"
+    
+    async def _acomplete_with_title(self, messages, use_cache):
+        content = self._extract_content(await self._amake_api_request(self._with_title_prompt(messages)))
+        if content is None:
+            return None, None
+        answer, title = parse_answer_and_title(content)
+        if use_cache:
+            await self.response_cache.aset(self.model, messages, answer)
+        return answer, title
+    
+    async def agenerate_response_with_title(self, message, conversation_history=None, use_cache=True, conversation=None):
+        """Async counterpart of generate_response_with_title"""
+        if not self.api_key:
+            return self._fallback_response(message), None
+        
+        try:
+            messages = await self._abuild_messages(message, conversation_history, conversation)
+            self._route(message, messages)
+            if use_cache:
+                cached = await self.response_cache.aget(self.model, messages)
+                if cached is not None:
+                    return cached, None
+                content, title = _with_title(await self.single_flight.ado(
+                    self.response_cache.make_key(self.model, messages),
+                    self._acomplete_with_title, messages, use_cache, deadline=self.deadline
+                ))
+            else:
+                content, title = await self._acomplete_with_title(messages, use_cache)
             
+            if content is None:
+                return "I'm sorry, I received an unexpected response format from the AI service.", None
+            return content, title
+        
+        except (BulkheadFullError, RequestCancelledError, DeadlineExceededError):
+            raise
+        except Exception as e:
+            logger.error(f"Euron API generation failed: {e}")
+            return f"I'm sorry, I'm having trouble responding right now. Error: {str(e)}", None
+    
+    async def agenerate_conversation_title(self, first_message):
+        """
+        Generate a title for the conversation based on the first message
+        """
+        if not self.api_key:
+            return self._truncate_title(first_message)
+        
+        try:
+            response_data = await self._amake_api_request(self._title_messages(first_message))
+            return self._parse_title(response_data, first_message)
+        
         except Exception as e:
             logger.error(f"Title generation failed: {e}")
-            # Fallback to truncated message
-            return first_message[:30] + ('...' if len(first_message) > 30 else '')
\ No newline at end of file
+            return self._truncate_title(first_message)
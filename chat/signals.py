@@ -0,0 +1,27 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Conversation, Message
+from .context_cache import get_context_cache
+from .retrieval import get_retriever
+from .usage import record_answer
+
+
+@receiver(post_save, sender=Message)
+def message_saved(sender, instance, created, **kwargs):
+    """Keep cached contexts, loaded retrieval indexes and usage rollups current as messages are written"""
+    if created:
+        get_context_cache().append(instance)
+        get_retriever().add_message(instance)
+        if not instance.is_from_user:
+            record_answer(instance)
+    else:
+        get_context_cache().invalidate(instance.conversation_id)
+
+
+@receiver(post_delete, sender=Message)
+def message_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Conversation):
+        # Cascade from deleting the conversation: its watermark goes with it
+        get_context_cache().invalidate(instance.conversation_id)
+        return
+    get_context_cache().forget(instance)
@@ -0,0 +1,271 @@
+from django.conf import settings
+from django.core.cache import caches
+from asgiref.sync import sync_to_async
+import threading
+import asyncio
+import time
+import logging
+
+from .deadlines import DeadlineExceededError, RequestCancelledError, current_deadline
+from .resilience import BulkheadFullError
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """One in-progress call; followers block on the event or await a future resolved from any thread"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._futures = []
+
+    def add_future(self, loop):
+        """Future resolved when the flight lands, or None if it already has"""
+        with self._lock:
+            if self.event.is_set():
+                return None
+            future = loop.create_future()
+            self._futures.append((loop, future))
+            return future
+
+    def finish(self, result=None, error=None):
+        with self._lock:
+            self.result = result
+            self.error = error
+            self.event.set()
+            futures, self._futures = self._futures, []
+        for loop, future in futures:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                pass  # the follower's loop already ended (it stopped waiting at its deadline)
+
+    @property
+    def abandoned(self):
+        """
+        The leader gave up for reasons of its own (cancelled, out of time on its own
+        deadline, over its own bulkhead share) rather than upstream failing; followers
+        make the call themselves, under their own deadline and bulkhead permit.
+        """
+        return isinstance(
+            self.error, (asyncio.CancelledError, RequestCancelledError, DeadlineExceededError, BulkheadFullError)
+        )
+
+    def outcome(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(True)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first caller for a key (the leader)
+    runs the call, callers arriving while it is in flight wait for and share its
+    result or exception.
+
+    With SINGLE_FLIGHT_DISTRIBUTED, the leader also takes a short-lived lock in
+    the response cache alias, and leaders in other processes that find the lock
+    taken poll that cache for the result (the leader stores it under the same
+    key) instead of calling upstream. Needs a shared cache backend (Redis,
+    Memcached, database) to have any effect across processes.
+    """
+
+    lock_prefix = 'airesp:lock:'
+    poll_interval = 0.05
+
+    def __init__(self):
+        self.wait_timeout = getattr(settings, 'SINGLE_FLIGHT_WAIT', 60)
+        self.distributed = getattr(settings, 'SINGLE_FLIGHT_DISTRIBUTED', False)
+        self.alias = getattr(settings, 'RESPONSE_CACHE_ALIAS', 'responses')
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._leaders = 0
+        self._coalesced = 0
+        self._coalesced_remote = 0
+        self._wait_timeouts = 0
+
+    def _count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def _join(self, key):
+        """(flight, is_leader) for key"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._coalesced += 1
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            self._leaders += 1
+            return flight, True
+
+    def _wait_limit(self, deadline):
+        """
+        (seconds, bound): how long a caller may wait, capped by what is left of its
+        deadline; bound is that deadline when it, not SINGLE_FLIGHT_WAIT, sets the limit.
+        """
+        deadline = deadline if deadline is not None else current_deadline()
+        if deadline is None or deadline.remaining() >= self.wait_timeout:
+            return self.wait_timeout, None
+        return max(deadline.remaining(), 0.0), deadline
+
+    def _waited_out(self, bound):
+        """A follower's wait ran out: raise if its deadline did, else count the timeout"""
+        if bound is not None:
+            raise bound.exceeded()
+        self._count('_wait_timeouts')
+
+    def _land(self, key, flight, result=None, error=None):
+        with self._lock:
+            self._flights.pop(key, None)
+        flight.finish(result, error)
+
+    def do(self, key, func, *args, deadline=None):
+        """
+        Return func(*args), sharing the call with concurrent callers for the same key.
+        A caller waits at most SINGLE_FLIGHT_WAIT, or what is left of its deadline
+        (deadline, else the current request's); running out of the latter raises
+        DeadlineExceededError.
+        """
+        flight, leader = self._join(key)
+        if not leader:
+            timeout, bound = self._wait_limit(deadline)
+            if not flight.event.wait(timeout):
+                self._waited_out(bound)
+                return func(*args)
+            return func(*args) if flight.abandoned else flight.outcome()
+
+        locked = False
+        try:
+            result = None
+            if self.distributed:
+                locked = self._try_lock(key)
+                if not locked:
+                    result = self._poll(key, self._wait_limit(deadline)[0])
+            if result is None:
+                result = func(*args)
+        except BaseException as e:
+            self._land(key, flight, error=e)
+            raise
+        finally:
+            if locked:
+                self._unlock(key)
+        self._land(key, flight, result)
+        return result
+
+    async def ado(self, key, func, *args, deadline=None):
+        """Async counterpart of do(); func is a coroutine function"""
+        flight, leader = self._join(key)
+        if not leader:
+            future = flight.add_future(asyncio.get_running_loop())
+            if future is not None:
+                timeout, bound = self._wait_limit(deadline)
+                try:
+                    await asyncio.wait_for(future, timeout)
+                except asyncio.TimeoutError:
+                    self._waited_out(bound)
+                    return await func(*args)
+            return await func(*args) if flight.abandoned else flight.outcome()
+
+        locked = False
+        try:
+            result = None
+            if self.distributed:
+                locked = await sync_to_async(self._try_lock)(key)
+                if not locked:
+                    result = await self._apoll(key, self._wait_limit(deadline)[0])
+            if result is None:
+                result = await func(*args)
+        except BaseException as e:
+            self._land(key, flight, error=e)
+            raise
+        finally:
+            if locked:
+                await sync_to_async(self._unlock)(key)
+        self._land(key, flight, result)
+        return result
+
+    # Cross-process coordination through the cache
+
+    def _try_lock(self, key):
+        try:
+            return caches[self.alias].add(self.lock_prefix + key, 1, timeout=self.wait_timeout)
+        except Exception as e:
+            logger.warning(f"Single-flight lock failed: {e}")
+            return False
+
+    def _unlock(self, key):
+        try:
+            caches[self.alias].delete(self.lock_prefix + key)
+        except Exception as e:
+            logger.warning(f"Single-flight unlock failed: {e}")
+
+    def _check(self, key):
+        """(done, result): done once the other process stored a result or released its lock"""
+        cache = caches[self.alias]
+        result = cache.get(key)
+        if result is not None:
+            self._count('_coalesced_remote')
+            return True, result
+        if not cache.has_key(self.lock_prefix + key):
+            # Leader finished without storing anything (failed, or answer too large to cache)
+            return True, None
+        return False, None
+
+    def _poll(self, key, timeout):
+        """Result stored by another process's leader, or None if it has none or the wait times out"""
+        deadline = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline:
+                done, result = self._check(key)
+                if done:
+                    return result
+                time.sleep(self.poll_interval)
+        except Exception as e:
+            logger.warning(f"Single-flight poll failed: {e}")
+        return None
+
+    async def _apoll(self, key, timeout):
+        deadline = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline:
+                done, result = await sync_to_async(self._check)(key)
+                if done:
+                    return result
+                await asyncio.sleep(self.poll_interval)
+        except Exception as e:
+            logger.warning(f"Single-flight poll failed: {e}")
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'distributed': self.distributed,
+                'in_flight': len(self._flights),
+                'leaders': self._leaders,
+                'coalesced': self._coalesced,
+                'coalesced_remote': self._coalesced_remote,
+                'wait_timeouts': self._wait_timeouts,
+            }
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    """Return the process-wide single-flight group"""
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+    return _single_flight
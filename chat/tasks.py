@@ -0,0 +1,169 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from .models import Conversation
+from .services import AIService, truncate_title
+from .titles import get_title_strategy
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# In-process background work that must not delay the HTTP response. Jobs are
+# best-effort: they are lost if the process restarts, so each one must leave the
+# data usable (e.g. a provisional title) if it never runs.
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending_titles = set()
+_pending_summaries = set()
+_pending_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process-wide background executor, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'BACKGROUND_WORKERS', 2),
+                    thread_name_prefix='chat-background',
+                )
+    return _executor
+
+
+def _run_job(func, *args):
+    # Worker threads get their own DB connections; don't leak or reuse stale ones
+    close_old_connections()
+    try:
+        func(*args)
+    except Exception as e:
+        logger.error(f"Background job {func.__name__} failed: {e}")
+    finally:
+        close_old_connections()
+
+
+def submit_after_commit(func, *args):
+    """Run func(*args) on the background executor once the current transaction commits"""
+    transaction.on_commit(lambda: get_executor().submit(_run_job, func, *args))
+
+
+def generate_title(conversation_id, first_message, provisional_title):
+    """
+    Replace a conversation's provisional title with a generated one.
+
+    Idempotent and safe against user edits: the update only applies while the
+    conversation still has the exact provisional title in the pending state.
+    """
+    try:
+        title = get_title_strategy().generate(first_message)
+        updated = Conversation.objects.filter(
+            pk=conversation_id,
+            title_status=Conversation.TITLE_PENDING,
+            title=provisional_title,
+        ).update(title=title, title_status=Conversation.TITLE_FINAL)
+        if not updated:
+            logger.info(f"Skipped title for conversation {conversation_id}: already final or edited")
+    finally:
+        with _pending_lock:
+            _pending_titles.discard(conversation_id)
+
+
+def schedule_title_generation(conversation, first_message):
+    """
+    Title a new conversation without holding up the response.
+
+    If the configured title strategy can produce a title locally it is final
+    immediately; otherwise the conversation gets a provisional title and the
+    real one is generated in the background. Saves the conversation and
+    returns the title it now has.
+    """
+    strategy = get_title_strategy()
+    title = strategy.quick_title(first_message)
+    if title:
+        conversation.title = title
+        conversation.title_status = Conversation.TITLE_FINAL
+        conversation.save()
+        return title
+
+    provisional_title = truncate_title(first_message)
+    conversation.title = provisional_title
+    conversation.title_status = Conversation.TITLE_PENDING
+    conversation.save()
+
+    with _pending_lock:
+        if conversation.id in _pending_titles:
+            return provisional_title
+        _pending_titles.add(conversation.id)
+
+    submit_after_commit(generate_title, conversation.id, first_message, provisional_title)
+    return provisional_title
+
+
+def set_first_response_title(conversation, first_message, title):
+    """
+    Final title returned with the first answer (see CombinedTitleStrategy), or the
+    truncated first message if the model left it out. Saves the conversation.
+    """
+    conversation.title = title or truncate_title(first_message)
+    conversation.title_status = Conversation.TITLE_FINAL
+    conversation.save()
+    return conversation.title
+
+
+def update_summary(conversation_id):
+    """
+    Fold the oldest unsummarized messages of a conversation into its running summary.
+
+    The most recent SUMMARY_KEEP_RECENT messages stay out of the summary so the
+    prompt still sees them verbatim. The write is conditional on summary_until
+    being unchanged, so concurrent or repeated runs never fold a turn twice.
+    """
+    try:
+        conversation = Conversation.objects.get(pk=conversation_id)
+        keep_recent = getattr(settings, 'SUMMARY_KEEP_RECENT', 10)
+        max_fold = getattr(settings, 'SUMMARY_MAX_FOLD', 40)
+
+        unsummarized = conversation.messages.order_by('created_at').only('conversation', 'content', 'is_from_user', 'created_at')
+        if conversation.summary_until:
+            unsummarized = unsummarized.filter(created_at__gt=conversation.summary_until)
+        messages = list(unsummarized)
+        to_fold = messages[:-keep_recent][:max_fold] if keep_recent else messages[:max_fold]
+        if not to_fold:
+            return
+
+        summary = AIService().summarize(conversation.summary, to_fold)
+        if not summary:
+            return
+        updated = Conversation.objects.filter(
+            pk=conversation_id,
+            summary_until=conversation.summary_until,
+        ).update(summary=summary, summary_until=to_fold[-1].created_at)
+        if updated:
+            logger.info(f"Folded {len(to_fold)} messages into summary of conversation {conversation_id}")
+    finally:
+        with _pending_lock:
+            _pending_summaries.discard(conversation_id)
+
+
+def schedule_summary_update(conversation):
+    """Queue a summary update once a conversation has more than SUMMARY_TRIGGER_MESSAGES unsummarized messages"""
+    if not getattr(settings, 'SUMMARY_ENABLED', False):
+        return False
+
+    trigger = getattr(settings, 'SUMMARY_TRIGGER_MESSAGES', 20)
+    unsummarized = conversation.messages.all()
+    if conversation.summary_until:
+        unsummarized = unsummarized.filter(created_at__gt=conversation.summary_until)
+    # Counting stops one row past the trigger, however long the conversation is
+    if unsummarized[:trigger + 1].count() <= trigger:
+        return False
+
+    with _pending_lock:
+        if conversation.id in _pending_summaries:
+            return False
+        _pending_summaries.add(conversation.id)
+
+    submit_after_commit(update_summary, conversation.id)
+    return True
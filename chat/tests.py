@@ -0,0 +1,634 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from .compare import iter_compare
+from .context_cache import get_context_cache
+from .deadlines import Deadline, DeadlineExceededError, DeadlinePolicy
+from .hedging import HedgePolicy
+from .journal import ReplayedUpstreamError, UpstreamJournal
+from .mock_upstream import MockUpstreamServer
+from .model_routing import ModelRouter
+from .models import Conversation, Message
+from .providers import Provider, ProviderRouter
+from .resilience import Bulkhead, BulkheadFullError, CircuitBreaker, CircuitOpenError, RetryPolicy, get_bulkhead
+from .response_cache import context_hash
+from .retrieval import MessageRetriever
+from .services import AIService, AsyncAIService, parse_answer_and_title
+from .single_flight import SingleFlight
+from .tasks import schedule_summary_update
+
+
+class SingleFlightDeadlineTests(SimpleTestCase):
+    """A leader running out of its own time budget must not fail the callers sharing its call"""
+
+    def setUp(self):
+        self.upstream = MockUpstreamServer(latency=1.5, reply_text="shared answer").start()
+        self.addCleanup(self.upstream.stop)
+        settings = override_settings(
+            UPSTREAM_MOCK_URL=self.upstream.url,
+            REQUEST_DEADLINE_MIN_UPSTREAM=0.2,
+            UPSTREAM_RETRY_MAX_ATTEMPTS=1,
+            UPSTREAM_HEDGING_ENABLED=False,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_follower_retries_under_its_own_deadline(self):
+        policy = DeadlinePolicy()
+        messages = [{"role": "user", "content": f"single flight deadline {uuid.uuid4()}"}]
+        leader = AIService(deadline=Deadline(policy, 1.0))
+        follower = AIService(deadline=Deadline(policy, 10.0))
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leading = executor.submit(leader.answer, messages)
+            time.sleep(0.2)  # the follower joins the leader's flight
+            following = executor.submit(follower.answer, messages)
+
+            with self.assertRaises(DeadlineExceededError):
+                leading.result()
+            self.assertEqual(following.result(), "shared answer")
+        self.assertEqual(policy.stats()['exceeded'], 1)
+
+
+class SingleFlightFollowerTests(SimpleTestCase):
+    def lead(self, group, key, error, hold=0.3):
+        def leader():
+            time.sleep(hold)
+            raise error
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        future = executor.submit(group.do, key, leader)
+        time.sleep(0.05)  # the leader has joined first
+        return future
+
+    def test_follower_retries_when_the_leader_is_over_its_bulkhead_share(self):
+        group = SingleFlight()
+        leading = self.lead(group, 'k', BulkheadFullError('euron', 1))
+        self.assertEqual(group.do('k', lambda: 'own answer'), 'own answer')
+        with self.assertRaises(BulkheadFullError):
+            leading.result()
+
+    def test_follower_waits_no_longer_than_its_deadline(self):
+        group = SingleFlight()
+        leading = self.lead(group, 'k', RuntimeError('slow leader'), hold=1.0)
+        policy = DeadlinePolicy()
+        started = time.monotonic()
+        with self.assertRaises(DeadlineExceededError):
+            group.do('k', lambda: 'unused', deadline=Deadline(policy, 0.2))
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(policy.stats()['exceeded'], 1)
+        with self.assertRaisesMessage(RuntimeError, 'slow leader'):
+            leading.result()
+
+    def test_async_follower_waits_no_longer_than_its_deadline(self):
+        group = SingleFlight()
+        leading = self.lead(group, 'k', RuntimeError('slow leader'), hold=1.0)
+
+        async def follow():
+            async def call():
+                return 'unused'
+            return await group.ado('k', call, deadline=Deadline(DeadlinePolicy(), 0.2))
+
+        with self.assertRaises(DeadlineExceededError):
+            asyncio.run(follow())
+        with self.assertRaisesMessage(RuntimeError, 'slow leader'):
+            leading.result()
+
+
+class ContextCacheWatermarkTests(TestCase):
+    """A cached history that missed a message written elsewhere is rebuilt, not served with a gap"""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='watermark', password='!')
+        self.conversation = Conversation.objects.create(user=user)
+        self.cache = get_context_cache()
+        self.addCleanup(self.cache.invalidate, self.conversation.pk)
+
+    def history(self):
+        conversation = Conversation.objects.get(pk=self.conversation.pk)
+        load = lambda: conversation.messages.order_by('-created_at')
+        return [entry.content for entry in self.cache.recent(conversation, load)][::-1]
+
+    def add(self, content):
+        return Message.objects.create(conversation=self.conversation, content=content)
+
+    def test_entry_missing_a_message_is_rebuilt(self):
+        self.add('first')
+        self.assertEqual(self.history(), ['first'])
+        key = self.cache.make_key(self.conversation.pk)
+        other_process = self.cache.cache.get(key)
+
+        self.add('second')
+        # A process that did not see 'second' still holds the old entry
+        self.cache.cache.set(key, other_process)
+        self.assertEqual(self.history(), ['first', 'second'])
+
+    def test_append_after_a_missed_message_does_not_leave_a_gap(self):
+        self.add('first')
+        self.history()
+        key = self.cache.make_key(self.conversation.pk)
+        other_process = self.cache.cache.get(key)
+        self.add('second')
+        self.cache.cache.set(key, other_process)
+
+        self.add('third')
+        self.assertEqual(self.history(), ['first', 'second', 'third'])
+
+    def test_deleting_the_newest_message_steps_the_watermark_back(self):
+        first = self.add('first')
+        self.add('second').delete()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message_pk, first.pk)
+        self.assertEqual(self.history(), ['first'])
+
+
+class ResponseCacheKeyTests(SimpleTestCase):
+    def key(self, content):
+        return context_hash('model', [{"role": "user", "content": content}])
+
+    def test_only_line_endings_and_surrounding_whitespace_are_normalized(self):
+        self.assertEqual(self.key("  print(x)\r\nprint(y)\n"), self.key("print(x)\nprint(y)"))
+        self.assertNotEqual(self.key("Use Foo"), self.key("use foo"))
+        self.assertNotEqual(self.key("if x:\n    y"), self.key("if x: y"))
+
+
+class ParseAnswerAndTitleTests(SimpleTestCase):
+    def test_fenced_json(self):
+        content = '```json\n{"answer": "Hello", "title": "Greeting"}\n```'
+        self.assertEqual(parse_answer_and_title(content), ("Hello", "Greeting"))
+
+    def test_braces_after_the_json(self):
+        content = '{"answer": "use {braces}"} trailing {x}'
+        self.assertEqual(parse_answer_and_title(content), ("use {braces}", None))
+
+    def test_not_json(self):
+        self.assertEqual(parse_answer_and_title(" plain {answer} "), ("plain {answer}", None))
+
+
+class StreamMessagePermitTests(TestCase):
+    def test_slot_is_released_when_the_stream_is_never_read(self):
+        user = get_user_model().objects.create_user(username='streamer', password='!')
+        self.client.force_login(user)
+        bulkhead = get_bulkhead()
+        in_flight = bulkhead.stats()['in_flight']
+
+        response = self.client.post(
+            '/chat/stream/', json.dumps({'message': 'hello'}), content_type='application/json', secure=True,
+        )
+        self.assertEqual(bulkhead.stats()['in_flight'], in_flight + 1)
+        response.close()
+        self.assertEqual(bulkhead.stats()['in_flight'], in_flight)
+
+
+class UsageFilterTests(TestCase):
+    def setUp(self):
+        staff = get_user_model().objects.create_user(username='staff', password='!', is_staff=True)
+        self.client.force_login(staff)
+
+    def test_malformed_filters_are_a_bad_request(self):
+        for query in ('user=abc', 'since=2026-02-30', 'until=yesterday'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/usage/?{query}', secure=True)
+                self.assertEqual(response.status_code, 400)
+
+    def test_user_filter(self):
+        response = self.client.get('/api/usage/totals/?user=1', secure=True)
+        self.assertEqual(response.status_code, 200)
+
+
+class NoProviderTests(SimpleTestCase):
+    def test_no_provider_to_try_is_a_configuration_error(self):
+        service = AIService()
+        service.router = ProviderRouter([])
+        with self.assertRaises(ImproperlyConfigured):
+            service._post({"messages": []})
+
+        async_service = AsyncAIService()
+        async_service.router = ProviderRouter([])
+        with self.assertRaises(ImproperlyConfigured):
+            asyncio.run(async_service._apost({"messages": []}))
+
+
+class RecentHistoryQueryTests(TestCase):
+    def test_history_rows_load_in_one_query(self):
+        user = get_user_model().objects.create_user(username='history', password='!')
+        conversation = Conversation.objects.create(user=user)
+        for i in range(5):
+            Message.objects.create(conversation=conversation, content=f"message {i}", is_from_user=i % 2 == 0)
+
+        # The related manager reads each row's conversation_id; deferring it costs a query per row
+        with self.assertNumQueries(1):
+            rows = list(AIService()._recent_history(conversation.messages.all()))
+        self.assertEqual([row.content for row in rows], [f"message {i}" for i in reversed(range(5))])
+
+
+@override_settings(UPSTREAM_MOCK_URL='http://127.0.0.1:9/v1/chat/completions', SINGLE_FLIGHT_DISTRIBUTED=True, SINGLE_FLIGHT_WAIT=5)
+class DistributedTitleFlightTests(SimpleTestCase):
+    def test_first_turn_finds_the_answer_another_process_cached(self):
+        service = AIService()
+        service.single_flight = SingleFlight()
+        message = f"distributed first turn {uuid.uuid4()}"
+        messages = service._build_messages(message)
+        service._route(message, messages)
+        key = service.response_cache.make_key(service.model, messages)
+        # Another process leads this context: it holds the lock and caches the answer later
+        lock = caches[service.single_flight.alias]
+        lock.add(service.single_flight.lock_prefix + key, 1)
+        self.addCleanup(lock.delete, service.single_flight.lock_prefix + key)
+        threading.Timer(0.2, service.response_cache.set, (service.model, messages, "remote answer")).start()
+
+        started = time.monotonic()
+        self.assertEqual(service.generate_response_with_title(message), ("remote answer", None))
+        self.assertLess(time.monotonic() - started, 2)
+
+
+@override_settings(UPSTREAM_MOCK_URL='http://127.0.0.1:9/v1/chat/completions', REQUEST_DEADLINE_MIN_UPSTREAM=1.0)
+class DeadlineResponseTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='hurried', password='!')
+        self.client.force_login(self.user)
+
+    def test_answer_out_of_time_is_a_504_and_drops_the_turn(self):
+        conversation = Conversation.objects.create(user=self.user, title='Hurried')
+        for path in ('/chat/send/', '/chat/async/send/'):
+            with self.subTest(path=path):
+                response = self.client.post(
+                    path, json.dumps({'message': 'quick', 'conversation_id': conversation.pk}),
+                    content_type='application/json', secure=True, HTTP_X_REQUEST_TIMEOUT='0.5',
+                )
+                self.assertEqual(response.status_code, 504)
+                self.assertFalse(conversation.messages.exists())
+
+
+class ProviderModelTests(SimpleTestCase):
+    def test_provider_model_replaces_only_the_default(self):
+        provider = Provider('pinned', 'http://127.0.0.1:9/v1/chat/completions', model='provider-model')
+        payload = {'messages': [], 'model': 'gpt-4.1-nano'}
+        self.assertEqual(AIService()._provider_payload(provider, payload)['model'], 'provider-model')
+        asked = AIService(model='gpt-4.1')
+        self.assertEqual(asked._provider_payload(provider, dict(payload, model=asked.model))['model'], 'gpt-4.1')
+
+
+class CompareProviderModelTests(SimpleTestCase):
+    def setUp(self):
+        self.upstream = MockUpstreamServer(latency=0.01).start()
+        self.addCleanup(self.upstream.stop)
+
+    def test_each_lane_sends_its_own_model_to_a_provider_with_one_configured(self):
+        providers = [{'name': 'pinned', 'url': self.upstream.url, 'api_key': 'k', 'model': 'provider-model'}]
+        sent = []
+        provider_payload = AIService._provider_payload
+
+        def recording(service, provider, payload):
+            payload = provider_payload(service, provider, payload)
+            sent.append(payload['model'])
+            return payload
+
+        models = ['gpt-4.1-nano', 'gpt-4.1-mini']
+        with override_settings(UPSTREAM_MOCK_URL=None, UPSTREAM_PROVIDERS=providers), \
+                mock.patch.object(AIService, '_provider_payload', recording):
+            results = list(iter_compare(f"compare lanes {uuid.uuid4()}", models, use_cache=False))
+        self.assertEqual(sorted(result['model'] for result in results if not result['error']), sorted(models))
+        self.assertEqual(sorted(sent), sorted(models))
+
+
+class RoutingDecisionLogTests(SimpleTestCase):
+    def setUp(self):
+        self.upstream = MockUpstreamServer(latency=0.01).start()
+        self.addCleanup(self.upstream.stop)
+
+    def test_cache_hits_are_counted_and_logged_too(self):
+        router = ModelRouter(enabled=True)
+        message = f"routed twice {uuid.uuid4()}"
+        with override_settings(UPSTREAM_MOCK_URL=self.upstream.url), self.assertLogs('chat.model_routing') as logs:
+            for _ in range(2):
+                service = AIService()
+                service.model_router = router
+                service.generate_response(message)
+        self.assertEqual(sum(router.stats()['decisions'].values()), 2)
+        self.assertEqual(sum('upstream in' in line for line in logs.output), 1)
+        self.assertEqual(sum('(tier ' in line for line in logs.output), 2)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def breaker(self):
+        return CircuitBreaker('test', failure_rate=0.5, min_calls=4, window=60, cooldown=0.1)
+
+    def test_opens_on_failure_rate_then_probes_and_closes(self):
+        breaker = self.breaker()
+        for record in (breaker.record_success, breaker.record_failure, breaker.record_success):
+            breaker.before_call()
+            record()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)  # under min_calls
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        time.sleep(0.15)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()  # one probe at a time
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.stats()['times_opened'], 1)
+
+    def test_failed_probe_reopens(self):
+        breaker = self.breaker()
+        for _ in range(4):
+            breaker.before_call()
+            breaker.record_failure()
+        time.sleep(0.15)
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(breaker.stats()['times_opened'], 2)
+
+
+class RetryPolicyTests(SimpleTestCase):
+    def test_backoff_is_jittered_under_a_capped_exponential(self):
+        policy = RetryPolicy(max_attempts=5, base_delay=0.5, max_delay=4.0)
+        for attempt, cap in enumerate((0.5, 1.0, 2.0, 4.0, 4.0, 4.0)):
+            delays = [policy.delay(attempt) for _ in range(200)]
+            self.assertTrue(all(0 <= delay <= cap for delay in delays))
+            self.assertGreater(max(delays), cap / 2)
+
+    def test_retry_after_is_honoured_up_to_the_cap(self):
+        policy = RetryPolicy(base_delay=0.5, max_delay=4.0)
+        self.assertEqual(policy.delay(0, retry_after=3), 3)
+        self.assertEqual(policy.delay(0, retry_after=60), 4.0)
+
+
+class BulkheadRejectionTests(TestCase):
+    def test_rejects_after_the_queue_wait_and_over_the_per_user_queue(self):
+        bulkhead = Bulkhead('test', max_concurrent=1, max_wait=0.3, max_queued_per_key=1)
+        with bulkhead.acquire(key='a'):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                queued = executor.submit(bulkhead.acquire, key='b')
+                time.sleep(0.05)
+                with self.assertRaises(BulkheadFullError):
+                    bulkhead.acquire(key='b')  # 'b' already has a request waiting
+                with self.assertRaises(BulkheadFullError) as rejected:
+                    queued.result()
+        self.assertGreaterEqual(rejected.exception.retry_after, 1)
+        stats = bulkhead.stats()
+        self.assertEqual((stats['rejected'], stats['rejected_per_user_limit'], stats['in_flight']), (2, 1, 0))
+
+    def test_full_bulkhead_is_a_503_with_retry_after(self):
+        user = get_user_model().objects.create_user(username='crowded', password='!')
+        self.client.force_login(user)
+        bulkhead = get_bulkhead()
+        max_wait, bulkhead.max_wait = bulkhead.max_wait, 0.05
+        self.addCleanup(setattr, bulkhead, 'max_wait', max_wait)
+        permit = bulkhead.try_acquire()
+        while permit is not None:
+            self.addCleanup(permit.release)
+            permit = bulkhead.try_acquire()
+
+        response = self.client.post(
+            '/chat/send/', json.dumps({'message': 'anyone there?'}), content_type='application/json', secure=True,
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertFalse(Message.objects.filter(conversation__user=user).exists())
+
+
+class FairQueueingTests(SimpleTestCase):
+    def test_light_user_is_served_between_a_heavy_users_requests(self):
+        bulkhead = Bulkhead('test', max_concurrent=1, max_wait=2, max_queued_per_key=4)
+        served = []
+
+        def call(key, name):
+            with bulkhead.acquire(key=key):
+                served.append(name)
+
+        held = bulkhead.acquire(key='heavy')
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            calls = []
+            for key, name in (('heavy', 'h1'), ('heavy', 'h2'), ('heavy', 'h3'), ('light', 'l1')):
+                calls.append(executor.submit(call, key, name))
+                time.sleep(0.05)  # queue in this order
+            held.release()
+            for future in calls:
+                future.result()
+        # Start tags: h1 0, h2 1, h3 2, l1 0 (a new flow starts at the current virtual time)
+        self.assertEqual(served, ['h1', 'l1', 'h2', 'h3'])
+
+    def test_weight_spaces_a_flows_requests_closer(self):
+        bulkhead = Bulkhead('test', max_concurrent=1, max_wait=2, max_queued_per_key=4)
+        served = []
+
+        def call(key, weight, name):
+            with bulkhead.acquire(key=key, weight=weight):
+                served.append(name)
+
+        held = bulkhead.acquire(key='x')
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            calls = []
+            for key, weight, name in (('plain', 1, 'p1'), ('plain', 1, 'p2'), ('staff', 4, 's1'), ('staff', 4, 's2')):
+                calls.append(executor.submit(call, key, weight, name))
+                time.sleep(0.05)
+            held.release()
+            for future in calls:
+                future.result()
+        # Start tags: p1 0, p2 1, s1 0, s2 0.25
+        self.assertEqual(served, ['p1', 's1', 's2', 'p2'])
+
+
+class _Response:
+    def __init__(self, name):
+        self.name = name
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+
+class HedgingTests(SimpleTestCase):
+    def warmed_policy(self, budget):
+        policy = HedgePolicy(percentile=0.95, budget=budget, min_delay=0.05)
+        for _ in range(HedgePolicy.MIN_SAMPLES):
+            policy.record_latency(0.01)
+        return policy
+
+    def test_no_hedging_until_warmed_up(self):
+        policy = HedgePolicy(budget=1.0)
+        self.assertIsNone(policy.delay())
+
+    def test_budget_caps_hedges_at_its_fraction_of_requests(self):
+        policy = self.warmed_policy(budget=0.1)
+        hedges = 0
+        for _ in range(100):
+            self.assertEqual(policy.delay(), 0.05)  # p95 of 10ms samples, raised to min_delay
+            hedges += policy.try_hedge()
+        self.assertIn(hedges, (9, 10))
+        self.assertEqual(policy.stats()['skipped_over_budget'], 100 - hedges)
+
+    @override_settings(UPSTREAM_HEDGING_ENABLED=True)
+    def test_first_answer_wins_and_the_losers_response_is_closed(self):
+        service = AIService()
+        service.hedge_policy = self.warmed_policy(budget=1.0)
+        service.bulkhead = Bulkhead('test', max_concurrent=2)
+        slow = _Response('primary')
+
+        def post(payload, hedge=False, **kwargs):
+            if hedge:
+                return _Response('hedge')
+            time.sleep(0.5)
+            return slow
+
+        service._post = post
+        started = time.monotonic()
+        self.assertEqual(service._hedged_post({}).name, 'hedge')
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertTrue(slow.closed.wait(2))
+        stats = service.hedge_policy.stats()
+        self.assertEqual((stats['hedges'], stats['hedge_wins']), (1, 1))
+        self.assertEqual(service.bulkhead.stats()['in_flight'], 0)  # the hedge's slot came back
+
+
+class JournalRoundTripTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'journal.jsonl')
+
+    def test_recorded_calls_replay_without_the_upstream(self):
+        messages = [{"role": "user", "content": f"journal round trip {uuid.uuid4()}"}]
+        upstream = MockUpstreamServer(latency=0.01, reply_text="recorded answer").start()
+        try:
+            with override_settings(UPSTREAM_MOCK_URL=upstream.url, UPSTREAM_JOURNAL_MODE='record',
+                                   UPSTREAM_JOURNAL_PATH=self.path):
+                self.assertEqual(AIService().answer(messages, use_cache=False), "recorded answer")
+                streamed = ''.join(AIService()._stream_api_request(messages))
+        finally:
+            upstream.stop()
+
+        # Nothing listens on the mock URL any more: every answer must come from the journal
+        with override_settings(UPSTREAM_MOCK_URL=upstream.url, UPSTREAM_JOURNAL_MODE='replay',
+                               UPSTREAM_JOURNAL_PATH=self.path, UPSTREAM_REPLAY_LATENCY_SCALE=0):
+            service = AIService()
+            self.assertEqual(service.answer(messages, use_cache=False), "recorded answer")
+            self.assertEqual(''.join(service._stream_api_request(messages)), streamed)
+            self.assertEqual(service.journal.stats()['replayed']['hash'], 2)
+
+    def test_recorded_errors_are_raised_again(self):
+        payload = {"model": "gpt-4.1-nano", "messages": [{"role": "user", "content": "fails"}]}
+        UpstreamJournal(mode='record', path=self.path).record(payload, 0.1, error=RuntimeError("upstream down"))
+        with self.assertRaisesMessage(ReplayedUpstreamError, "upstream down"):
+            UpstreamJournal(mode='replay', path=self.path, latency_scale=0).replay(payload)
+
+
+@override_settings(RETRIEVAL_ENABLED=True, CONTEXT_MAX_MESSAGES=6)
+class RetrievalTests(TestCase):
+    def test_recalls_an_old_relevant_message_outside_the_recent_window(self):
+        user = get_user_model().objects.create_user(username='rememberer', password='!')
+        conversation = Conversation.objects.create(user=user, title='Long chat')
+        old = Message.objects.create(
+            conversation=conversation, is_from_user=True,
+            content="Our staging cluster uses cert-manager to renew the ingress TLS certificates every 60 days.",
+        )
+        for n in range(20):
+            Message.objects.create(
+                conversation=conversation, is_from_user=n % 2 == 0, content=f"Lunch idea number {n}: soup and bread.",
+            )
+
+        retriever = MessageRetriever()
+        newest = list(conversation.messages.order_by('-created_at')[:6])
+        recalled = retriever.recall(
+            conversation, "When does cert-manager renew the ingress certificates?", min(m.pk for m in newest)
+        )
+        self.assertEqual(recalled[0].pk, old.pk)
+
+        service = AIService()
+        service.retriever = retriever
+        messages = service._build_messages("Remind me how the ingress certificates get renewed", conversation=conversation)
+        self.assertTrue(any(old.content in m['content'] for m in messages))
+
+
+class ModelRouterTierTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ModelRouter(enabled=True, ladder=['small', 'medium', 'large'], thresholds=[0.35, 0.7])
+
+    def route(self, message, history=0):
+        messages = [{'role': 'system', 'content': ''}]
+        messages += [{'role': 'user', 'content': 'earlier'}] * history + [{'role': 'user', 'content': message}]
+        return self.router.route(message, messages)
+
+    def test_tier_climbs_with_the_complexity_score(self):
+        cases = [
+            ("thanks!", 'small'),
+            ("What is the capital of France?", 'small'),
+            ("Explain why my sorting algorithm has quadratic complexity when the input is already sorted, "
+             "and what I could change so it stays fast on nearly sorted lists", 'medium'),
+            ("Explain why this fails:\n```\ndef f(x):\n    return x[0]\n```", 'large'),
+        ]
+        for message, model in cases:
+            with self.subTest(message=message):
+                decision = self.route(message)
+                self.assertEqual(decision.model, model)
+                self.assertEqual(decision.tier, ['small', 'medium', 'large'].index(model))
+
+    def test_trivial_acknowledgement_stays_on_the_first_rung(self):
+        decision = self.route("ok", history=40)
+        self.assertEqual((decision.score, decision.model), (0.0, 'small'))
+
+    def test_long_history_alone_raises_the_score(self):
+        message = "And what about the second one?"
+        self.assertGreater(self.route(message, history=20).score, self.route(message).score)
+
+
+class CompareMessageTests(TestCase):
+    def setUp(self):
+        self.upstream = MockUpstreamServer(latency=0.01).start()
+        self.addCleanup(self.upstream.stop)
+        self.user = get_user_model().objects.create_user(username='comparer', password='!')
+        self.client.force_login(self.user)
+
+    def test_one_message_per_model(self):
+        models = ['gpt-4.1-nano', 'gpt-4.1-mini']
+        for path in ('/chat/compare/', '/chat/async/compare/'):
+            with self.subTest(path=path), override_settings(UPSTREAM_MOCK_URL=self.upstream.url):
+                response = self.client.post(
+                    path, json.dumps({'message': f"compare {uuid.uuid4()}", 'models': models}),
+                    content_type='application/json', secure=True,
+                )
+                self.assertEqual(response.status_code, 200)
+                if response.streaming:
+                    b''.join(response.streaming_content)  # answers are stored as the stream is read
+                conversation = Conversation.objects.filter(user=self.user).latest('created_at')
+                answers = conversation.messages.filter(is_from_user=False)
+                self.assertEqual(sorted(answers.values_list('model', flat=True)), sorted(models))
+                self.assertEqual(conversation.messages.filter(is_from_user=True).count(), 1)
+
+
+class SummaryScheduleTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='summarized', password='!')
+        self.conversation = Conversation.objects.create(user=user, title='Chatty')
+        for n in range(5):
+            Message.objects.create(conversation=self.conversation, content=f"message {n}", is_from_user=n % 2 == 0)
+
+    def test_off_by_default_and_costs_no_query(self):
+        with self.assertNumQueries(0):
+            self.assertFalse(schedule_summary_update(self.conversation))
+
+    @override_settings(SUMMARY_ENABLED=True, SUMMARY_TRIGGER_MESSAGES=10)
+    def test_count_stops_past_the_trigger(self):
+        with self.assertNumQueries(1) as queries:
+            self.assertFalse(schedule_summary_update(self.conversation))
+        self.assertIn('LIMIT 11', queries.captured_queries[0]['sql'])
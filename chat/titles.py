@@ -0,0 +1,178 @@
+from django.conf import settings
+from .services import AIService, truncate_title
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Conversation title strategies. The LLM strategy spends a full upstream round-trip
+# on a five-word title; the local one extracts keyphrases from the first message
+# (RAKE-style: candidate phrases are runs of non-stopwords, scored by word
+# degree/frequency) in well under a millisecond.
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before
+being below between both but by can could did do does doing down during each few for
+from further had has have having he her here hers herself him himself his how i if in
+into is it its itself just let me more most my myself no nor not now of off on once only
+or other our ours ourselves out over own same she should so some such than that the
+their theirs them themselves then there these they this those through to too under until
+up very was we were what when where which while who whom why will with would you your
+yours yourself yourselves
+hi hello hey thanks thank please pls help want need know tell explain give show like
+get got make use using used ok okay yes yeah sure also really something anything thing
+things way ways much many lot one im i'm i've i'd i'll it's that's what's there's can't
+don't doesn't
+""".split())
+
+MAX_TITLE_WORDS = 5
+
+_phrase_splitter = re.compile(r"[.,!?;:()\[\]{}\"\n\r\t]+")
+_word_pattern = re.compile(r"[A-Za-z0-9][A-Za-z0-9+#'./-]*[A-Za-z0-9+#]|[A-Za-z0-9]")
+
+
+def _candidate_phrases(text):
+    """Split text into runs of consecutive non-stopwords"""
+    phrases = []
+    for fragment in _phrase_splitter.split(text):
+        current = []
+        for word in _word_pattern.findall(fragment):
+            if word.lower() in STOPWORDS:
+                if current:
+                    phrases.append(current)
+                current = []
+            else:
+                current.append(word)
+        if current:
+            phrases.append(current)
+    return phrases
+
+
+def _title_case(words):
+    # Keep acronyms and mixed-case tokens (SQL, iOS, C++) as written
+    return ' '.join(w if any(c.isupper() or c.isdigit() for c in w) else w.capitalize() for w in words)
+
+
+def extract_title(text):
+    """
+    Extract a short title from text. Returns (title, score) where score in [0, 1]
+    says how much the title can be trusted; an empty title has score 0.
+    """
+    phrases = _candidate_phrases(text)
+    if not phrases:
+        return '', 0.0
+
+    frequency = {}
+    degree = {}
+    for phrase in phrases:
+        for word in phrase:
+            key = word.lower()
+            frequency[key] = frequency.get(key, 0) + 1
+            degree[key] = degree.get(key, 0) + len(phrase)
+    word_score = {key: degree[key] / frequency[key] for key in frequency}
+
+    scored = []
+    for position, phrase in enumerate(phrases):
+        score = sum(word_score[w.lower()] for w in phrase[:MAX_TITLE_WORDS])
+        scored.append((score, -position, phrase))
+    scored.sort(reverse=True)
+
+    # Best phrase first; pad short ones with the next best, kept in message order
+    chosen = [scored[0]]
+    words = len(scored[0][2])
+    for candidate in scored[1:]:
+        if words >= 3:
+            break
+        if words + len(candidate[2]) <= MAX_TITLE_WORDS:
+            chosen.append(candidate)
+            words += len(candidate[2])
+    chosen.sort(key=lambda item: -item[1])
+
+    title_words = []
+    seen = set()
+    for _, _, phrase in chosen:
+        for word in phrase:
+            if word.lower() not in seen:
+                seen.add(word.lower())
+                title_words.append(word)
+    title_words = title_words[:MAX_TITLE_WORDS]
+
+    # Confidence: enough content words in the title and in the message to describe it
+    content_words = len(frequency)
+    score = min(len(title_words) / 3, 1.0) * min(content_words / 3, 1.0)
+    return _title_case(title_words)[:50], round(score, 3)
+
+
+class TitleStrategy:
+    """Base class: quick_title() must never call upstream; generate() may"""
+
+    # Title requested together with the first answer (AIService.generate_response_with_title)
+    with_first_response = False
+
+    def quick_title(self, first_message):
+        """Return a final title without any upstream call, or None to defer to generate()"""
+        return None
+
+    def generate(self, first_message):
+        raise NotImplementedError
+
+
+class LocalTitleStrategy(TitleStrategy):
+    """Keyphrase extraction only; never calls upstream"""
+
+    def quick_title(self, first_message):
+        title, _ = extract_title(first_message)
+        return title or truncate_title(first_message)
+
+    def generate(self, first_message):
+        return self.quick_title(first_message)
+
+
+class LLMTitleStrategy(TitleStrategy):
+    """Ask the model for a title (one upstream round-trip)"""
+
+    def generate(self, first_message):
+        return AIService().generate_conversation_title(first_message)
+
+
+class HybridTitleStrategy(LLMTitleStrategy):
+    """Use the local title when it scores well enough, otherwise ask the model"""
+
+    def __init__(self, min_score=None):
+        if min_score is None:
+            min_score = getattr(settings, 'TITLE_LOCAL_MIN_SCORE', 0.5)
+        self.min_score = min_score
+
+    def quick_title(self, first_message):
+        title, score = extract_title(first_message)
+        if title and score >= self.min_score:
+            return title
+        logger.debug(f"Local title score {score} below {self.min_score}, deferring to LLM")
+        return None
+
+
+class CombinedTitleStrategy(LLMTitleStrategy):
+    """
+    The first answer and its title come from one completion, so titling costs no extra
+    round-trip. Paths that can't ask for both (streaming) fall back to a separate call.
+    """
+
+    with_first_response = True
+
+
+TITLE_STRATEGIES = {
+    'local': LocalTitleStrategy,
+    'llm': LLMTitleStrategy,
+    'hybrid': HybridTitleStrategy,
+    'combined': CombinedTitleStrategy,
+}
+
+
+def get_title_strategy():
+    """Title strategy selected by settings.TITLE_STRATEGY ('local', 'llm', 'hybrid' or 'combined')"""
+    name = getattr(settings, 'TITLE_STRATEGY', 'hybrid')
+    strategy_class = TITLE_STRATEGIES.get(name)
+    if strategy_class is None:
+        logger.warning(f"Unknown TITLE_STRATEGY '{name}', using 'hybrid'")
+        strategy_class = HybridTitleStrategy
+    return strategy_class()
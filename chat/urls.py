@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 app_name = 'chat'
 
@@ -8,10 +8,18 @@ urlpatterns = [
     path('conversation/<int:conversation_id>/', views.conversation_detail, name='conversation_detail'),
     path('new/', views.new_conversation, name='new_conversation'),
     path('send/', views.send_message, name='send_message'),
+    path('stream/', views.stream_message, name='stream_message'),
+    path('compare/', views.compare_message, name='compare_message'),
+    # Async variants of the write path (serve these under ASGI)
+    path('async/new/', async_views.new_conversation, name='async_new_conversation'),
+    path('async/send/', async_views.send_message, name='async_send_message'),
+    path('async/compare/', async_views.compare_message, name='async_compare_message'),
     path('delete/<int:conversation_id>/', views.delete_conversation, name='delete_conversation'),
+    path('metrics/', views.upstream_metrics, name='upstream_metrics'),
     path('conversations/', views.ConversationListView.as_view(), name='conversation_list'),
     # API endpoints for AJAX calls
     path('api/conversations/', views.new_conversation, name='api_new_conversation'),
     path('api/conversations/<int:conversation_id>/messages/', views.send_message, name='api_send_message'),
     path('api/conversations/<int:conversation_id>/', views.api_delete_conversation, name='api_delete_conversation'),
+    path('api/conversations/<int:conversation_id>/title/', views.conversation_title, name='api_conversation_title'),
 ]
\ No newline at end of file
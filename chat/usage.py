@@ -0,0 +1,46 @@
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+import logging
+
+from .models import DailyUsage
+
+logger = logging.getLogger(__name__)
+
+
+def record_answer(message):
+    """
+    Add a newly saved AI message to its user's DailyUsage row for its model and day.
+
+    One UPDATE in the steady state, an INSERT for the first answer of a day;
+    reports read these rows and never scan the message table. Best effort: a
+    failure is logged, the answer itself is already saved.
+    """
+    called = message.upstream_latency is not None
+    key = {
+        'user_id': message.conversation.user_id,
+        'model': message.model,
+        'day': timezone.localdate(message.created_at),
+    }
+    counts = {
+        'answers': 1,
+        'upstream_calls': int(called),
+        'prompt_tokens': message.prompt_tokens or 0,
+        'completion_tokens': message.completion_tokens or 0,
+        'upstream_seconds': message.upstream_latency or 0.0,
+    }
+    increments = {field: F(field) + value for field, value in counts.items()}
+    try:
+        # A savepoint, so a failure here is rolled back on its own and leaves an
+        # enclosing transaction (ATOMIC_REQUESTS) usable for the rest of the request
+        with transaction.atomic():
+            if DailyUsage.objects.filter(**key).update(**increments):
+                return
+            try:
+                with transaction.atomic():
+                    DailyUsage.objects.create(**key, **counts)
+            except IntegrityError:
+                # Another process created the row first
+                DailyUsage.objects.filter(**key).update(**increments)
+    except DatabaseError as e:
+        logger.warning(f"Usage rollup update failed for message {message.pk}: {e}")
@@ -1,12 +1,27 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views.generic import ListView
 from django.contrib import messages
 from .models import Conversation, Message
 from .services import AIService
+from .compare import compare_models, iter_compare
+from .http_client import get_http_client
+from .response_cache import get_response_cache
+from .context_cache import get_context_cache
+from .resilience import BulkheadFullError, resilience_stats
+from .deadlines import DeadlineExceededError, RequestCancelledError, get_deadline_policy
+from .providers import get_provider_router
+from .hedging import get_hedge_policy
+from .single_flight import get_single_flight
+from .journal import get_journal
+from .model_routing import get_model_router
+from .retrieval import get_retriever
+from .tasks import schedule_title_generation, schedule_summary_update, set_first_response_title
+from .titles import get_title_strategy
 import json
 
 
@@ -151,14 +166,27 @@ def new_conversation(request):
                 )
                 
                 # Generate AI response
-                ai_service = AIService()
+                ai_service = AIService(user=request.user)
                 try:
                     ai_response = ai_service.generate_response(initial_message)
                     Message.objects.create(
                         conversation=conversation,
                         content=ai_response,
-                        is_from_user=False
+                        is_from_user=False,
+                        model=ai_service.model,
+                        **ai_service.usage_fields()
                     )
+                except BulkheadFullError as e:
+                    # Nothing was answered and the client never learns the new id: drop
+                    # the conversation with its message so a resend starts clean
+                    conversation.delete()
+                    return _busy_response(e)
+                except RequestCancelledError:
+                    conversation.delete()
+                    return _cancelled_response()
+                except DeadlineExceededError as e:
+                    conversation.delete()
+                    return _deadline_response(e)
                 except Exception as e:
                     print(f"AI service error: {e}")
                     ai_response = "I'm sorry, I'm having trouble responding right now. Please try again later."
@@ -211,22 +239,49 @@ def send_message(request):
             is_from_user=True
         )
         
-        # Generate AI response
-        ai_service = AIService()
-        conversation_history = conversation.messages.order_by('created_at')
-        ai_response = ai_service.generate_response(message_content, conversation_history)
+        # Generate AI response (with the conversation title in the same call if so configured)
+        ai_service = AIService(user=request.user)
+        combined_title = not conversation.title and get_title_strategy().with_first_response
+        try:
+            if combined_title:
+                ai_response, title = ai_service.generate_response_with_title(
+                    message_content,
+                    conversation=conversation,
+                    use_cache=not conversation.response_cache_opt_out
+                )
+            else:
+                ai_response = ai_service.generate_response(
+                    message_content,
+                    conversation=conversation,
+                    use_cache=not conversation.response_cache_opt_out
+                )
+        except BulkheadFullError as e:
+            # Nothing was answered: drop the turn so the client can simply resend it
+            user_message.delete()
+            return _busy_response(e)
+        except RequestCancelledError:
+            user_message.delete()
+            return _cancelled_response()
+        except DeadlineExceededError as e:
+            user_message.delete()
+            return _deadline_response(e)
         
         # Save AI response
         ai_message = Message.objects.create(
             conversation=conversation,
             content=ai_response,
-            is_from_user=False
+            is_from_user=False,
+            model=ai_service.model,
+            **ai_service.usage_fields()
         )
+        schedule_summary_update(conversation)
         
-        # Update conversation title if it's the first message
-        if not conversation.title:
-            conversation.title = ai_service.generate_conversation_title(message_content)
-            conversation.save()
+        # First message: the title came with the answer, or respond with a provisional
+        # title and generate the real one in the background
+        if combined_title:
+            set_first_response_title(conversation, message_content, title)
+        elif not conversation.title:
+            schedule_title_generation(conversation, message_content)
         
         return JsonResponse({
             'success': True,
@@ -242,12 +297,265 @@ def send_message(request):
                 'created_at': ai_message.created_at.isoformat(),
             },
             'conversation_title': conversation.title,
+            'title_pending': conversation.title_status == Conversation.TITLE_PENDING,
         })
         
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
+def _busy_response(error):
+    """503 for an overloaded upstream, telling the client when to retry"""
+    response = JsonResponse({'error': str(error)}, status=503)
+    response['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def _cancelled_response():
+    """The client went away before the answer (ASGI); 499 as in nginx, for the access log"""
+    return JsonResponse({'error': 'Client disconnected'}, status=499, reason='Client Closed Request')
+
+
+def _deadline_response(error):
+    """The request's time budget ran out before an answer; nothing was stored"""
+    return JsonResponse({'error': str(error)}, status=504)
+
+
+def _sse(event, data):
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@login_required
+@csrf_exempt
+def stream_message(request):
+    """Send a message and stream the AI response back as Server-Sent Events"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid method'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+        message_content = data.get('message', '').strip()
+        conversation_id = data.get('conversation_id')
+        
+        if not message_content:
+            return JsonResponse({'error': 'Message cannot be empty'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    
+    ai_service = AIService(user=request.user)
+    
+    # Take the upstream slot before any response bytes go out, so overload is still a 503
+    try:
+        permit = ai_service.acquire_slot()
+    except BulkheadFullError as e:
+        return _busy_response(e)
+    
+    try:
+        # Get or create conversation
+        if conversation_id:
+            conversation = get_object_or_404(Conversation, id=conversation_id, user=request.user)
+        else:
+            conversation = Conversation.objects.create(user=request.user)
+        
+        # Save user message
+        user_message = Message.objects.create(
+            conversation=conversation,
+            content=message_content,
+            is_from_user=True
+        )
+    except Exception as e:
+        permit.release()
+        return JsonResponse({'error': str(e)}, status=500)
+    
+    deadline = getattr(request, 'deadline', None)
+    responses = ai_service.stream_response(
+        message_content,
+        conversation=conversation,
+        use_cache=not conversation.response_cache_opt_out,
+        permit=permit
+    )
+    
+    def event_stream():
+        chunks = []
+        completed = False
+        try:
+            yield _sse('start', {
+                'conversation_id': conversation.id,
+                'user_message': {
+                    'id': user_message.id,
+                    'content': user_message.content,
+                    'created_at': user_message.created_at.isoformat(),
+                },
+            })
+            
+            for chunk in responses:
+                chunks.append(chunk)
+                yield _sse('delta', {'content': chunk})
+                if deadline is not None and deadline.cancelled:
+                    # Client gone (ASGI): stop generating; the partial answer is kept below
+                    deadline.record_cancelled()
+                    return
+            completed = True
+            
+            ai_message = Message.objects.create(
+                conversation=conversation,
+                content=''.join(chunks).strip(),
+                is_from_user=False,
+                model=ai_service.model,
+                **ai_service.usage_fields()
+            )
+            schedule_summary_update(conversation)
+            
+            # First message: send a provisional title, the real one is generated in the background
+            if not conversation.title:
+                schedule_title_generation(conversation, message_content)
+            
+            yield _sse('done', {
+                'ai_message': {
+                    'id': ai_message.id,
+                    'content': ai_message.content,
+                    'created_at': ai_message.created_at.isoformat(),
+                },
+                'conversation_title': conversation.title,
+                'title_pending': conversation.title_status == Conversation.TITLE_PENDING,
+            })
+        finally:
+            # Ends the upstream call if the client went away, so its usage is known below
+            responses.close()
+            permit.release()  # no-op unless the upstream stream never started
+            # Client went away mid-stream: keep whatever was generated so far
+            if not completed and chunks:
+                Message.objects.create(
+                    conversation=conversation,
+                    content=''.join(chunks).strip(),
+                    is_from_user=False,
+                    model=ai_service.model,
+                    **ai_service.usage_fields()
+                )
+    
+    # The server closes the response even if the stream is never iterated (client gone
+    # before the first byte, or a middleware swapped the response); the slot goes back then
+    response = StreamingHttpResponse(_ClosingStream(event_stream(), permit.release), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx-style proxies from buffering the stream
+    return response
+
+
+class _ClosingStream:
+    """Streaming content whose close() also runs on_close; Django calls it when it closes the response"""
+
+    def __init__(self, events, on_close):
+        self.events = events
+        self.on_close = on_close
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def close(self):
+        try:
+            self.events.close()
+        finally:
+            self.on_close()
+
+
+@login_required
+@csrf_exempt
+def compare_message(request):
+    """
+    Send a message to several models at once and stream each answer back as a
+    Server-Sent Event as soon as it lands; every answer is stored as its own
+    Message tagged with its model.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid method'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+        message_content = data.get('message', '').strip()
+        conversation_id = data.get('conversation_id')
+        
+        if not message_content:
+            return JsonResponse({'error': 'Message cannot be empty'}, status=400)
+        models = compare_models(data.get('models'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    try:
+        # Get or create conversation
+        if conversation_id:
+            conversation = get_object_or_404(Conversation, id=conversation_id, user=request.user)
+        else:
+            conversation = Conversation.objects.create(user=request.user)
+        
+        # Save user message
+        user_message = Message.objects.create(
+            conversation=conversation,
+            content=message_content,
+            is_from_user=True
+        )
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+    
+    def event_stream():
+        yield _sse('start', {
+            'conversation_id': conversation.id,
+            'models': models,
+            'user_message': {
+                'id': user_message.id,
+                'content': user_message.content,
+                'created_at': user_message.created_at.isoformat(),
+            },
+        })
+        
+        answered = 0
+        for result in iter_compare(
+            message_content,
+            models,
+            conversation=conversation,
+            user=request.user,
+            use_cache=not conversation.response_cache_opt_out,
+            # Runs as the response streams, after the middleware made the deadline current
+            deadline=getattr(request, 'deadline', None)
+        ):
+            if result['error']:
+                yield _sse('error', {'model': result['model'], 'error': result['error']})
+                continue
+            ai_message = Message.objects.create(
+                conversation=conversation,
+                content=result['content'],
+                is_from_user=False,
+                model=result['model'],
+                **result['usage']
+            )
+            answered += 1
+            yield _sse('answer', {
+                'model': result['model'],
+                'latency': result['latency'],
+                'ai_message': {
+                    'id': ai_message.id,
+                    'content': ai_message.content,
+                    'created_at': ai_message.created_at.isoformat(),
+                },
+            })
+        
+        if answered:
+            schedule_summary_update(conversation)
+        if not conversation.title:
+            schedule_title_generation(conversation, message_content)
+        
+        yield _sse('done', {
+            'answered': answered,
+            'conversation_title': conversation.title,
+            'title_pending': conversation.title_status == Conversation.TITLE_PENDING,
+        })
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def delete_conversation(request, conversation_id):
     """Delete a conversation"""
@@ -272,6 +580,35 @@ def api_delete_conversation(request, conversation_id):
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+@login_required
+def conversation_title(request, conversation_id):
+    """Current title of a conversation; polled by the client while a generated title is pending"""
+    conversation = get_object_or_404(Conversation, id=conversation_id, user=request.user)
+    return JsonResponse({
+        'conversation_id': conversation.id,
+        'title': conversation.title,
+        'title_pending': conversation.title_status == Conversation.TITLE_PENDING,
+    })
+
+
+@staff_member_required
+def upstream_metrics(request):
+    """Staff-only snapshot of upstream client metrics"""
+    return JsonResponse({
+        'http_pool': get_http_client().stats(),
+        'response_cache': get_response_cache().stats(),
+        'context_cache': get_context_cache().stats(),
+        **resilience_stats(),
+        'providers': get_provider_router().stats(),
+        'hedging': get_hedge_policy().stats(),
+        'single_flight': get_single_flight().stats(),
+        'journal': get_journal().stats(),
+        'model_routing': get_model_router().stats(),
+        'retrieval': get_retriever().stats(),
+        'deadlines': get_deadline_policy().stats(),
+    })
+
+
 class ConversationListView(ListView):
     """List all conversations for the user"""
     model = Conversation
@@ -13,4 +13,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'genai_project.settings')
 
-application = get_asgi_application()
\ No newline at end of file
+django_application = get_asgi_application()
+
+# Imported after setup: lets request deadlines see clients that disconnect mid-request
+from genai_project.middleware import DisconnectWatcher  # noqa: E402
+from chat.http_client import share_async_http_client  # noqa: E402
+
+# The server's event loop lives as long as the process: reuse upstream connections across requests
+share_async_http_client()
+
+application = DisconnectWatcher(django_application)
\ No newline at end of file
@@ -0,0 +1,118 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+import asyncio
+
+from chat.deadlines import get_deadline_policy, set_current_deadline, reset_current_deadline
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise static file serving that stays async under ASGI.
+
+    The stock WhiteNoiseMiddleware is sync-only, so under ASGI Django adapts every
+    layer below it (including async views) onto its single sync thread, which
+    serializes all requests. This subclass keeps the chain async and only pushes
+    the blocking file lookup/open into a worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    def _find_static_file(self, request):
+        # Same lookup as WhiteNoiseMiddleware.__call__
+        if self.autorefresh:
+            return self.find_file(request.path_info)
+        return self.files.get(request.path_info)
+
+    async def __acall__(self, request):
+        static_file = await sync_to_async(self._find_static_file, thread_sensitive=False)(request)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
+
+
+class RequestDeadlineMiddleware:
+    """
+    Starts each request's deadline (chat.deadlines) and makes it current for the
+    request, so upstream calls made while handling it take their timeouts from
+    the budget left. Also available as request.deadline, for streaming
+    responses that outlive this middleware call.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request.deadline = get_deadline_policy().start(request)
+        token = set_current_deadline(request.deadline)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_current_deadline(token)
+
+    async def __acall__(self, request):
+        request.deadline = get_deadline_policy().start(request)
+        token = set_current_deadline(request.deadline)
+        try:
+            return await self.get_response(request)
+        finally:
+            reset_current_deadline(token)
+
+
+class DisconnectWatcher:
+    """
+    ASGI wrapper that notices clients going away mid-request.
+
+    Django 4.2 stops reading the ASGI receive channel once it has the request
+    body, so a disconnect goes unseen until the response is sent. This wrapper
+    does the reading instead, hands messages on to Django, and sets
+    scope['disconnected'] (an asyncio.Event) on http.disconnect; request
+    deadlines use it to cancel upstream calls nobody is waiting for.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        disconnected = asyncio.Event()
+        messages = asyncio.Queue()
+
+        async def watch():
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message['type'] == 'http.disconnect':
+                    disconnected.set()
+                    return
+
+        async def receive_for_app():
+            message = await messages.get()
+            if message['type'] == 'http.disconnect':
+                messages.put_nowait(message)  # every later read sees it too
+            return message
+
+        watcher = asyncio.ensure_future(watch())
+        try:
+            await self.app(dict(scope, disconnected=disconnected), receive_for_app, send)
+        finally:
+            watcher.cancel()
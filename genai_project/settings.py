@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+import json
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -74,8 +75,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'genai_project.middleware.RequestDeadlineMiddleware',  # First, so the time budget covers the whole request
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # For static file serving
+    'genai_project.middleware.AsyncWhiteNoiseMiddleware',  # For static file serving (async-capable WhiteNoise)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -317,6 +319,157 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 
 # Euron API Configuration
 EURON_API_KEY = os.getenv('EURON_API_KEY', 'euri-94dee66c5f9b41981308651c7985cbf1db0ed7307f498e8e70ccc1da7c84c343')
+EURON_API_URL = os.getenv('EURON_API_URL', 'https://api.euron.one/api/v1/euri/chat/completions')
+
+# OpenAI-compatible upstream providers, tried healthiest-first with automatic failover
+# (see chat/providers.py). JSON list of {"name", "url", "api_key", "model", "timeout"};
+# api_key defaults to EURON_API_KEY; model replaces the app's default model only, never
+# one a call asks for explicitly (routed or compared). Empty: Euron only.
+UPSTREAM_PROVIDERS = json.loads(os.getenv('UPSTREAM_PROVIDERS', '[]'))
+PROVIDER_RECOVERY_SECONDS = float(os.getenv('PROVIDER_RECOVERY_SECONDS', '30'))  # half-life of a provider's error history
+# Send all upstream calls to a local mock LLM instead (python manage.py mock_llm), e.g.
+# http://127.0.0.1:8900/v1/chat/completions. For load and latency testing only.
+UPSTREAM_MOCK_URL = os.getenv('UPSTREAM_MOCK_URL') or None
+# Upstream call journal (chat/journal.py): 'record' appends every upstream call with its
+# timing to UPSTREAM_JOURNAL_PATH; 'replay' answers from that file without network access,
+# sleeping the recorded latency times UPSTREAM_REPLAY_LATENCY_SCALE (0 = no delay).
+# The journal holds full prompts and completions: the default path is git-ignored.
+UPSTREAM_JOURNAL_MODE = os.getenv('UPSTREAM_JOURNAL_MODE') or None
+UPSTREAM_JOURNAL_PATH = os.getenv('UPSTREAM_JOURNAL_PATH', str(BASE_DIR / 'upstream-journal.jsonl'))
+UPSTREAM_REPLAY_LATENCY_SCALE = float(os.getenv('UPSTREAM_REPLAY_LATENCY_SCALE', '1.0'))
+
+# Upstream HTTP connection pool (shared keep-alive session, see chat/http_client.py)
+UPSTREAM_POOL_CONNECTIONS = int(os.getenv('UPSTREAM_POOL_CONNECTIONS', '4'))  # hosts to keep pools for
+UPSTREAM_POOL_MAXSIZE = int(os.getenv('UPSTREAM_POOL_MAXSIZE', '10'))  # keep-alive connections per host
+UPSTREAM_POOL_BLOCK = os.getenv('UPSTREAM_POOL_BLOCK', 'False').lower() == 'true'
+UPSTREAM_POOL_WARM_CONNECTIONS = int(os.getenv('UPSTREAM_POOL_WARM_CONNECTIONS', '0'))  # pre-opened on first use
+UPSTREAM_ASYNC_MAX_CONNECTIONS = int(os.getenv('UPSTREAM_ASYNC_MAX_CONNECTIONS', '100'))  # in-flight cap for async views
+
+# Upstream circuit breaker and retries (see chat/resilience.py). The circuit opens when
+# at least MIN_CALLS calls in the last WINDOW seconds fail at FAILURE_RATE or more, and
+# rejects calls immediately for COOLDOWN seconds before letting a probe through.
+UPSTREAM_BREAKER_FAILURE_RATE = float(os.getenv('UPSTREAM_BREAKER_FAILURE_RATE', '0.5'))
+UPSTREAM_BREAKER_MIN_CALLS = int(os.getenv('UPSTREAM_BREAKER_MIN_CALLS', '10'))
+UPSTREAM_BREAKER_WINDOW = float(os.getenv('UPSTREAM_BREAKER_WINDOW', '60'))
+UPSTREAM_BREAKER_COOLDOWN = float(os.getenv('UPSTREAM_BREAKER_COOLDOWN', '30'))
+UPSTREAM_RETRY_MAX_ATTEMPTS = int(os.getenv('UPSTREAM_RETRY_MAX_ATTEMPTS', '3'))  # including the first attempt
+UPSTREAM_RETRY_BASE_DELAY = float(os.getenv('UPSTREAM_RETRY_BASE_DELAY', '0.5'))
+UPSTREAM_RETRY_MAX_DELAY = float(os.getenv('UPSTREAM_RETRY_MAX_DELAY', '4'))
+
+# Upstream bulkhead: at most MAX_IN_FLIGHT concurrent upstream calls per process; extra
+# callers wait up to MAX_QUEUE_WAIT seconds for a slot, then get a 503 with Retry-After.
+# Keep MAX_IN_FLIGHT below the worker thread count so cheap endpoints always have a worker.
+UPSTREAM_MAX_IN_FLIGHT = int(os.getenv('UPSTREAM_MAX_IN_FLIGHT', '8'))
+UPSTREAM_MAX_QUEUE_WAIT = float(os.getenv('UPSTREAM_MAX_QUEUE_WAIT', '2'))
+# Queued callers are served by weighted fair queuing per user: staff get STAFF_WEIGHT
+# shares, members of the groups in TIER_WEIGHTS get that weight, everyone else 1.
+UPSTREAM_MAX_QUEUED_PER_USER = int(os.getenv('UPSTREAM_MAX_QUEUED_PER_USER', '2'))
+UPSTREAM_STAFF_WEIGHT = float(os.getenv('UPSTREAM_STAFF_WEIGHT', '4'))
+UPSTREAM_TIER_WEIGHTS = json.loads(os.getenv('UPSTREAM_TIER_WEIGHTS', '{}'))  # e.g. {"pro": 2}
+
+# Hedged upstream requests (see chat/hedging.py): a call still pending after the
+# HEDGE_PERCENTILE latency gets a duplicate, at most HEDGE_BUDGET extra requests overall.
+# A duplicate takes a bulkhead slot of its own and is skipped when none is free.
+UPSTREAM_HEDGING_ENABLED = os.getenv('UPSTREAM_HEDGING_ENABLED', 'False').lower() == 'true'
+UPSTREAM_HEDGE_PERCENTILE = float(os.getenv('UPSTREAM_HEDGE_PERCENTILE', '0.95'))
+UPSTREAM_HEDGE_BUDGET = float(os.getenv('UPSTREAM_HEDGE_BUDGET', '0.1'))
+UPSTREAM_HEDGE_MIN_DELAY = float(os.getenv('UPSTREAM_HEDGE_MIN_DELAY', '0.2'))  # seconds
+UPSTREAM_HEDGE_WORKERS = int(os.getenv('UPSTREAM_HEDGE_WORKERS', '16'))  # threads for hedged sync calls
+
+# Request deadlines (RequestDeadlineMiddleware): upstream calls get at most the budget left, and
+# none is started with less than REQUEST_DEADLINE_MIN_UPSTREAM seconds to go. Clients can ask for
+# a shorter budget in the REQUEST_DEADLINE_HEADER header (seconds). Under ASGI, upstream calls of
+# clients that disconnect are cancelled (genai_project.asgi).
+REQUEST_DEADLINE_SECONDS = float(os.getenv('REQUEST_DEADLINE_SECONDS', '60'))
+REQUEST_DEADLINE_HEADER = os.getenv('REQUEST_DEADLINE_HEADER', 'X-Request-Timeout')
+REQUEST_DEADLINE_MIN_UPSTREAM = float(os.getenv('REQUEST_DEADLINE_MIN_UPSTREAM', '1'))
+
+# In-process background executor (title generation etc., see chat/tasks.py)
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', '2'))
+
+# Conversation titles: 'local' (keyphrase extraction, no upstream call), 'llm',
+# 'hybrid' (local unless its confidence score is below TITLE_LOCAL_MIN_SCORE), or
+# 'combined' (the first answer and its title come back from one upstream call)
+TITLE_STRATEGY = os.getenv('TITLE_STRATEGY', 'hybrid')
+TITLE_LOCAL_MIN_SCORE = float(os.getenv('TITLE_LOCAL_MIN_SCORE', '0.5'))
+
+# Per-request model routing (chat/model_routing.py): each prompt gets a local complexity
+# score in [0, 1] and climbs one rung of MODEL_LADDER (fastest/cheapest first) per
+# threshold it reaches. The pick is sent even to providers configured with a model.
+MODEL_ROUTING_ENABLED = os.getenv('MODEL_ROUTING_ENABLED', 'False').lower() == 'true'
+MODEL_LADDER = json.loads(os.getenv('MODEL_LADDER', '["gpt-4.1-nano", "gpt-4.1-mini", "gpt-4.1"]'))
+MODEL_ROUTING_THRESHOLDS = json.loads(os.getenv('MODEL_ROUTING_THRESHOLDS', '[0.35, 0.7]'))
+
+# "Compare answers" mode (/chat/compare/): models a user may fan one message out to
+# (defaults to MODEL_LADDER), how many at once, and threads for the sync fan-out
+COMPARE_MODELS = json.loads(os.getenv('COMPARE_MODELS', '[]')) or MODEL_LADDER
+COMPARE_MAX_MODELS = int(os.getenv('COMPARE_MAX_MODELS', '4'))
+COMPARE_WORKERS = int(os.getenv('COMPARE_WORKERS', '16'))
+
+# Context window: history is packed newest-first into this many (estimated) prompt tokens,
+# looking at no more than CONTEXT_MAX_MESSAGES recent messages
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '3000'))
+CONTEXT_MAX_MESSAGES = int(os.getenv('CONTEXT_MAX_MESSAGES', '50'))
+
+# Retrieval of relevant older messages (chat/retrieval.py, needs NumPy): the TOP_K messages
+# from before the recent window whose hashed n-gram embedding scores at least MIN_SCORE
+# against the new message are added, within RETRIEVAL_TOKEN_BUDGET of the context budget.
+# Indexes are kept in memory for the RETRIEVAL_MAX_CONVERSATIONS most recently used
+# conversations (~DIM * 4 bytes per message).
+RETRIEVAL_ENABLED = os.getenv('RETRIEVAL_ENABLED', 'False').lower() == 'true'
+RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', '4'))
+RETRIEVAL_MIN_SCORE = float(os.getenv('RETRIEVAL_MIN_SCORE', '0.25'))
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv('RETRIEVAL_TOKEN_BUDGET', '600'))
+RETRIEVAL_DIM = int(os.getenv('RETRIEVAL_DIM', '256'))
+RETRIEVAL_MAX_CONVERSATIONS = int(os.getenv('RETRIEVAL_MAX_CONVERSATIONS', '128'))
+
+# Rolling summaries: once a conversation has more than SUMMARY_TRIGGER_MESSAGES unsummarized
+# messages, all but the newest SUMMARY_KEEP_RECENT are folded (up to SUMMARY_MAX_FOLD per
+# run) into Conversation.summary in the background and sent as a system message. Off by
+# default: it costs a COUNT per send and an extra upstream call per fold
+SUMMARY_ENABLED = os.getenv('SUMMARY_ENABLED', 'False').lower() == 'true'
+SUMMARY_TRIGGER_MESSAGES = int(os.getenv('SUMMARY_TRIGGER_MESSAGES', '20'))
+SUMMARY_KEEP_RECENT = int(os.getenv('SUMMARY_KEEP_RECENT', '10'))
+SUMMARY_MAX_FOLD = int(os.getenv('SUMMARY_MAX_FOLD', '40'))
+SUMMARY_MAX_WORDS = int(os.getenv('SUMMARY_MAX_WORDS', '200'))
+
+# Caches. 'responses' holds cached AI completions (see chat/response_cache.py); point it at a
+# shared backend (e.g. Redis or memcached) so all workers share hits. locmem evicts LRU
+# entries once MAX_ENTRIES is reached.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': os.getenv('RESPONSE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION', 'ai-responses'),
+        'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TTL', '3600')),  # seconds
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1000')),
+        },
+    },
+    # Recent history per conversation (see chat/context_cache.py). Per process by default, which
+    # is safe with several processes (entries are checked against Conversation.last_message_pk),
+    # but a shared backend makes edits and deletes show up everywhere at once.
+    'contexts': {
+        'BACKEND': os.getenv('CONTEXT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CONTEXT_CACHE_LOCATION', 'chat-contexts'),
+        'TIMEOUT': int(os.getenv('CONTEXT_CACHE_TTL', '3600')),  # seconds
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CONTEXT_CACHE_MAX_ENTRIES', '1000')),
+        },
+    },
+}
+
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True').lower() == 'true'
+RESPONSE_CACHE_MAX_CHARS = int(os.getenv('RESPONSE_CACHE_MAX_CHARS', '20000'))  # larger answers are not cached
+CONTEXT_CACHE_ENABLED = os.getenv('CONTEXT_CACHE_ENABLED', 'True').lower() == 'true'
+
+# Concurrent identical requests share one upstream call (see chat/single_flight.py).
+# DISTRIBUTED extends this across processes via a lock in the 'responses' cache, which
+# must then be a shared backend.
+SINGLE_FLIGHT_DISTRIBUTED = os.getenv('SINGLE_FLIGHT_DISTRIBUTED', 'False').lower() == 'true'
+SINGLE_FLIGHT_WAIT = float(os.getenv('SINGLE_FLIGHT_WAIT', '60'))  # seconds a follower waits for the leader
 
 # Django REST Framework
 REST_FRAMEWORK = {
@@ -397,5 +550,11 @@ LOGGING = {
             'level': os.getenv('DJANGO_LOG_LEVEL', 'INFO'),
             'propagate': False,
         },
+        'httpx': {
+            # httpx logs every request at INFO; keep upstream call noise out of the console
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     },
 }
@@ -155,11 +155,100 @@ function handleSubmit(e) {
 }
 
 function sendMessage(message) {
-    const url = currentConversationId ? 
-        '/chat/send/' : 
-        '/chat/send/';
-    
-    fetch(url, {
+    // Fall back to the plain JSON endpoint on browsers without fetch streaming
+    if (!window.ReadableStream || !window.TextDecoder) {
+        sendMessageJson(message);
+        return;
+    }
+
+    let aiText = null;
+    let aiContent = '';
+
+    fetch('/chat/stream/', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream',
+            'X-CSRFToken': getCsrfToken()
+        },
+        body: JSON.stringify({
+            message: message,
+            conversation_id: currentConversationId
+        })
+    })
+    .then(response => {
+        const contentType = response.headers.get('Content-Type') || '';
+        if (!response.ok || !contentType.startsWith('text/event-stream')) {
+            return response.json().then(data => {
+                throw new Error(data.error || 'Unknown error');
+            });
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        const handleEvent = (event, data) => {
+            if (event === 'start') {
+                setCurrentConversation(data.conversation_id);
+            } else if (event === 'delta') {
+                if (!aiContent) {
+                    // First token: show the AI bubble and stop the loading overlay
+                    aiText = addMessage('', false);
+                    setLoading(false);
+                }
+                aiContent += data.content;
+                if (aiText) {
+                    aiText.innerHTML = aiContent.replace(/\n/g, '<br>');
+                    scrollToBottom();
+                }
+            } else if (event === 'done') {
+                if (aiText && data.ai_message) {
+                    aiText.innerHTML = data.ai_message.content.replace(/\n/g, '<br>');
+                }
+                updateConversationTitle(currentConversationId, data.conversation_title, data.title_pending);
+            }
+        };
+
+        const pump = () => reader.read().then(({ done, value }) => {
+            if (done) return;
+            buffer += decoder.decode(value, { stream: true });
+
+            // SSE frames are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let dataLines = [];
+                frame.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        dataLines.push(line.slice(5).trim());
+                    }
+                });
+                if (dataLines.length) {
+                    handleEvent(event, JSON.parse(dataLines.join('\n')));
+                }
+            }
+            return pump();
+        });
+
+        return pump();
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        showError('Failed to send message: ' + error.message);
+    })
+    .finally(() => {
+        setLoading(false);
+    });
+}
+
+function sendMessageJson(message) {
+    fetch('/chat/send/', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -174,22 +263,13 @@ function sendMessage(message) {
     .then(data => {
         if (data.success) {
             // Update conversation ID if this was a new conversation
-            if (data.conversation_id && !currentConversationId) {
-                currentConversationId = data.conversation_id;
-                const conversationIdInput = document.getElementById('conversationId');
-                if (conversationIdInput) {
-                    conversationIdInput.value = currentConversationId;
-                }
-                // Update URL to include conversation parameter
-                const newUrl = new URL(window.location);
-                newUrl.searchParams.set('conversation', currentConversationId);
-                window.history.pushState({}, '', newUrl);
-            }
+            setCurrentConversation(data.conversation_id);
             
             // Add AI response to chat
             if (data.ai_message && data.ai_message.content) {
                 addMessage(data.ai_message.content, false);
             }
+            updateConversationTitle(data.conversation_id, data.conversation_title, data.title_pending);
         } else {
             showError('Failed to send message: ' + (data.error || 'Unknown error'));
         }
@@ -203,9 +283,57 @@ function sendMessage(message) {
     });
 }
 
+function setCurrentConversation(conversationId) {
+    if (!conversationId || currentConversationId) return;
+
+    currentConversationId = conversationId;
+    const conversationIdInput = document.getElementById('conversationId');
+    if (conversationIdInput) {
+        conversationIdInput.value = currentConversationId;
+    }
+    // Update URL to include conversation parameter
+    const newUrl = new URL(window.location);
+    newUrl.searchParams.set('conversation', currentConversationId);
+    window.history.pushState({}, '', newUrl);
+}
+
+function updateConversationTitle(conversationId, title, pending) {
+    if (!conversationId) return;
+
+    const titleEl = document.querySelector(
+        `.conversation-item[data-conversation-id="${conversationId}"] .conversation-title`
+    );
+    if (titleEl && title) {
+        titleEl.textContent = title;
+    }
+
+    // The server sends a provisional title and generates the real one in the background
+    if (pending) {
+        pollConversationTitle(conversationId);
+    }
+}
+
+function pollConversationTitle(conversationId, attempt = 0) {
+    const maxAttempts = 10;
+    if (attempt >= maxAttempts) return;
+
+    setTimeout(() => {
+        fetch(`/chat/api/conversations/${conversationId}/title/`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.title_pending) {
+                    pollConversationTitle(conversationId, attempt + 1);
+                } else {
+                    updateConversationTitle(conversationId, data.title, false);
+                }
+            })
+            .catch(error => console.error('Error fetching conversation title:', error));
+    }, 1000 * Math.min(attempt + 1, 3));
+}
+
 function addMessage(content, isUser) {
     const messagesContainer = document.getElementById('messagesContainer');
-    if (!messagesContainer) return;
+    if (!messagesContainer) return null;
     
     const messageDiv = document.createElement('div');
     messageDiv.className = `message ${isUser ? 'user' : 'ai'}`;
@@ -238,6 +366,7 @@ function addMessage(content, isUser) {
     
     messagesContainer.appendChild(messageDiv);
     scrollToBottom();
+    return textDiv;
 }
 
 function setLoading(loading) {